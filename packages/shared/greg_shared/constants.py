@@ -56,6 +56,12 @@ GREG_RESPONSES: Dict[str, List[str]] = {
         "🔁 Repeat coupé. Enfin du changement.",
         "🔁 C'est fini la boucle, {user}. On respire.",
     ],
+    "autoplay_on": [
+        "📻 Autoplay activé, {user}. Quand la file est vide, je pioche dans vos vieilles habitudes.",
+    ],
+    "autoplay_off": [
+        "📻 Autoplay coupé. File vide = silence, comme avant.",
+    ],
     "current_playing": [
         "🎧 Là je joue **{title}**. T'écoutes ou tu fais semblant, {user} ?",
     ],
@@ -120,6 +126,9 @@ GREG_RESPONSES: Dict[str, List[str]] = {
         "⛔ T'as déjà {count} morceaux en file, {user}. Calme-toi. Laisse les autres respirer.",
         "⛔ Stop {user}, t'as atteint ta limite ({count}/{cap}). Tu monopolises là.",
     ],
+    "error_duplicate": [
+        "⛔ Ce morceau est déjà dans la file, {user}. Une fois suffit, merci.",
+    ],
     "error_guild_not_found": [
         "❌ Ce serveur, je le connais pas, {user}. T'es sûr que je suis invité ?",
     ],
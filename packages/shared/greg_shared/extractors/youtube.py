@@ -11,6 +11,14 @@
 #   se prenait un 403 et discord.py interprétait ça comme une coupure
 #   réseau, bouclant à l'infini).
 # - `_AUTO_PIPE_ON_403` enfin câblé : invalidation du PO + bascule explicite.
+# - URLs directes résolues en cache par (video_id, client) jusqu'à leur
+#   `expire=` googlevideo : replay / restart / repeat sans ré-extraction.
+# - `stream(tee_path=...)` : copie opus/webm du flux écrite au passage
+#   (sans transcodage) pour le cache audio local du bot.
+# - Flux déjà en opus et sans filtre → FFmpegOpusAudio en copie : ni
+#   décodage PCM ni ré-encodage par trame dans le process du bot.
+# - Preflight = petit GET ranged (pool HTTP partagé, résultat en cache par
+#   vidéo/client/format) au lieu d'un FFmpeg qui décode 2 s.
 # - Logs lisibles, sans bruit.
 
 from __future__ import annotations
@@ -26,13 +34,18 @@ import subprocess
 import sys
 import threading
 import time
+from collections import OrderedDict
 from typing import Any, Dict, List, Optional, Tuple
 from urllib.parse import parse_qs, urlparse
 
 import discord
+import requests
+from requests.adapters import HTTPAdapter
 from yt_dlp import YoutubeDL
 from yt_dlp.utils import DownloadError
 
+from ..metadata_cache import from_info, get_cache as get_metadata_cache
+
 __all__ = [
     "is_valid",
     "search",
@@ -42,8 +55,10 @@ __all__ = [
     "stream",
     "stream_pipe",
     "download",
+    "probe_metadata",
     "safe_cleanup",
     "invalidate_po_cache",
+    "invalidate_stream_cache",
 ]
 
 _YTDBG = os.getenv("YTDBG", "1").lower() not in ("0", "false", "")
@@ -109,6 +124,7 @@ _FORMAT_CHAIN = os.getenv(
     "bestaudio[acodec=opus]/bestaudio[ext=webm]/bestaudio[ext=m4a]"
     "/251/140/18/best[protocol^=m3u8]/best",
 )
+_OPUS_PASSTHROUGH = os.getenv("AUDIO_OPUS_PASSTHROUGH", "1").lower() not in ("0", "false", "")
 _COOKIE_FILE_DEFAULT = "youtube.com_cookies.txt"
 _AUTO_PIPE_ON_403 = os.getenv("YTDLP_AUTO_PIPE_ON_403", "1").lower() not in ("0", "false", "")
 
@@ -151,6 +167,192 @@ def invalidate_po_cache(video_id: Optional[str] = None) -> None:
             _PO_CACHE.pop(video_id, None)
 
 
+# ══════════════════════════════════════════
+# URLs de flux résolues — cache par (video_id, client)
+# ══════════════════════════════════════════
+# Une URL googlevideo signée reste valable jusqu'à son paramètre `expire=`
+# (epoch, ~6 h) pour le client qui l'a obtenue (UA/headers liés). On garde
+# la marge + la durée du morceau : un reconnect en fin de lecture doit
+# encore passer.
+_STREAM_CACHE_SIZE = int(os.getenv("STREAM_URL_CACHE_SIZE", "256"))
+_STREAM_CACHE_MARGIN = float(os.getenv("STREAM_URL_CACHE_MARGIN_SEC", "300"))
+_STREAM_CACHE: "OrderedDict[Tuple[str, str], Tuple[float, Dict[str, Any]]]" = OrderedDict()
+_STREAM_LOCK = threading.Lock()
+
+# Champs d'info utiles aux lecteurs (stream / stream_pipe)
+_STREAM_KEEP = (
+    "id", "url", "http_headers", "format_id", "ext", "acodec", "abr", "asr",
+    "title", "duration", "webpage_url", "thumbnail", "uploader", "channel", "is_live",
+)
+
+
+def _url_expiry(stream_url: Optional[str]) -> Optional[float]:
+    """Epoch d'expiration d'une URL googlevideo (`expire=`), sinon None."""
+    try:
+        q = parse_qs(urlparse(stream_url or "").query)
+        return float(q["expire"][0])
+    except (KeyError, IndexError, ValueError):
+        return None
+
+
+def _stream_cache_get(video_id: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Info résolue encore valable pour `video_id` (client auto d'abord)."""
+    if not video_id or _STREAM_CACHE_SIZE <= 0:
+        return None
+    now = time.time()
+    found = None
+    dropped = []
+    with _STREAM_LOCK:
+        for client in ("auto", *_CLIENTS_ORDER):
+            entry = _STREAM_CACHE.get((video_id, client))
+            if not entry:
+                continue
+            exp, info = entry
+            if now + _STREAM_CACHE_MARGIN + float(info.get("duration") or 0) >= exp:
+                _STREAM_CACHE.pop((video_id, client), None)
+                dropped.append((video_id, client))
+                continue
+            _STREAM_CACHE.move_to_end((video_id, client))
+            found = dict(info, http_headers=dict(info.get("http_headers") or {}))
+            break
+    for vid, client in dropped:
+        _forget_probe(vid, client)
+    return found
+
+
+def _stream_cache_set(info: Dict[str, Any], client: Optional[str]) -> None:
+    video_id = info.get("id")
+    exp = _url_expiry(info.get("url"))
+    if not video_id or not exp or _STREAM_CACHE_SIZE <= 0:
+        return
+    kept = {k: info[k] for k in _STREAM_KEEP if info.get(k) is not None}
+    kept["player_client"] = client or "auto"
+    key = (video_id, client or "auto")
+    dropped = []
+    with _STREAM_LOCK:
+        old = _STREAM_CACHE.get(key)
+        if old and old[1].get("url") != kept.get("url"):
+            dropped.append(key)
+        _STREAM_CACHE[key] = (exp, kept)
+        _STREAM_CACHE.move_to_end(key)
+        while len(_STREAM_CACHE) > _STREAM_CACHE_SIZE:
+            dropped.append(_STREAM_CACHE.popitem(last=False)[0])
+    # URL remplacée ou évincée : son probe ne vaut plus rien
+    for vid, cl in dropped:
+        _forget_probe(vid, cl)
+
+
+def invalidate_stream_cache(video_id: Optional[str] = None) -> None:
+    """Oublie les URLs résolues (tous clients). Si video_id fourni, uniquement celle-ci."""
+    with _STREAM_LOCK:
+        if video_id is None:
+            _STREAM_CACHE.clear()
+        else:
+            for key in [k for k in _STREAM_CACHE if k[0] == video_id]:
+                _STREAM_CACHE.pop(key, None)
+    if video_id is None:
+        with _PROBE_LOCK:
+            _PROBE_CACHE.clear()
+    else:
+        _forget_probe(video_id)
+
+
+# ══════════════════════════════════════════
+# Probe HTTP — GET ranged sur l'URL résolue
+# ══════════════════════════════════════════
+# Remplace le preflight FFmpeg (2 s décodées, jusqu'à 25 s) : quelques Ko
+# demandés sur une connexion du pool partagé suffisent à voir un 403/429
+# ou une réponse qui n'est pas de l'audio. Seuls les succès sont retenus,
+# par (video_id, client, format, URL), au plus jusqu'à l'expiration de
+# l'URL, et oubliés avec l'entrée du cache d'URLs correspondante.
+_PROBE_TIMEOUT = float(os.getenv("STREAM_PROBE_TIMEOUT", "6"))
+_PROBE_TTL = float(os.getenv("STREAM_PROBE_TTL_SEC", "600"))
+_PROBE_BYTES = 4096
+_PROBE_CACHE: Dict[Tuple[str, str, str, str], float] = {}  # clé → expires_at (epoch)
+_PROBE_LOCK = threading.Lock()
+_HTTP: Optional[requests.Session] = None
+_HTTP_LOCK = threading.Lock()
+
+
+class _SourceAddressAdapter(HTTPAdapter):
+    """Adapter lié à une adresse source (IPv4 forcé : les URLs googlevideo
+    sont signées pour l'IP qui les a obtenues)."""
+
+    def __init__(self, source_address, **kw):
+        self._source_address = source_address
+        super().__init__(**kw)
+
+    def init_poolmanager(self, *args, **kw):
+        kw["source_address"] = self._source_address
+        return super().init_poolmanager(*args, **kw)
+
+
+def _http() -> requests.Session:
+    global _HTTP
+    with _HTTP_LOCK:
+        if _HTTP is None:
+            ses = requests.Session()
+            kw = {"pool_connections": 8, "pool_maxsize": 16, "max_retries": 0}
+            adapter = _SourceAddressAdapter(("0.0.0.0", 0), **kw) if _FORCE_IPV4 else HTTPAdapter(**kw)
+            ses.mount("https://", adapter)
+            ses.mount("http://", adapter)
+            if _HTTP_PROXY:
+                ses.proxies.update({"http": _HTTP_PROXY, "https": _HTTP_PROXY})
+            _HTTP = ses
+        return _HTTP
+
+
+def _probe_key(info: Dict[str, Any]) -> Optional[Tuple[str, str, str, str]]:
+    vid, url = info.get("id"), info.get("url")
+    if not vid or not url:
+        return None
+    # l'URL (signature, expire=) fait partie de la clé : un probe réussi ne
+    # couvre que l'URL effectivement testée
+    return vid, info.get("player_client") or "auto", str(info.get("format_id") or ""), url
+
+
+def _probe_stream_sync(info: Dict[str, Any], headers: Dict[str, str]) -> Tuple[bool, str]:
+    """(ok, détail) pour l'URL directe de `info` : statut 200/206, type audio/vidéo."""
+    url = info.get("url") or ""
+    key = _probe_key(info)
+    now = time.time()
+    if key:
+        with _PROBE_LOCK:
+            exp = _PROBE_CACHE.get(key)
+            if exp and now < exp:
+                return True, "probe en cache"
+            _PROBE_CACHE.pop(key, None)
+    try:
+        with _http().get(
+            url, headers={**headers, "Range": f"bytes=0-{_PROBE_BYTES - 1}"},
+            timeout=_PROBE_TIMEOUT, stream=True,
+        ) as r:
+            ctype = (r.headers.get("Content-Type") or "").lower()
+            if r.status_code not in (200, 206):
+                return False, f"HTTP {r.status_code}"
+            if not ctype.startswith(("audio/", "video/", "application/octet-stream")) and "mpegurl" not in ctype:
+                return False, f"HTTP {r.status_code} content-type={ctype or '?'}"
+            if not next(r.iter_content(_PROBE_BYTES), b""):
+                return False, f"HTTP {r.status_code} corps vide"
+    except requests.RequestException as e:
+        return False, f"probe: {e}"
+    if key:
+        until = now + _PROBE_TTL
+        url_exp = _url_expiry(url)
+        with _PROBE_LOCK:
+            for k in [k for k, exp in _PROBE_CACHE.items() if exp <= now]:
+                _PROBE_CACHE.pop(k, None)
+            _PROBE_CACHE[key] = min(until, url_exp) if url_exp else until
+    return True, f"HTTP {r.status_code} {ctype}"
+
+
+def _forget_probe(video_id: Optional[str], client: Optional[str] = None) -> None:
+    """Oublie les probes de `video_id` (d'un seul client si `client` fourni)."""
+    with _PROBE_LOCK:
+        for key in [k for k in _PROBE_CACHE if k[0] == video_id and (client is None or k[1] == client)]:
+            _PROBE_CACHE.pop(key, None)
+
+
 def _collect_po_tokens_from_env() -> List[str]:
     raw = (os.getenv("YT_PO_TOKEN") or os.getenv("YTDLP_PO_TOKEN") or "").strip()
     prefixed = (os.getenv("YT_PO_TOKEN_PREFIXED") or "").strip()
@@ -296,18 +498,6 @@ def _resolve_ffmpeg_paths(ffmpeg_hint: Optional[str]) -> Tuple[str, Optional[str
     raise FileNotFoundError(f"FFmpeg introuvable: {ffmpeg_hint}")
 
 
-def _ff_reconnect_flags() -> List[str]:
-    return [
-        "-reconnect", "1",
-        "-reconnect_streamed", "1",
-        "-reconnect_at_eof", "1",
-        "-reconnect_on_network_error", "1",
-        "-reconnect_delay_max", "5",
-        "-rw_timeout", "60000000",
-        "-timeout", "60000000",
-    ]
-
-
 def _kill_proc(p) -> None:
     try:
         if p and getattr(p, "poll", lambda: None)() is None:
@@ -512,10 +702,65 @@ def expand_bundle(page_url, limit_total=None, limit=None,
         })
         if len(out) >= N:
             break
+
+    # Entrées « à plat » : complétées par le cache (durée souvent absente), puis retenues
+    try:
+        mc = get_metadata_cache()
+        mc.fill_many(out)
+        mc.put_many(out)
+    except Exception as e:
+        _dbg(f"metadata cache (bundle) failed: {e}")
+    return out
+
+
+# ── Métadonnées seules ──
+def probe_metadata(url_or_query: str, *, cookies_file=None, cookies_from_browser=None) -> Optional[dict]:
+    """Titre / artiste / miniature / durée d'un morceau, sans résoudre de flux.
+
+    Extraction à plat (`process=False` : ni sélection de format ni URL
+    signée). Une requête texte passe par `ytsearch1:`. None si introuvable.
+    """
+    q = (url_or_query or "").strip()
+    if not q:
+        return None
+    opts = _mk_opts(cookies_file=cookies_file, cookies_from_browser=cookies_from_browser, extract_flat=True)
+    opts["skip_download"] = True
+    target = q if q.startswith("http") else f"ytsearch1:{q}"
+    with YoutubeDL(opts) as ydl:
+        info = ydl.extract_info(target, download=False, process=False)
+    if info and info.get("entries") is not None:
+        info = next(iter(info["entries"]), None)
+    if not info:
+        return None
+    vid = info.get("id")
+    url = info.get("webpage_url") or info.get("url") or ""
+    if not url.startswith("http") and vid:
+        url = f"https://www.youtube.com/watch?v={vid}"
+    thumb = info.get("thumbnail") or ((info.get("thumbnails") or [{}])[-1].get("url"))
+    out = {
+        "url": url,
+        "title": info.get("title"),
+        "artist": info.get("artist") or info.get("uploader") or info.get("channel"),
+        "thumb": thumb,
+        "duration": int(info["duration"]) if info.get("duration") else None,
+        "provider": "youtube",
+    }
+    try:
+        get_metadata_cache().put_many([out])
+    except Exception as e:
+        _dbg(f"metadata cache (probe) failed: {e}")
     return out
 
 
 # ── Info fallbacks ──
+def _remember_info(info: Dict[str, Any]) -> None:
+    """Métadonnées d'un extract_info complet → cache partagé (jamais bloquant)."""
+    try:
+        get_metadata_cache().put_many([{**from_info(info), "provider": "youtube"}])
+    except Exception as e:
+        _dbg(f"metadata cache put failed: {e}")
+
+
 def _probe_with_client(
     query, *, cookies_file, cookies_from_browser, ffmpeg_path,
     ratelimit_bps, client=None, po_tokens: Optional[List[str]] = None
@@ -539,6 +784,11 @@ def _probe_with_client(
 def _best_info_with_fallbacks(
     query, *, cookies_file, cookies_from_browser, ffmpeg_path, ratelimit_bps
 ):
+    cached = _stream_cache_get(_extract_video_id(query))
+    if cached:
+        _dbg(f"stream url cache hit: {cached.get('id')}")
+        return cached
+
     po_tokens = _resolve_po_tokens_for(query)
 
     # 1) Tentative avec l'ordre complet de clients (laisse yt-dlp choisir)
@@ -552,6 +802,9 @@ def _best_info_with_fallbacks(
         po_tokens=po_tokens,
     )
     if info and info.get("url"):
+        info["player_client"] = "auto"
+        _remember_info(info)
+        _stream_cache_set(info, None)
         return info
 
     # 2) Fallback : un client à la fois
@@ -567,6 +820,9 @@ def _best_info_with_fallbacks(
         )
         if info and info.get("url"):
             _dbg(f"fallback client={c} worked")
+            info["player_client"] = c
+            _remember_info(info)
+            _stream_cache_set(info, c)
             return info
         _dbg(f"client={c} → no direct url")
     return None
@@ -575,10 +831,45 @@ def _best_info_with_fallbacks(
 # ══════════════════════════════════════════
 # STREAM direct (avec PREFLIGHT obligatoire)
 # ══════════════════════════════════════════
+def _is_opus(info: Dict[str, Any]) -> bool:
+    return (info.get("acodec") or "").lower().startswith("opus")
+
+
+def _teeable(info: Dict[str, Any]) -> bool:
+    """Flux copiable tel quel en webm : opus, durée finie (pas de live)."""
+    return bool(info.get("duration")) and not info.get("is_live") and _is_opus(info)
+
+
+def _ffmpeg_audio(source, ff_exec, *, before_opts, afilter=None, opus=False, tee=None, pipe=False):
+    """Source discord.py : copie Opus quand le flux est déjà en opus et sans
+    filtre (discord.py n'encode plus rien), sinon PCM transcodé.
+
+    `tee` : 1re sortie FFmpeg copiant l'audio en webm. discord.py place ses
+    propres options de sortie avant `options` et `pipe:1` après : la sortie
+    lue par discord.py est donc redéclarée en dernier.
+    """
+    passthrough = _OPUS_PASSTHROUGH and opus and not afilter
+    out_opts = "-vn"
+    if afilter:
+        out_opts += f" -af {shlex.quote(afilter)}"
+    if tee:
+        tail = "-f opus -c:a copy" if passthrough else "-f s16le -ar 48000 -ac 2"
+        out_opts = f"-map 0:a:0 -c:a copy -vn -f webm {shlex.quote(tee)} -map 0:a:0 {out_opts} {tail}"
+    if passthrough:
+        return discord.FFmpegOpusAudio(
+            source, codec="copy", executable=ff_exec,
+            before_options=before_opts, options=out_opts, pipe=pipe,
+        )
+    return discord.FFmpegPCMAudio(
+        source, executable=ff_exec,
+        before_options=before_opts, options=out_opts, pipe=pipe,
+    )
+
+
 async def stream(
     url_or_query, ffmpeg_path,
     *, cookies_file=None, cookies_from_browser=None,
-    ratelimit_bps=None, afilter=None,
+    ratelimit_bps=None, afilter=None, tee_path=None,
 ):
     ff_exec, ff_loc = _resolve_ffmpeg_paths(ffmpeg_path)
     _dbg(f"STREAM request: {url_or_query!r}")
@@ -606,38 +897,22 @@ async def stream(
     ua = headers.pop("User-Agent", _YT_UA)
     hdr_blob = "Referer: https://www.youtube.com/\r\nOrigin: https://www.youtube.com\r\n"
 
-    # ─── Preflight FFmpeg 2s — bloque tôt sur les 403/429 ───
-    def _preflight_direct_sync() -> Tuple[bool, str]:
-        try:
-            cmd = [
-                ff_exec, "-nostdin", "-hide_banner", "-loglevel", "warning",
-                *_ff_reconnect_flags(),
-                "-protocol_whitelist", "file,https,tcp,tls,crypto",
-                "-user_agent", ua, "-headers", hdr_blob,
-                "-probesize", "32k", "-analyzeduration", "0",
-                "-fflags", "nobuffer", "-flags", "low_delay",
-                "-i", stream_url, "-t", "2", "-f", "null", "-",
-            ]
-            if _HTTP_PROXY:
-                cmd = cmd[:1] + ["-http_proxy", _HTTP_PROXY] + cmd[1:]
-            cp = subprocess.run(
-                cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
-                text=True, timeout=25,
-            )
-            tail = (cp.stdout or "")[-400:]
-            if cp.returncode != 0:
-                _dbg(f"preflight direct FAILED rc={cp.returncode} tail={tail}")
-            return cp.returncode == 0, tail
-        except Exception as e:
-            _dbg(f"preflight direct exception: {e}")
-            return False, str(e)
-
-    ok_direct, tail = await asyncio.to_thread(_preflight_direct_sync)
+    # ─── Preflight : GET ranged (quelques Ko) — bloque tôt sur les 403/429 ───
+    probe_headers = {
+        "User-Agent": ua,
+        "Referer": "https://www.youtube.com/",
+        "Origin": "https://www.youtube.com",
+    }
+    ok_direct, tail = await asyncio.to_thread(_probe_stream_sync, info, probe_headers)
+    if not ok_direct:
+        _dbg(f"preflight direct FAILED: {tail}")
 
-    # ─── 403 → invalide le cache PO et tente PIPE ───
+    # ─── 403 → invalide les caches PO / URL et tente PIPE ───
     if not ok_direct:
+        vid = _extract_video_id(url_or_query) or info.get("id")
+        # URL morte (en cache ou fraîche) : la prochaine lecture ré-extrait
+        invalidate_stream_cache(vid)
         if _AUTO_PIPE_ON_403 and ("403" in tail or "Forbidden" in tail or "429" in tail):
-            vid = _extract_video_id(url_or_query) or info.get("id")
             _dbg(f"403/429 détecté → invalidation cache PO pour {vid}, bascule PIPE")
             invalidate_po_cache(vid)
         _dbg("STREAM: direct preflight FAILED → fallback to PIPE")
@@ -662,17 +937,18 @@ async def stream(
     )
     if _HTTP_PROXY:
         before_opts += f" -http_proxy {shlex.quote(_HTTP_PROXY)}"
-    out_opts = "-vn"
-    if afilter:
-        out_opts += f" -af {shlex.quote(afilter)}"
-
-    src = discord.FFmpegPCMAudio(
-        stream_url,
-        before_options=before_opts,
-        options=out_opts,
-        executable=ff_exec,
+    # Tee : copie opus/webm du flux (sans transcodage) vers `tee_path`
+    tee = tee_path if tee_path and _teeable(info) else None
+    if tee:
+        _dbg(f"STREAM: tee → {tee}")
+
+    src = _ffmpeg_audio(
+        stream_url, ff_exec,
+        before_opts=before_opts, afilter=afilter, opus=_is_opus(info), tee=tee,
     )
+    _dbg(f"STREAM: sortie {'opus (copie)' if src.is_opus() else 'PCM'}")
     setattr(src, "_ytdlp_proc", None)
+    setattr(src, "_tee_path", tee)
     return src, title
 
 
@@ -738,6 +1014,8 @@ async def stream_pipe(
     def _preflight_pipe_sync() -> Optional[str]:
         """Renvoie le format gagnant, ou None si TOUS les essais échouent.
 
+        Repli quand le probe HTTP échoue : coûteux (yt-dlp + FFmpeg par format).
+
         ⚠️ FIX MAJEUR : l'ancienne version retournait "18" même en échec,
         ce qui faisait démarrer FFmpeg sur un flux mort et déclenchait la
         boucle de "reconnect réseau" dans le PlayerService.
@@ -790,12 +1068,29 @@ async def stream_pipe(
         _dbg(f"pipe preflight: TOUS les formats ont échoué (last rc={last_rc})")
         return None
 
-    chosen_fmt = await asyncio.to_thread(_preflight_pipe_sync)
+    # URL résolue joignable (GET ranged) → format par défaut sans lancer de
+    # process ; sinon preflight complet yt-dlp + FFmpeg, format par format.
+    chosen_fmt = None
+    if info and info.get("url"):
+        headers = {**(info.get("http_headers") or {}), "Referer": "https://www.youtube.com/", "Origin": "https://www.youtube.com"}
+        ok, detail = await asyncio.to_thread(_probe_stream_sync, info, headers)
+        if ok:
+            chosen_fmt = _FORMAT_CHAIN
+        else:
+            _dbg(f"pipe probe: {detail} → preflight complet")
+            # URL en cache refusée : ne pas la resservir au prochain morceau
+            vid = _extract_video_id(url_or_query) or info.get("id")
+            invalidate_stream_cache(vid)
+            if _AUTO_PIPE_ON_403 and ("403" in detail or "Forbidden" in detail or "429" in detail):
+                invalidate_po_cache(vid)
+    if chosen_fmt is None:
+        chosen_fmt = await asyncio.to_thread(_preflight_pipe_sync)
 
     if chosen_fmt is None:
         # On invalide le cache PO pour cette vidéo : il y a peut-être un PO périmé.
         vid = _extract_video_id(url_or_query) or (info or {}).get("id")
         invalidate_po_cache(vid)
+        invalidate_stream_cache(vid)
         raise RuntimeError(
             "Stream YouTube indisponible (403/SABR). Vérifie les cookies YT "
             "et Playwright/Chromium (PO token)."
@@ -847,8 +1142,10 @@ async def stream_pipe(
 def download(
     url, ffmpeg_path,
     *, cookies_file=None, cookies_from_browser=None,
-    out_dir="downloads", ratelimit_bps=2_500_000,
+    out_dir="downloads", ratelimit_bps=2_500_000, native=False,
 ):
+    """Télécharge l'audio. `native` : fichier tel que servi (opus/webm en
+    priorité via _FORMAT_CHAIN), sans conversion mp3."""
     os.makedirs(out_dir, exist_ok=True)
     ff_exec, ff_loc = _resolve_ffmpeg_paths(ffmpeg_path)
     po_tokens = _resolve_po_tokens_for(url)
@@ -857,7 +1154,7 @@ def download(
         cookies_file=cookies_file,
         cookies_from_browser=cookies_from_browser,
         ratelimit_bps=ratelimit_bps,
-        for_download=True,
+        for_download=not native,
         po_tokens=po_tokens,
     )
     opts["paths"] = {"home": out_dir}
@@ -871,7 +1168,8 @@ def download(
             filepath = (
                 req[0].get("filepath")
                 if req
-                else (os.path.splitext(ydl.prepare_filename(info))[0] + ".mp3")
+                else (ydl.prepare_filename(info) if native
+                      else os.path.splitext(ydl.prepare_filename(info))[0] + ".mp3")
             )
             return (
                 filepath,
@@ -889,7 +1187,8 @@ def download(
                 filepath = (
                     req[0].get("filepath")
                     if req
-                    else (os.path.splitext(ydl.prepare_filename(info))[0] + ".mp3")
+                    else (ydl.prepare_filename(info) if native
+                          else os.path.splitext(ydl.prepare_filename(info))[0] + ".mp3")
                 )
                 return (
                     filepath,
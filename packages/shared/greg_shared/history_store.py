@@ -0,0 +1,632 @@
+"""Historique des lectures en SQLite — un événement par morceau joué.
+
+Base partagée entre le bot (écriture) et l'API (lecture directe, sans
+aller-retour ``get_history``). Mode WAL : les lecteurs ne bloquent pas
+l'écrivain, et inversement.
+
+Les morceaux sont agrégés par ``track_id`` canonique (greg_shared.track_id) :
+toutes les URL d'une même vidéo comptent pour un seul morceau.
+
+Table ``play_events`` indexée par guild/temps, guild/morceau et guild/user :
+top, récents, par utilisateur et fenêtres temporelles sont des requêtes SQL
+agrégées au lieu d'un tri complet en Python. ``weight`` vaut 1 pour une
+lecture ; une ligne importée d'un ancien historique agrégé porte son
+``play_count`` entier (les comptes sont des ``SUM(weight)``).
+
+Table ``track_scores`` : score de tendance à décroissance exponentielle
+(demi-vie ``HISTORY_TRENDING_HALF_LIFE_HOURS``), mis à jour en O(1) à chaque
+insertion. Le score est stocké en « forward decay » :
+``rank_key = ln(Σ exp(λ·t_i))``, indépendant de l'instant de lecture, donc
+indexable ; le top-K est un simple parcours de l'index (guild_id, rank_key).
+Score courant = ``exp(rank_key − λ·now)``.
+
+Table ``transitions`` : « ce qui suit habituellement ce morceau ici ».
+Compteur (guild, morceau, suivant) incrémenté à chaque lecture qui suit une
+autre de moins de ``HISTORY_TRANSITION_MAX_GAP`` secondes ; lu par l'autoplay
+via l'index (guild_id, src_key, count).
+"""
+from __future__ import annotations
+
+import base64
+import binascii
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from greg_shared.track_id import canonical_track_id
+
+logger = logging.getLogger("greg.history_store")
+
+HISTORY_DB_PATH = os.getenv("HISTORY_DB_PATH", os.path.join("history", "history.db"))
+HISTORY_BUSY_TIMEOUT = float(os.getenv("HISTORY_BUSY_TIMEOUT", "5"))
+HISTORY_TRENDING_HALF_LIFE_HOURS = float(os.getenv("HISTORY_TRENDING_HALF_LIFE_HOURS", "72"))
+HISTORY_TRANSITION_MAX_GAP = int(os.getenv("HISTORY_TRANSITION_MAX_GAP", "1800"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS play_events (
+    id         INTEGER PRIMARY KEY,
+    guild_id   INTEGER NOT NULL,
+    ts         INTEGER NOT NULL,
+    track_key  TEXT    NOT NULL,
+    url        TEXT    NOT NULL,
+    title      TEXT    NOT NULL DEFAULT '',
+    artist     TEXT    NOT NULL DEFAULT '',
+    thumb      TEXT    NOT NULL DEFAULT '',
+    duration   INTEGER,
+    provider   TEXT    NOT NULL DEFAULT '',
+    played_by  TEXT    NOT NULL DEFAULT '',
+    weight     INTEGER NOT NULL DEFAULT 1
+);
+CREATE INDEX IF NOT EXISTS idx_events_guild_ts    ON play_events (guild_id, ts);
+CREATE INDEX IF NOT EXISTS idx_events_guild_track ON play_events (guild_id, track_key, ts);
+CREATE INDEX IF NOT EXISTS idx_events_guild_user  ON play_events (guild_id, played_by, ts);
+
+CREATE TABLE IF NOT EXISTS track_scores (
+    guild_id   INTEGER NOT NULL,
+    track_key  TEXT    NOT NULL,
+    rank_key   REAL    NOT NULL,
+    plays      INTEGER NOT NULL DEFAULT 0,
+    last_ts    INTEGER NOT NULL,
+    url        TEXT    NOT NULL,
+    title      TEXT    NOT NULL DEFAULT '',
+    artist     TEXT    NOT NULL DEFAULT '',
+    thumb      TEXT    NOT NULL DEFAULT '',
+    duration   INTEGER,
+    provider   TEXT    NOT NULL DEFAULT '',
+    PRIMARY KEY (guild_id, track_key)
+);
+CREATE INDEX IF NOT EXISTS idx_scores_guild_rank ON track_scores (guild_id, rank_key DESC);
+
+CREATE TABLE IF NOT EXISTS transitions (
+    guild_id  INTEGER NOT NULL,
+    src_key   TEXT    NOT NULL,
+    dst_key   TEXT    NOT NULL,
+    count     INTEGER NOT NULL DEFAULT 0,
+    last_ts   INTEGER NOT NULL,
+    PRIMARY KEY (guild_id, src_key, dst_key)
+);
+CREATE INDEX IF NOT EXISTS idx_transitions_src ON transitions (guild_id, src_key, count DESC);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+_TRANSITION_UPSERT = """
+INSERT INTO transitions (guild_id, src_key, dst_key, count, last_ts) VALUES (?, ?, ?, 1, ?)
+ON CONFLICT (guild_id, src_key, dst_key) DO UPDATE SET
+    count   = count + 1,
+    last_ts = MAX(last_ts, excluded.last_ts)
+"""
+
+# Upsert du score : rank_key ← logaddexp(rank_key, λ·ts), métadonnées de la dernière lecture.
+_SCORE_UPSERT = """
+INSERT INTO track_scores
+    (guild_id, track_key, rank_key, plays, last_ts, url, title, artist, thumb, duration, provider)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (guild_id, track_key) DO UPDATE SET
+    rank_key = greg_logaddexp(rank_key, excluded.rank_key),
+    plays    = plays + excluded.plays,
+    last_ts  = MAX(last_ts, excluded.last_ts),
+    url      = excluded.url,
+    title    = CASE WHEN excluded.title != '' THEN excluded.title ELSE title END,
+    artist   = CASE WHEN excluded.artist != '' THEN excluded.artist ELSE artist END,
+    thumb    = CASE WHEN excluded.thumb != '' THEN excluded.thumb ELSE thumb END,
+    duration = COALESCE(excluded.duration, duration),
+    provider = CASE WHEN excluded.provider != '' THEN excluded.provider ELSE provider END
+"""
+
+# Agrégat par morceau (même forme que les anciennes entrées JSON de HistoryManager) :
+# la sous-requête groupe et limite, la jointure sur le dernier événement apporte
+# les métadonnées de la lecture la plus récente.
+_AGG_SQL = """
+SELECT a.track_key, e.url, e.title, e.artist, e.thumb, e.duration, e.provider,
+       e.played_by AS last_played_by,
+       a.play_count, a.first_played, a.last_played, a.players
+FROM (
+    SELECT track_key,
+           SUM(weight)                      AS play_count,
+           MIN(ts)                          AS first_played,
+           MAX(ts)                          AS last_played,
+           MAX(id)                          AS last_id,
+           GROUP_CONCAT(DISTINCT played_by) AS players
+    FROM play_events WHERE {where}
+    GROUP BY track_key ORDER BY {order} LIMIT ?
+) a JOIN play_events e ON e.id = a.last_id
+ORDER BY {order}
+"""
+
+
+def track_key(url: str, provider: Optional[str] = None) -> str:
+    """Clé d'agrégation d'un morceau : son track_id canonique (cf. greg_shared.track_id)."""
+    return canonical_track_id(url, provider)
+
+
+def encode_cursor(ts: int, event_id: int) -> str:
+    """Curseur opaque d'export : position (ts, id) du dernier événement livré."""
+    raw = f"{int(ts)}:{int(event_id)}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[int, int]:
+    """Inverse d'encode_cursor. Lève ValueError si le curseur est invalide."""
+    try:
+        pad = "=" * (-len(cursor) % 4)
+        ts, event_id = base64.urlsafe_b64decode(cursor + pad).decode().split(":", 1)
+        return int(ts), int(event_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise ValueError(f"invalid cursor: {cursor!r}") from e
+
+
+def decay_rate(half_life_hours: float = HISTORY_TRENDING_HALF_LIFE_HOURS) -> float:
+    """λ (par seconde) pour une demi-vie donnée."""
+    return math.log(2) / max(1e-6, float(half_life_hours) * 3600.0)
+
+
+def _logaddexp(a: float, b: float) -> float:
+    """ln(exp(a) + exp(b)) sans débordement."""
+    if a is None:
+        return b
+    if b is None:
+        return a
+    hi, lo = (a, b) if a >= b else (b, a)
+    return hi + math.log1p(math.exp(lo - hi))
+
+
+def _limit(limit: Optional[int]) -> int:
+    """LIMIT SQL : None ou négatif → pas de limite (-1 pour SQLite)."""
+    return -1 if limit is None or int(limit) < 0 else int(limit)
+
+
+def _row_to_entry(row: sqlite3.Row) -> Dict[str, Any]:
+    players = [p for p in (row["players"] or "").split(",") if p]
+    return {
+        "track_id": row["track_key"],
+        "url": row["url"],
+        "title": row["title"] or row["url"],
+        "artist": row["artist"] or "",
+        "thumb": row["thumb"] or "",
+        "duration": row["duration"],
+        "provider": row["provider"] or "youtube",
+        "play_count": int(row["play_count"]),
+        "first_played": int(row["first_played"]),
+        "last_played": int(row["last_played"]),
+        "last_played_by": row["last_played_by"] or "",
+        "played_by": players[-10:],
+    }
+
+
+class HistoryStore:
+    """Accès SQLite à l'historique (une connexion par thread)."""
+
+    def __init__(self, path: Optional[str] = None, half_life_hours: Optional[float] = None):
+        self.path = path or HISTORY_DB_PATH
+        self.half_life_hours = float(half_life_hours or HISTORY_TRENDING_HALF_LIFE_HOURS)
+        self.decay = decay_rate(self.half_life_hours)
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._initialized = False
+
+    # ─── Connexion ───
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            d = os.path.dirname(self.path)
+            if d:
+                os.makedirs(d, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=HISTORY_BUSY_TIMEOUT, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.create_function("greg_logaddexp", 2, _logaddexp, deterministic=True)
+            conn.create_function("greg_track_id", 2, canonical_track_id, deterministic=True)
+            self._local.conn = conn
+            with self._init_lock:
+                if not self._initialized:
+                    self._migrate_weight(conn)
+                    conn.executescript(_SCHEMA)
+                    self._migrate_track_keys(conn)
+                    self._sync_scores(conn)
+                    self._sync_transitions(conn)
+                    self._initialized = True
+        return conn
+
+    def _migrate_weight(self, conn: sqlite3.Connection) -> None:
+        """Base antérieure à `weight` : colonne ajoutée (1 = une lecture)."""
+        cols = {r["name"] for r in conn.execute("PRAGMA table_info(play_events)")}
+        if cols and "weight" not in cols:
+            conn.execute("ALTER TABLE play_events ADD COLUMN weight INTEGER NOT NULL DEFAULT 1")
+
+    def _migrate_track_keys(self, conn: sqlite3.Connection) -> None:
+        """Base antérieure au track_id canonique : re-clé les événements (hash d'URL →
+        track_id) et force le recalcul des scores et des transitions."""
+        row = conn.execute("SELECT value FROM meta WHERE key = 'track_key_scheme'").fetchone()
+        if row is not None and row["value"] == "canonical":
+            return
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("UPDATE play_events SET track_key = greg_track_id(url, provider)")
+            conn.execute("DELETE FROM meta WHERE key IN ('half_life_hours', 'transitions_built')")
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('track_key_scheme', 'canonical')")
+
+    def _sync_scores(self, conn: sqlite3.Connection) -> None:
+        """Recalcule track_scores si la demi-vie a changé (ou base antérieure aux scores)."""
+        row = conn.execute("SELECT value FROM meta WHERE key = 'half_life_hours'").fetchone()
+        if row is not None and float(row["value"]) == self.half_life_hours:
+            return
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM track_scores")
+            cur = conn.execute(
+                "SELECT guild_id, ts, track_key, url, title, artist, thumb, duration, provider, weight "
+                "FROM play_events ORDER BY id"
+            )
+            while True:
+                chunk = cur.fetchmany(1000)
+                if not chunk:
+                    break
+                conn.executemany(_SCORE_UPSERT, [self._score_row(tuple(r)) for r in chunk])
+            conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('half_life_hours', ?)",
+                (str(self.half_life_hours),),
+            )
+        logger.info("History: scores de tendance recalculés (demi-vie %sh)", self.half_life_hours)
+
+    def _sync_transitions(self, conn: sqlite3.Connection) -> None:
+        """Construit l'index de transitions depuis play_events (base antérieure à l'index)."""
+        if conn.execute("SELECT 1 FROM meta WHERE key = 'transitions_built'").fetchone():
+            return
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM transitions")
+            cur = conn.execute("SELECT guild_id, ts, track_key FROM play_events ORDER BY guild_id, ts, id")
+            prev: Dict[int, tuple] = {}
+            while True:
+                chunk = cur.fetchmany(1000)
+                if not chunk:
+                    break
+                pairs = []
+                for gid, ts, key in chunk:
+                    p = prev.get(gid)
+                    if p and p[0] != key and 0 <= ts - p[1] <= HISTORY_TRANSITION_MAX_GAP:
+                        pairs.append((gid, p[0], key, ts))
+                    prev[gid] = (key, ts)
+                conn.executemany(_TRANSITION_UPSERT, pairs)
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('transitions_built', '1')")
+
+    def _transition_rows(self, conn: sqlite3.Connection, rows: List[tuple], follow: List[bool]) -> List[tuple]:
+        """Transitions (guild, précédent → courant) induites par un lot d'événements.
+
+        Le précédent d'un événement est le dernier événement de la guild (en base
+        ou plus tôt dans le lot). `follow[i]` False : l'événement i n'alimente pas
+        l'index (lecture autoplay, import legacy) mais reste le précédent du suivant.
+        """
+        prev: Dict[int, Optional[tuple]] = {}
+        out = []
+        for r, ok in zip(rows, follow):
+            gid, ts, key = r[0], r[1], r[2]
+            if gid not in prev:
+                last = conn.execute(
+                    "SELECT track_key, ts FROM play_events WHERE guild_id = ? ORDER BY ts DESC, id DESC LIMIT 1",
+                    (gid,),
+                ).fetchone()
+                prev[gid] = (last[0], last[1]) if last else None
+            p = prev[gid]
+            if ok and p and p[0] != key and 0 <= ts - p[1] <= HISTORY_TRANSITION_MAX_GAP:
+                out.append((gid, p[0], key, ts))
+            prev[gid] = (key, ts)
+        return out
+
+    def _score_row(self, ev: tuple) -> tuple:
+        """(guild_id, ts, track_key, url, title, artist, thumb, duration, provider, weight) → args d'upsert.
+
+        Un poids n compte pour n lectures à `ts` : rank_key = λ·ts + ln(n).
+        """
+        gid, ts, key, url, title, artist, thumb, duration, provider, weight = ev
+        weight = max(1, int(weight or 1))
+        return (gid, key, self.decay * ts + math.log(weight), weight, ts, url, title, artist, thumb, duration, provider)
+
+    def close(self) -> None:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    # ─── Écriture ───
+
+    def record(
+        self,
+        guild_id: int,
+        url: str,
+        *,
+        title: str = "",
+        artist: str = "",
+        thumb: str = "",
+        duration: Optional[int] = None,
+        provider: str = "",
+        played_by: Optional[str] = None,
+        ts: Optional[int] = None,
+    ) -> None:
+        """Ajoute un événement de lecture."""
+        self.record_many([{
+            "guild_id": guild_id, "url": url, "title": title, "artist": artist,
+            "thumb": thumb, "duration": duration, "provider": provider,
+            "played_by": played_by, "ts": ts,
+        }])
+
+    def record_many(self, events: Iterable[Dict[str, Any]]) -> int:
+        """Insère plusieurs événements dans une seule transaction."""
+        rows, follow = self._event_rows(events)
+        if not rows:
+            return 0
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            self._insert_rows(conn, rows, follow)
+        return len(rows)
+
+    def import_legacy(self, guild_id: int, events: Iterable[Dict[str, Any]]) -> bool:
+        """Import unique de l'historique legacy d'une guild.
+
+        Les événements et le marqueur `legacy_imported:<gid>` (table meta)
+        sont écrits dans la MÊME transaction : un import raté ne laisse ni
+        lignes partielles ni marqueur. False si la guild était déjà importée.
+        """
+        key = f"legacy_imported:{int(guild_id)}"
+        rows, follow = self._event_rows(events)
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            if conn.execute("SELECT 1 FROM meta WHERE key = ?", (key,)).fetchone():
+                return False
+            if rows:
+                self._insert_rows(conn, rows, follow)
+            conn.execute("INSERT INTO meta (key, value) VALUES (?, ?)", (key, str(int(time.time()))))
+        return True
+
+    def legacy_imported(self, guild_id: int) -> bool:
+        row = self._conn().execute(
+            "SELECT 1 FROM meta WHERE key = ?", (f"legacy_imported:{int(guild_id)}",)
+        ).fetchone()
+        return row is not None
+
+    @staticmethod
+    def _event_rows(events: Iterable[Dict[str, Any]]) -> Tuple[List[tuple], List[bool]]:
+        now = int(time.time())
+        rows = []
+        follow: List[bool] = []
+        for ev in events:
+            url = ev.get("url") or ""
+            if not url or url == "about:blank":
+                continue
+            dur = ev.get("duration")
+            rows.append((
+                int(ev["guild_id"]),
+                int(ev.get("ts") or now),
+                ev.get("track_id") or track_key(url, ev.get("provider")),
+                url,
+                ev.get("title") or "",
+                ev.get("artist") or "",
+                ev.get("thumb") or "",
+                int(dur) if isinstance(dur, (int, float)) else None,
+                ev.get("provider") or "",
+                str(ev.get("played_by") or ""),
+                max(1, int(ev.get("weight") or 1)),
+            ))
+            follow.append(ev.get("transition", True) is not False)
+        return rows, follow
+
+    def _insert_rows(self, conn: sqlite3.Connection, rows: List[tuple], follow: List[bool]) -> None:
+        """Événements + scores + transitions, dans la transaction ouverte par l'appelant."""
+        transitions = self._transition_rows(conn, rows, follow)
+        conn.executemany(
+            "INSERT INTO play_events "
+            "(guild_id, ts, track_key, url, title, artist, thumb, duration, provider, played_by, weight) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+        conn.executemany(_SCORE_UPSERT, [self._score_row((*r[:9], r[10])) for r in rows])
+        conn.executemany(_TRANSITION_UPSERT, transitions)
+
+    # ─── Lecture ───
+
+    @staticmethod
+    def _where(
+        guild_id: int,
+        user_id: Optional[str],
+        since: Optional[int],
+        until: Optional[int],
+    ) -> tuple[str, list]:
+        clauses = ["guild_id = ?"]
+        args: list = [int(guild_id)]
+        if user_id:
+            clauses.append("played_by = ?")
+            args.append(str(user_id))
+        if since is not None:
+            clauses.append("ts >= ?")
+            args.append(int(since))
+        if until is not None:
+            clauses.append("ts < ?")
+            args.append(int(until))
+        return " AND ".join(clauses), args
+
+    def top(
+        self,
+        guild_id: int,
+        limit: int = 20,
+        *,
+        user_id: Optional[str] = None,
+        since: Optional[int] = None,
+        until: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """Morceaux les plus joués (éventuellement par user et/ou sur une fenêtre)."""
+        where, args = self._where(guild_id, user_id, since, until)
+        rows = self._conn().execute(
+            _AGG_SQL.format(where=where, order="play_count DESC, last_played DESC"),
+            (*args, _limit(limit)),
+        ).fetchall()
+        return [_row_to_entry(r) for r in rows]
+
+    def recent(
+        self,
+        guild_id: int,
+        limit: int = 20,
+        *,
+        user_id: Optional[str] = None,
+        since: Optional[int] = None,
+        until: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """Morceaux distincts les plus récemment joués."""
+        where, args = self._where(guild_id, user_id, since, until)
+        rows = self._conn().execute(
+            _AGG_SQL.format(where=where, order="last_played DESC"),
+            (*args, _limit(limit)),
+        ).fetchall()
+        return [_row_to_entry(r) for r in rows]
+
+    def events(
+        self,
+        guild_id: int,
+        limit: int = 50,
+        *,
+        user_id: Optional[str] = None,
+        since: Optional[int] = None,
+        until: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """Événements bruts, du plus récent au plus ancien."""
+        where, args = self._where(guild_id, user_id, since, until)
+        rows = self._conn().execute(
+            "SELECT ts, url, title, artist, thumb, duration, provider, played_by, weight "
+            f"FROM play_events WHERE {where} ORDER BY ts DESC, id DESC LIMIT ?",
+            (*args, _limit(limit)),
+        ).fetchall()
+        return [_event_dict(r) for r in rows]
+
+    def export_page(
+        self,
+        guild_id: int,
+        cursor: Optional[str] = None,
+        page_size: int = 500,
+        *,
+        user_id: Optional[str] = None,
+        since: Optional[int] = None,
+        until: Optional[int] = None,
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Une page d'événements en ordre chronologique, par keyset (ts, id).
+
+        Requête indexée indépendante (pas de OFFSET ni de transaction longue) :
+        l'appelant boucle avec le curseur renvoyé, mémoire constante quelle que
+        soit la taille de l'historique. Retourne (événements, curseur après la
+        page — None si la page est vide). Lève ValueError si `cursor` est invalide.
+        """
+        where, args = self._where(guild_id, user_id, since, until)
+        if cursor:
+            ts, event_id = decode_cursor(cursor)
+            where += " AND (ts, id) > (?, ?)"
+            args += [ts, event_id]
+        rows = self._conn().execute(
+            "SELECT id, ts, url, title, artist, thumb, duration, provider, played_by, weight "
+            f"FROM play_events WHERE {where} ORDER BY ts, id LIMIT ?",
+            (*args, max(1, int(page_size))),
+        ).fetchall()
+        if not rows:
+            return [], None
+        page = []
+        for r in rows:
+            ev = _event_dict(r)
+            del ev["id"]
+            page.append(ev)
+        return page, encode_cursor(rows[-1]["ts"], rows[-1]["id"])
+
+    def query(
+        self,
+        guild_id: int,
+        mode: str = "top",
+        limit: int = 20,
+        *,
+        user_id: Optional[str] = None,
+        since: Optional[int] = None,
+        until: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """Point d'entrée commun bot/API : mode = top | recent | events | trending."""
+        if mode == "trending":
+            return self.trending(guild_id, limit)
+        fn = {"recent": self.recent, "events": self.events}.get(mode, self.top)
+        return fn(guild_id, limit, user_id=user_id, since=since, until=until)
+
+    def next_tracks(self, guild_id: int, track_id: str, limit: int = 5) -> List[Dict[str, Any]]:
+        """Morceaux qui suivent habituellement `track_id` dans la guild (plus fréquents d'abord)."""
+        rows = self._conn().execute(
+            "SELECT s.track_key, s.url, s.title, s.artist, s.thumb, s.duration, s.provider, "
+            "       t.count, t.last_ts "
+            "FROM transitions t JOIN track_scores s "
+            "  ON s.guild_id = t.guild_id AND s.track_key = t.dst_key "
+            "WHERE t.guild_id = ? AND t.src_key = ? "
+            "ORDER BY t.count DESC, t.last_ts DESC LIMIT ?",
+            (int(guild_id), track_id, _limit(limit)),
+        ).fetchall()
+        return [
+            {
+                "track_id": r["track_key"],
+                "url": r["url"],
+                "title": r["title"] or r["url"],
+                "artist": r["artist"] or "",
+                "thumb": r["thumb"] or "",
+                "duration": r["duration"],
+                "provider": r["provider"] or "youtube",
+                "transitions": int(r["count"]),
+                "last_played": int(r["last_ts"]),
+            }
+            for r in rows
+        ]
+
+    def trending(self, guild_id: int, limit: int = 20, now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Top-K par score décroissant dans le temps (parcours d'index, sans agrégat)."""
+        ref = self.decay * float(now if now is not None else time.time())
+        rows = self._conn().execute(
+            "SELECT track_key, url, title, artist, thumb, duration, provider, plays, last_ts, rank_key "
+            "FROM track_scores WHERE guild_id = ? ORDER BY rank_key DESC LIMIT ?",
+            (int(guild_id), _limit(limit)),
+        ).fetchall()
+        return [
+            {
+                "track_id": r["track_key"],
+                "url": r["url"],
+                "title": r["title"] or r["url"],
+                "artist": r["artist"] or "",
+                "thumb": r["thumb"] or "",
+                "duration": r["duration"],
+                "provider": r["provider"] or "youtube",
+                "play_count": int(r["plays"]),
+                "last_played": int(r["last_ts"]),
+                "score": round(math.exp(min(r["rank_key"] - ref, 700.0)), 4),
+            }
+            for r in rows
+        ]
+
+
+def _event_dict(row: sqlite3.Row) -> Dict[str, Any]:
+    """Événement brut ; `weight` n'apparaît que pour une ligne agrégée (import legacy)."""
+    ev = dict(row)
+    if int(ev.pop("weight", 1) or 1) > 1:
+        ev["weight"] = int(row["weight"])
+    return ev
+
+
+_store: Optional[HistoryStore] = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> HistoryStore:
+    """Store partagé du process (chemin HISTORY_DB_PATH)."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = HistoryStore()
+        return _store
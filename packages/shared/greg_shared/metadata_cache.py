@@ -0,0 +1,304 @@
+"""Cache des métadonnées de morceaux — partagé entre guilds et redémarrages.
+
+Titre, artiste, miniature et durée viennent de yt-dlp (``extract_info``,
+``expand_bundle``) ou de la recherche InnerTube de l'API. Ce module les
+retient par ``track_id`` canonique (greg_shared.track_id) :
+
+- niveau 1 : LRU en mémoire (``METADATA_LRU_SIZE`` entrées, par process) ;
+- niveau 2 : SQLite (``METADATA_DB_PATH``, WAL) partagé bot / API.
+
+Chaque entrée expire après ``METADATA_TTL_SECONDS`` (titres renommés,
+miniatures qui changent). Une écriture ne remplace un champ que par une
+valeur non vide : une entrée « à plat » (playlist, sans durée) n'efface
+pas la durée connue par un ``extract_info`` complet.
+
+Le cache ne doit jamais casser l'appelant : toute erreur SQLite est
+journalisée et traitée comme un miss.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from greg_shared.track_id import canonical_track_id
+
+logger = logging.getLogger("greg.metadata_cache")
+
+METADATA_DB_PATH = os.getenv("METADATA_DB_PATH", os.path.join("history", "metadata.db"))
+METADATA_TTL_SECONDS = int(os.getenv("METADATA_TTL_SECONDS", str(30 * 86400)))
+METADATA_LRU_SIZE = int(os.getenv("METADATA_LRU_SIZE", "5000"))
+METADATA_BUSY_TIMEOUT = float(os.getenv("METADATA_BUSY_TIMEOUT", "5"))
+
+FIELDS = ("url", "title", "artist", "thumb", "duration", "provider")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS track_meta (
+    track_id   TEXT PRIMARY KEY,
+    url        TEXT,
+    title      TEXT,
+    artist     TEXT,
+    thumb      TEXT,
+    duration   INTEGER,
+    provider   TEXT,
+    updated_at INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_track_meta_updated ON track_meta (updated_at);
+"""
+
+# Champ vide dans la nouvelle ligne → on garde l'ancien
+_UPSERT = """
+INSERT INTO track_meta (track_id, url, title, artist, thumb, duration, provider, updated_at)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT(track_id) DO UPDATE SET
+    url = COALESCE(NULLIF(excluded.url, ''), url),
+    title = COALESCE(NULLIF(excluded.title, ''), title),
+    artist = COALESCE(NULLIF(excluded.artist, ''), artist),
+    thumb = COALESCE(NULLIF(excluded.thumb, ''), thumb),
+    duration = COALESCE(excluded.duration, duration),
+    provider = COALESCE(NULLIF(excluded.provider, ''), provider),
+    updated_at = excluded.updated_at
+"""
+
+
+def _clean(entry: Dict[str, Any]) -> Dict[str, Any]:
+    """Champs utiles d'une entrée (alias ``thumbnail`` / ``uploader`` acceptés)."""
+    url = (entry.get("webpage_url") or entry.get("url") or "").strip()
+    title = (entry.get("title") or "").strip()
+    if title == url:
+        title = ""  # titre « par défaut » = URL : rien appris
+    dur = entry.get("duration")
+    try:
+        dur = int(dur) if dur is not None and float(dur) > 0 else None
+    except (TypeError, ValueError):
+        dur = None
+    return {
+        "url": url,
+        "title": title,
+        "artist": (entry.get("artist") or entry.get("uploader") or entry.get("channel") or "").strip(),
+        "thumb": (entry.get("thumb") or entry.get("thumbnail") or "").strip(),
+        "duration": dur,
+        "provider": (entry.get("provider") or "").strip(),
+    }
+
+
+def _merge(old: Optional[Dict[str, Any]], new: Dict[str, Any]) -> Dict[str, Any]:
+    if not old:
+        return dict(new)
+    out = dict(old)
+    for k in FIELDS:
+        if new.get(k) not in (None, ""):
+            out[k] = new[k]
+    return out
+
+
+def from_info(info: Dict[str, Any]) -> Dict[str, Any]:
+    """Entrée de cache depuis un dict ``extract_info`` de yt-dlp."""
+    return {
+        "url": info.get("webpage_url") or info.get("original_url") or "",
+        "title": info.get("title"),
+        "artist": info.get("artist") or info.get("uploader") or info.get("channel"),
+        "thumb": info.get("thumbnail"),
+        "duration": info.get("duration"),
+        "provider": (info.get("extractor_key") or info.get("extractor") or "").split(":")[0].lower(),
+    }
+
+
+class MetadataCache:
+    """Deux niveaux : LRU mémoire devant une table SQLite (une connexion par thread)."""
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        ttl: Optional[int] = None,
+        lru_size: Optional[int] = None,
+    ):
+        self.path = path or METADATA_DB_PATH
+        self.ttl = int(METADATA_TTL_SECONDS if ttl is None else ttl)
+        self.lru_size = max(0, int(METADATA_LRU_SIZE if lru_size is None else lru_size))
+        self._lru: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lru_lock = threading.Lock()
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._initialized = False
+        self.hits = 0
+        self.misses = 0
+
+    # ─── Connexion ───
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            d = os.path.dirname(self.path)
+            if d:
+                os.makedirs(d, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=METADATA_BUSY_TIMEOUT, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._init_lock:
+                if not self._initialized:
+                    conn.executescript(_SCHEMA)
+                    conn.execute("DELETE FROM track_meta WHERE updated_at < ?", (int(time.time()) - self.ttl,))
+                    self._initialized = True
+        return conn
+
+    def close(self) -> None:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    # ─── LRU ───
+
+    def _lru_get(self, tid: str, now: float) -> Optional[Dict[str, Any]]:
+        with self._lru_lock:
+            hit = self._lru.get(tid)
+            if hit is None:
+                return None
+            if now - hit[0] > self.ttl:
+                del self._lru[tid]
+                return None
+            self._lru.move_to_end(tid)
+            return hit[1]
+
+    def _lru_put(self, tid: str, meta: Dict[str, Any], ts: float) -> None:
+        if not self.lru_size:
+            return
+        with self._lru_lock:
+            self._lru[tid] = (ts, meta)
+            self._lru.move_to_end(tid)
+            while len(self._lru) > self.lru_size:
+                self._lru.popitem(last=False)
+
+    # ─── Lecture ───
+
+    def get(self, track_id: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Métadonnées connues de `track_id` (None si absent ou expiré)."""
+        if not track_id:
+            return None
+        return self.get_many([track_id]).get(track_id)
+
+    def get_many(self, track_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """Lookup groupé : LRU d'abord, une seule requête SQLite pour le reste."""
+        now = time.time()
+        out: Dict[str, Dict[str, Any]] = {}
+        missing: List[str] = []
+        wanted = list(dict.fromkeys(t for t in track_ids if t))
+        for tid in wanted:
+            meta = self._lru_get(tid, now)
+            if meta is not None:
+                out[tid] = meta
+            else:
+                missing.append(tid)
+        if missing:
+            try:
+                conn = self._conn()
+                for i in range(0, len(missing), 500):
+                    chunk = missing[i:i + 500]
+                    rows = conn.execute(
+                        f"SELECT * FROM track_meta WHERE track_id IN ({','.join('?' * len(chunk))}) "
+                        "AND updated_at >= ?",
+                        (*chunk, int(now) - self.ttl),
+                    ).fetchall()
+                    for r in rows:
+                        meta = {k: r[k] for k in FIELDS}
+                        out[r["track_id"]] = meta
+                        self._lru_put(r["track_id"], meta, float(r["updated_at"]))
+            except sqlite3.Error as e:
+                logger.debug("Metadata cache: lecture impossible: %s", e)
+        self.hits += len(out)
+        self.misses += len(wanted) - len(out)
+        return out
+
+    # ─── Écriture ───
+
+    def put(self, track_id: Optional[str], entry: Dict[str, Any]) -> None:
+        self.put_many([{**entry, "track_id": track_id}])
+
+    def put_many(self, entries: Iterable[Dict[str, Any]]) -> int:
+        """Retient un lot d'entrées (une transaction). Retourne le nombre retenu."""
+        now = time.time()
+        rows = []
+        for e in entries:
+            if not e:
+                continue
+            meta = _clean(e)
+            tid = e.get("track_id") or canonical_track_id(meta["url"], meta["provider"])
+            if not tid or not any(meta[k] for k in ("title", "artist", "thumb", "duration")):
+                continue
+            rows.append((tid, meta))
+        if not rows:
+            return 0
+        try:
+            conn = self._conn()
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.executemany(_UPSERT, [
+                    (tid, m["url"], m["title"], m["artist"], m["thumb"], m["duration"], m["provider"], int(now))
+                    for tid, m in rows
+                ])
+        except sqlite3.Error as e:
+            logger.debug("Metadata cache: écriture impossible: %s", e)
+        # Entrée déjà en LRU : fusion ; sinon la prochaine lecture prendra la
+        # ligne SQLite fusionnée (qui peut garder des champs absents ici).
+        with self._lru_lock:
+            for tid, meta in rows:
+                old = self._lru.get(tid)
+                if old is not None:
+                    self._lru[tid] = (now, _merge(old[1], meta))
+        return len(rows)
+
+    # ─── Complétion ───
+
+    def fill_many(self, items: List[Any]) -> int:
+        """Complète en place les champs vides d'items (dicts ou TrackRecord).
+
+        Un item est complété si son titre manque (ou vaut l'URL), ou si la
+        durée, l'artiste ou la miniature manquent. Retourne le nombre d'items
+        touchés.
+        """
+        wanted: Dict[str, List[Any]] = {}
+        for it in items:
+            tid = it.get("track_id") or canonical_track_id(it.get("url") or "", it.get("provider"))
+            if not tid:
+                continue
+            title = it.get("title") or ""
+            if title and title != it.get("url") and it.get("duration") and it.get("artist") and it.get("thumb"):
+                continue
+            wanted.setdefault(tid, []).append(it)
+        if not wanted:
+            return 0
+        known = self.get_many(list(wanted))
+        touched = 0
+        for tid, meta in known.items():
+            for it in wanted[tid]:
+                changed = False
+                title = it.get("title") or ""
+                if meta.get("title") and (not title or title == it.get("url") or title in ("Sans titre", "Inconnu")):
+                    it["title"] = meta["title"]
+                    changed = True
+                for k in ("artist", "thumb", "duration"):
+                    if not it.get(k) and meta.get(k):
+                        it[k] = meta[k]
+                        changed = True
+                touched += changed
+        return touched
+
+
+_cache: Optional[MetadataCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> MetadataCache:
+    """Cache partagé du process (chemin METADATA_DB_PATH)."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = MetadataCache()
+        return _cache
@@ -1,10 +1,18 @@
-"""Modèles Pydantic — schémas partagés entre tous les services."""
+"""Modèles partagés entre tous les services.
+
+- Schémas Pydantic (validation / API)
+- TrackRecord : item de queue compact (``__slots__``) utilisé en interne par le bot
+"""
 from __future__ import annotations
 
-from typing import Any, Dict, List, Optional
+import uuid
+from dataclasses import dataclass, fields
+from typing import Any, Dict, Iterator, List, Optional
 
 from pydantic import BaseModel, Field
 
+from greg_shared.track_id import canonical_track_id
+
 
 # ─────────────────────────── Track ───────────────────────────
 
@@ -27,6 +35,142 @@ class Track(BaseModel):
         return self.thumbnail
 
 
+@dataclass(slots=True)
+class TrackRecord:
+    """Item de queue / historique compact, sans dict par instance.
+
+    Remplace les dicts copiés à chaque lecture d'état. Garde une interface
+    façon dict (``get``, ``[]``, ``in``, ``keys``) pour le code existant ;
+    la conversion en dict (``to_dict``) ne se fait qu'à la frontière JSON.
+    Les champs hors schéma (``mode``…) vont dans ``extra``.
+
+    ``item_id`` : identifiant stable de l'entrée de queue (≠ position), pour
+    adresser un item sans dépendre de son index.
+    ``track_id`` : identité canonique du morceau (``yt:<id>``…, cf.
+    greg_shared.track_id), commune à toutes les URL d'un même morceau.
+    """
+    url: str = "about:blank"
+    title: str = "Inconnu"
+    artist: Optional[str] = None
+    thumb: Optional[str] = None
+    duration: Optional[int] = None
+    added_by: Optional[str] = None
+    priority: Optional[int] = None
+    provider: Optional[str] = None
+    ts: Optional[int] = None
+    item_id: Optional[str] = None
+    track_id: Optional[str] = None
+    extra: Optional[Dict[str, Any]] = None
+
+    # --- interface façon dict ---
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key in _TRACK_FIELDS:
+            return getattr(self, key)
+        if self.extra:
+            return self.extra.get(key, default)
+        return default
+
+    def __getitem__(self, key: str) -> Any:
+        if key in _TRACK_FIELDS:
+            return getattr(self, key)
+        if self.extra and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        if key in _TRACK_FIELDS:
+            setattr(self, key, value)
+        else:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[key] = value
+
+    def __contains__(self, key: object) -> bool:
+        return key in _TRACK_FIELDS or bool(self.extra and key in self.extra)
+
+    def keys(self) -> Iterator[str]:
+        yield from _TRACK_FIELD_NAMES
+        if self.extra:
+            yield from self.extra
+
+    # --- conversions ---
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Dict JSON-sérialisable (frontière API / disque)."""
+        out = {
+            "title": self.title,
+            "url": self.url,
+            "artist": self.artist,
+            "thumb": self.thumb,
+            "duration": self.duration,
+            "added_by": self.added_by,
+            "priority": self.priority,
+            "provider": self.provider,
+            "ts": self.ts,
+            "item_id": self.item_id,
+            "track_id": self.track_id,
+        }
+        if self.extra:
+            for k, v in self.extra.items():
+                out.setdefault(k, v)
+        return out
+
+    def copy(self) -> "TrackRecord":
+        return TrackRecord(
+            self.url, self.title, self.artist, self.thumb, self.duration,
+            self.added_by, self.priority, self.provider, self.ts, self.item_id,
+            self.track_id, dict(self.extra) if self.extra else None,
+        )
+
+    @staticmethod
+    def new_id() -> str:
+        return uuid.uuid4().hex[:12]
+
+    def ensure_track_id(self) -> str:
+        """Calcule ``track_id`` s'il manque (une fois, à la normalisation)."""
+        if not self.track_id:
+            self.track_id = canonical_track_id(self.url, self.provider) or None
+        return self.track_id or ""
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> "TrackRecord":
+        """Construit depuis un dict déjà normalisé (snapshot, journal)."""
+        extra = {k: v for k, v in d.items() if k not in _TRACK_FIELDS and k not in _TRACK_ALIASES}
+        return cls(
+            url=d.get("url") or "about:blank",
+            title=d.get("title") or "Inconnu",
+            artist=d.get("artist"),
+            thumb=d.get("thumb") or d.get("thumbnail"),
+            duration=d.get("duration"),
+            added_by=d.get("added_by"),
+            priority=d.get("priority"),
+            provider=d.get("provider"),
+            ts=d.get("ts"),
+            item_id=d.get("item_id"),
+            track_id=d.get("track_id"),
+            extra=extra or None,
+        )
+
+    @classmethod
+    def from_any(cls, x: Any) -> "TrackRecord":
+        """TrackRecord tel quel, dict → from_dict, str → url."""
+        if isinstance(x, cls):
+            return x
+        if isinstance(x, dict):
+            return cls.from_dict(x)
+        if isinstance(x, str):
+            return cls(url=x, title=x)
+        return cls()
+
+
+_TRACK_FIELD_NAMES = tuple(f.name for f in fields(TrackRecord) if f.name != "extra")
+_TRACK_FIELDS = frozenset(_TRACK_FIELD_NAMES)
+
+# Alias repliés dans les champs du schéma (pas recopiés dans `extra`)
+_TRACK_ALIASES = frozenset({"thumbnail", "requested_by", "extra"})
+
+
 # ─────────────────────────── User ───────────────────────────
 
 class UserInfo(BaseModel):
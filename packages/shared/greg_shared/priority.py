@@ -7,11 +7,15 @@ Changements par rapport à v1 :
 - Ses propres items sont toujours modifiables
 - PermissionResult structuré pour des messages ciblés
 - Validation des move() pour maintenir l'invariant de zone
+- QueueIndex : frontière de zone + compteurs par user maintenus
+  incrémentalement (insert/quota/validation en O(1))
+- Opérations groupées (reorder, shuffle, suppressions) validées en une passe
 """
 from __future__ import annotations
 
 import json
 import os
+import random
 from dataclasses import dataclass, field
 from typing import Any, Dict, List, Optional, Tuple
 
@@ -317,15 +321,208 @@ def is_priority_item(item: dict) -> bool:
     return int(item.get("priority") or 0) > _get_threshold()
 
 
-def priority_boundary(queue: List[dict]) -> int:
+class QueueIndex:
+    """Index incrémental d'une queue 2 zones.
+
+    Maintenu à chaque mutation par le propriétaire de la queue
+    (PlaylistManager) pour éviter les scans linéaires :
+    - `boundary` : index du premier item non-prioritaire (= priority_boundary)
+    - `user_counts` : nombre d'items par `added_by` (quota)
+    - `tracks` : `track_id` canonique -> items présents (doublons). On garde
+      les items eux-mêmes plutôt que leurs positions, qui glissent à chaque
+      insertion : la position n'est recalculée que si on en a besoin.
+    - `position()` : `item_id` -> position, via une table paresseuse de rangs
+      absolus (décalés de `_base`). Ajout en fin, retrait en tête et
+      remplacement sur place la gardent à jour en O(1) ; les autres
+      mutations l'invalident et elle est reconstruite au prochain lookup.
+
+    Les hooks reçoivent la queue APRÈS mutation. Seul le retrait de l'item
+    pile à la frontière peut avancer `boundary` au-delà d'items prioritaires
+    mal placés (move admin) ; dans une queue bien triée c'est O(1).
+    """
+
+    __slots__ = ("threshold", "boundary", "size", "user_counts", "tracks", "_pos", "_base")
+
+    def __init__(self, queue: Optional[List[dict]] = None):
+        self.threshold = _get_threshold()
+        self.boundary = 0
+        self.size = 0
+        self.user_counts: Dict[str, int] = {}
+        self.tracks: Dict[str, List[dict]] = {}
+        self._pos: Optional[Dict[str, int]] = {}
+        self._base = 0
+        if queue:
+            self.rebuild(queue)
+
+    @staticmethod
+    def _user_key(item) -> str:
+        return str(item.get("added_by"))
+
+    def _is_prio(self, item) -> bool:
+        return int(item.get("priority") or 0) > self.threshold
+
+    def _track_add(self, item) -> None:
+        tid = item.get("track_id")
+        if tid:
+            self.tracks.setdefault(tid, []).append(item)
+
+    def _track_remove(self, item) -> None:
+        tid = item.get("track_id")
+        refs = self.tracks.get(tid) if tid else None
+        if not refs:
+            return
+        # identité, pas égalité : deux copies d'un même morceau restent distinctes
+        for k, ref in enumerate(refs):
+            if ref is item:
+                del refs[k]
+                break
+        if not refs:
+            del self.tracks[tid]
+
+    def rebuild(self, queue: List[dict]) -> None:
+        """Reconstruction complète (chargement, changement de seuil)."""
+        self.threshold = _get_threshold()
+        self.size = len(queue)
+        self.user_counts = {}
+        self.tracks = {}
+        self._pos = None
+        for item in queue:
+            k = self._user_key(item)
+            self.user_counts[k] = self.user_counts.get(k, 0) + 1
+            self._track_add(item)
+        b = 0
+        while b < self.size and self._is_prio(queue[b]):
+            b += 1
+        self.boundary = b
+
+    def sync(self, queue: List[dict]) -> "QueueIndex":
+        """Reconstruit seulement si le seuil a changé ou si l'index a dérivé."""
+        if self.threshold != _get_threshold() or self.size != len(queue):
+            self.rebuild(queue)
+        return self
+
+    def clear(self) -> None:
+        self.boundary = 0
+        self.size = 0
+        self.user_counts = {}
+        self.tracks = {}
+        self._pos = {}
+        self._base = 0
+
+    def inserted(self, queue: List[dict], index: int, items: List[dict]) -> None:
+        """`items` viennent d'être insérés (bloc contigu) à `index`."""
+        if self._pos is not None:
+            if index == self.size:
+                for k, item in enumerate(items):
+                    iid = item.get("item_id")
+                    if iid:
+                        self._pos[iid] = self._base + index + k
+            else:
+                self._pos = None
+        for k, item in enumerate(items):
+            i = index + k
+            uk = self._user_key(item)
+            self.user_counts[uk] = self.user_counts.get(uk, 0) + 1
+            self._track_add(item)
+            self.size += 1
+            if i < self.boundary:
+                if self._is_prio(item):
+                    self.boundary += 1
+                else:
+                    self.boundary = i
+            elif i == self.boundary and self._is_prio(item):
+                self.boundary += 1
+
+    def removed(self, queue: List[dict], index: int, item: dict) -> None:
+        """`item` vient d'être retiré de `index`."""
+        uk = self._user_key(item)
+        left = self.user_counts.get(uk, 0) - 1
+        if left > 0:
+            self.user_counts[uk] = left
+        else:
+            self.user_counts.pop(uk, None)
+        self._track_remove(item)
+        self.size -= 1
+        if self._pos is not None:
+            if index == 0:
+                self._base += 1
+            elif index != self.size:
+                self._pos = None
+        if self._pos is not None:
+            self._pos.pop(item.get("item_id"), None)
+        if index < self.boundary:
+            self.boundary -= 1
+        elif index == self.boundary:
+            b = self.boundary
+            while b < len(queue) and self._is_prio(queue[b]):
+                b += 1
+            self.boundary = b
+
+    def replaced(self, queue: List[dict], index: int, old: dict, new: dict) -> None:
+        """`old` vient d'être remplacé par `new` à `index` (même place)."""
+        if self._is_prio(old) != self._is_prio(new):
+            self.rebuild(queue)
+            return
+        ok, nk = self._user_key(old), self._user_key(new)
+        if ok != nk:
+            left = self.user_counts.get(ok, 0) - 1
+            if left > 0:
+                self.user_counts[ok] = left
+            else:
+                self.user_counts.pop(ok, None)
+            self.user_counts[nk] = self.user_counts.get(nk, 0) + 1
+        self._track_remove(old)
+        self._track_add(new)
+        if self._pos is not None:
+            self._pos.pop(old.get("item_id"), None)
+            iid = new.get("item_id")
+            if iid:
+                self._pos[iid] = self._base + index
+
+    def position(self, queue: List[dict], item_id: Optional[str]) -> Optional[int]:
+        """Position actuelle de l'item `item_id` dans `queue` (None si absent)."""
+        if not item_id:
+            return None
+        for _ in range(2):
+            if self._pos is None:
+                self._base = 0
+                self._pos = {}
+                for i, it in enumerate(queue):
+                    iid = it.get("item_id")
+                    if iid:
+                        self._pos[iid] = i
+            rank = self._pos.get(item_id)
+            if rank is None:
+                return None
+            i = rank - self._base
+            if 0 <= i < len(queue) and queue[i].get("item_id") == item_id:
+                return i
+            # table désynchronisée (queue modifiée hors hooks) : une reconstruction
+            self._pos = None
+        return None
+
+    def user_count(self, user_id) -> int:
+        return self.user_counts.get(str(user_id), 0)
+
+    def track_items(self, track_id: Optional[str]) -> List[dict]:
+        """Items de la queue portant ce `track_id` (ordre d'insertion)."""
+        return list(self.tracks.get(track_id, ())) if track_id else []
+
+    def insert_position(self, new_weight: int) -> int:
+        return self.boundary if int(new_weight or 0) > self.threshold else self.size
+
+
+def priority_boundary(queue: List[dict], index: Optional[QueueIndex] = None) -> int:
     """Index du premier item non-prioritaire (= frontière entre les 2 zones)."""
+    if index is not None:
+        return index.boundary
     for i, item in enumerate(queue):
         if not is_priority_item(item):
             return i
     return len(queue)
 
 
-def find_insert_position(queue: List[dict], new_weight: int) -> int:
+def find_insert_position(queue: List[dict], new_weight: int, index: Optional[QueueIndex] = None) -> int:
     """Trouve la position d'insertion pour un nouvel item.
 
     Logique simple en 2 zones :
@@ -333,7 +530,10 @@ def find_insert_position(queue: List[dict], new_weight: int) -> int:
     - Item normal (poids ≤ seuil) → fin de la queue (FIFO)
 
     La queue reste toujours triée en 2 blocs.
+    Avec un `QueueIndex`, O(1) au lieu d'un scan.
     """
+    if index is not None:
+        return index.insert_position(new_weight)
     threshold = _get_threshold()
     if new_weight > threshold:
         # Trouver la fin de la zone prioritaire
@@ -347,7 +547,8 @@ def find_insert_position(queue: List[dict], new_weight: int) -> int:
 
 def validate_move(
     queue: List[dict], src: int, dst: int,
-    requester_id: int, bot, guild_id: int
+    requester_id: int, bot, guild_id: int,
+    index: Optional[QueueIndex] = None,
 ) -> PermissionResult:
     """Vérifie qu'un move ne casse pas l'invariant de zone.
 
@@ -367,7 +568,7 @@ def validate_move(
 
     src_item = queue[src]
     src_is_prio = is_priority_item(src_item)
-    boundary = priority_boundary(queue)
+    boundary = priority_boundary(queue, index)
 
     # Simule le move pour checker la position finale
     dst_in_prio_zone = dst < boundary if src >= boundary else dst < (boundary - 1)
@@ -381,13 +582,114 @@ def validate_move(
     return PermissionResult(True, "ok")
 
 
-def check_quota(queue: List[dict], user_id: int, bot, guild_id: int) -> PermissionResult:
+# ─────────────────────────── Opérations groupées ───────────────────────────
+
+def editable_indexes(queue: List[dict], requester_id: int, bot, guild_id: int) -> List[int]:
+    """Indexes des items que le requester peut déplacer/supprimer.
+
+    Mêmes règles que can_edit_queue_item(), mais admin et poids du requester
+    ne sont calculés qu'une fois pour toute la queue.
+    """
+    if is_owner(requester_id) or can_bypass_quota(bot, guild_id, requester_id):
+        return list(range(len(queue)))
+    me = str(requester_id)
+    req_weight = get_member_weight(bot, guild_id, requester_id)
+    return [
+        i for i, item in enumerate(queue)
+        if str(item.get("added_by") or "") == me or req_weight >= int(item.get("priority") or 0)
+    ]
+
+
+def validate_reorder(
+    queue: List[dict], order: List[int],
+    requester_id: int, bot, guild_id: int,
+) -> PermissionResult:
+    """Vérifie une permutation complète de la queue (`order[i]` = ancien index
+    de l'item placé en i).
+
+    - `order` doit être une permutation de range(len(queue))
+    - chaque item qui change de place doit être éditable par le requester
+    - hors admin : chaque position garde sa zone (prio/normal), i.e. les items
+      ne sont permutés qu'à l'intérieur de leur zone
+    """
+    n = len(queue)
+    if len(order) != n or sorted(order) != list(range(n)):
+        return PermissionResult(False, "invalid_permutation")
+
+    moved = [i for i, src in enumerate(order) if src != i]
+    if not moved:
+        return PermissionResult(False, "same_position")
+
+    if is_owner(requester_id) or can_bypass_quota(bot, guild_id, requester_id):
+        return PermissionResult(True, "admin")
+
+    allowed = set(editable_indexes(queue, requester_id, bot, guild_id))
+    for i in moved:
+        src = order[i]
+        if src not in allowed:
+            return PermissionResult(False, "insufficient_rank")
+        if is_priority_item(queue[src]) != is_priority_item(queue[i]):
+            return PermissionResult(False, "cannot_cross_priority_zone")
+
+    return PermissionResult(True, "ok")
+
+
+def zone_shuffle_order(
+    queue: List[dict],
+    movable: Optional[List[int]] = None,
+    rng: Optional[random.Random] = None,
+) -> List[int]:
+    """Permutation « shuffle » qui préserve les zones.
+
+    Les items prioritaires sont mélangés entre eux, les normaux entre eux ;
+    seuls les indexes de `movable` (défaut : tous) bougent, les autres restent
+    à leur place. Retourne `order` (cf. validate_reorder).
+    """
+    rng = rng or random
+    order = list(range(len(queue)))
+    allowed = set(order if movable is None else movable)
+    for prio in (True, False):
+        slots = [i for i in order if i in allowed and is_priority_item(queue[i]) == prio]
+        picks = list(slots)
+        rng.shuffle(picks)
+        for slot, src in zip(slots, picks):
+            order[slot] = src
+    return order
+
+
+def validate_removals(
+    queue: List[dict], indexes: List[int],
+    requester_id: int, bot, guild_id: int,
+) -> PermissionResult:
+    """Vérifie la suppression d'un ensemble d'indexes (une seule passe)."""
+    n = len(queue)
+    if not indexes:
+        return PermissionResult(False, "empty_selection")
+    if any(not (0 <= i < n) for i in indexes):
+        return PermissionResult(False, "out_of_bounds")
+    allowed = set(editable_indexes(queue, requester_id, bot, guild_id))
+    if any(i not in allowed for i in indexes):
+        return PermissionResult(False, "insufficient_rank")
+    return PermissionResult(True, "ok")
+
+
+def count_user_items(queue: List[dict], user_id: int, index: Optional[QueueIndex] = None) -> int:
+    """Nombre d'items de la queue ajoutés par cet utilisateur."""
+    if index is not None:
+        return index.user_count(user_id)
+    return sum(1 for item in queue if str(item.get("added_by")) == str(user_id))
+
+
+def check_quota(
+    queue: List[dict], user_id: int, bot, guild_id: int,
+    index: Optional[QueueIndex] = None,
+) -> PermissionResult:
     """Vérifie le quota de l'utilisateur."""
     if can_bypass_quota(bot, guild_id, user_id):
         return PermissionResult(True, "bypass")
 
     cap = _get_cap()
-    count = sum(1 for item in queue if str(item.get("added_by")) == str(user_id))
+    count = count_user_items(queue, user_id, index)
     if count >= cap:
         return PermissionResult(False, f"quota_exceeded:{count}/{cap}")
 
@@ -0,0 +1,348 @@
+"""Queue en Redis — état de playlist lisible sans passer par le bot.
+
+Backend optionnel de PlaylistManager (``PLAYLIST_BACKEND=redis``) :
+- ``greg:queue:<gid>``          LIST  des items (JSON, un par élément)
+- ``greg:queue:<gid>:now``      STRING now_playing (JSON) — absent si rien
+- ``greg:queue:<gid>:version``  STRING version de la queue (= PlaylistManager.version)
+- ``greg:player:<gid>``         STRING flags du player (JSON) publiés par le bot à chaque emit
+
+Chaque mutation est appliquée par un script Lua (atomique) qui vérifie la
+version attendue : en cas d'écart, l'appelant republie un snapshot complet
+(``replace``). L'API lit l'état via ``read_state`` sans aller-retour bot.
+
+Client Redis synchrone (redis-py), importé paresseusement : greg_shared ne
+dépend pas de redis, seuls les services qui activent le backend l'utilisent.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger("greg.queue_store")
+
+KEY_PREFIX = "greg:queue"
+PLAYER_PREFIX = "greg:player"
+
+
+def backend_enabled() -> bool:
+    """True si la queue doit être hébergée dans Redis."""
+    return os.getenv("PLAYLIST_BACKEND", "file").strip().lower() == "redis"
+
+
+def _keys(guild_id: int | str) -> List[str]:
+    gid = str(guild_id).strip()
+    return [f"{KEY_PREFIX}:{gid}", f"{KEY_PREFIX}:{gid}:version", f"{KEY_PREFIX}:{gid}:now"]
+
+
+def player_key(guild_id: int | str) -> str:
+    return f"{PLAYER_PREFIX}:{str(guild_id).strip()}"
+
+
+# ─────────────────────────── Scripts Lua ───────────────────────────
+
+# KEYS : list, version, now
+# ARGV : version attendue, nouvelle version, op, arg1, arg2, items JSON… (ou indexes
+#        pour reorder / remove_many, paires index/JSON pour update_many)
+# Retour : nouvelle version, ou -1 si la version stockée ne correspond pas.
+_APPLY_LUA = """
+local cur = tonumber(redis.call('GET', KEYS[2]) or '0')
+if cur ~= tonumber(ARGV[1]) then return -1 end
+
+local function insert_at(idx, values)
+  local n = redis.call('LLEN', KEYS[1])
+  if idx < 0 then idx = 0 end
+  if idx >= n then
+    for _, v in ipairs(values) do redis.call('RPUSH', KEYS[1], v) end
+    return
+  end
+  local tail = redis.call('LRANGE', KEYS[1], idx, -1)
+  if idx == 0 then
+    redis.call('DEL', KEYS[1])
+  else
+    redis.call('LTRIM', KEYS[1], 0, idx - 1)
+  end
+  for _, v in ipairs(values) do redis.call('RPUSH', KEYS[1], v) end
+  for _, v in ipairs(tail) do redis.call('RPUSH', KEYS[1], v) end
+end
+
+local function remove_at(idx)
+  local v = redis.call('LINDEX', KEYS[1], idx)
+  if not v then return nil end
+  redis.call('LSET', KEYS[1], idx, '__greg_tombstone__')
+  redis.call('LREM', KEYS[1], 1, '__greg_tombstone__')
+  return v
+end
+
+local op = ARGV[3]
+local items = {}
+for i = 6, #ARGV do items[#items + 1] = ARGV[i] end
+
+if op == 'append' then
+  for _, v in ipairs(items) do redis.call('RPUSH', KEYS[1], v) end
+elseif op == 'insert' then
+  insert_at(tonumber(ARGV[4]), items)
+elseif op == 'pop' then
+  local v = redis.call('LPOP', KEYS[1])
+  if v then redis.call('SET', KEYS[3], v) end
+elseif op == 'skip' then
+  redis.call('LPOP', KEYS[1])
+elseif op == 'clear' then
+  redis.call('DEL', KEYS[1], KEYS[3])
+elseif op == 'remove' then
+  remove_at(tonumber(ARGV[4]))
+elseif op == 'move' then
+  local v = remove_at(tonumber(ARGV[4]))
+  if v then insert_at(tonumber(ARGV[5]), {v}) end
+elseif op == 'reorder' then
+  -- items = permutation (anciens indexes, base 0)
+  local all = redis.call('LRANGE', KEYS[1], 0, -1)
+  if #items == #all then
+    redis.call('DEL', KEYS[1])
+    for _, src in ipairs(items) do redis.call('RPUSH', KEYS[1], all[tonumber(src) + 1]) end
+  end
+elseif op == 'remove_many' then
+  for _, idx in ipairs(items) do
+    if redis.call('LINDEX', KEYS[1], tonumber(idx)) then
+      redis.call('LSET', KEYS[1], tonumber(idx), '__greg_tombstone__')
+    end
+  end
+  redis.call('LREM', KEYS[1], 0, '__greg_tombstone__')
+elseif op == 'update' then
+  local idx = tonumber(ARGV[4])
+  if redis.call('LINDEX', KEYS[1], idx) then redis.call('LSET', KEYS[1], idx, items[1]) end
+elseif op == 'update_many' then
+  -- items = index, JSON, index, JSON…
+  for i = 1, #items - 1, 2 do
+    local idx = tonumber(items[i])
+    if redis.call('LINDEX', KEYS[1], idx) then redis.call('LSET', KEYS[1], idx, items[i + 1]) end
+  end
+else
+  return redis.error_reply('unknown op ' .. op)
+end
+
+redis.call('SET', KEYS[2], ARGV[2])
+return tonumber(ARGV[2])
+"""
+
+# KEYS : list, version, now — ARGV : version, now JSON ('' = aucun), items JSON…
+_REPLACE_LUA = """
+redis.call('DEL', KEYS[1])
+for i = 3, #ARGV do redis.call('RPUSH', KEYS[1], ARGV[i]) end
+if ARGV[2] == '' then
+  redis.call('DEL', KEYS[3])
+else
+  redis.call('SET', KEYS[3], ARGV[2])
+end
+redis.call('SET', KEYS[2], ARGV[1])
+return tonumber(ARGV[1])
+"""
+
+
+# KEYS : list, version, player — ARGV : if_version ('' = aucune), start, end ('' = pas d'items)
+# Lecture cohérente : version, longueur, player et fenêtre viennent du même
+# instant (un LRANGE séparé pouvait décrire une autre liste que `version`).
+_READ_LUA = """
+local v = redis.call('GET', KEYS[2])
+if not v then return false end
+local n = redis.call('LLEN', KEYS[1])
+local p = redis.call('GET', KEYS[3]) or ''
+local items = {}
+if ARGV[3] ~= '' and ARGV[1] ~= v then
+  items = redis.call('LRANGE', KEYS[1], tonumber(ARGV[2]), tonumber(ARGV[3]))
+end
+return {v, n, p, items}
+"""
+
+
+class VersionMismatch(Exception):
+    """La version stockée dans Redis ne correspond pas à celle attendue."""
+
+
+# ─────────────────────────── Client ───────────────────────────
+
+_client = None
+
+
+def get_client():
+    """Client Redis synchrone partagé (lazy)."""
+    global _client
+    if _client is None:
+        import redis
+        from greg_shared.config import settings
+
+        _client = redis.from_url(
+            settings.redis_url,
+            decode_responses=True,
+            socket_connect_timeout=5,
+            socket_timeout=5,
+            socket_keepalive=True,
+            health_check_interval=30,
+        )
+    return _client
+
+
+def _dumps(obj: Any) -> str:
+    if hasattr(obj, "to_dict"):
+        obj = obj.to_dict()
+    return json.dumps(obj, ensure_ascii=False, default=str)
+
+
+class RedisQueueStore:
+    """Queue d'une guild dans Redis (mutations atomiques par script Lua)."""
+
+    def __init__(self, guild_id: int | str, client=None):
+        self.guild_id = str(guild_id).strip()
+        self.client = client or get_client()
+        self.keys = _keys(self.guild_id)
+        self._apply_script = self.client.register_script(_APPLY_LUA)
+        self._replace_script = self.client.register_script(_REPLACE_LUA)
+
+    def load(self) -> Optional[Dict[str, Any]]:
+        """{"version", "now_playing", "queue"} ou None si rien n'est stocké."""
+        pipe = self.client.pipeline(transaction=True)
+        pipe.get(self.keys[1])
+        pipe.lrange(self.keys[0], 0, -1)
+        pipe.get(self.keys[2])
+        version, raw_items, raw_now = pipe.execute()
+        if version is None:
+            return None
+        return {
+            "version": int(version),
+            "now_playing": json.loads(raw_now) if raw_now else None,
+            "queue": [json.loads(x) for x in raw_items],
+        }
+
+    def version(self) -> Optional[int]:
+        v = self.client.get(self.keys[1])
+        return int(v) if v is not None else None
+
+    def apply(self, rec: Dict[str, Any]) -> int:
+        """Applique une op PlaylistManager (`{"v", "op", ...}`) côté Redis.
+
+        Lève VersionMismatch si Redis n'est pas à la version `v - 1`.
+        """
+        op = rec["op"]
+        arg1: Any = ""
+        arg2: Any = ""
+        items: List[str] = []
+        if op == "add":
+            op, items = "append", [_dumps(rec["item"])]
+        elif op == "add_many":
+            items = [_dumps(x) for x in rec["items"]]
+            if rec.get("index") is None:
+                op = "append"
+            else:
+                op, arg1 = "insert", int(rec["index"])
+        elif op == "insert":
+            op, arg1, items = "insert", int(rec["index"]), [_dumps(rec["item"])]
+        elif op == "remove":
+            arg1 = int(rec["index"])
+        elif op == "update":
+            arg1, items = int(rec["index"]), [_dumps(rec["item"])]
+        elif op == "update_many":
+            for u in rec["updates"]:
+                items += [str(int(u["index"])), _dumps(u["item"])]
+        elif op == "move":
+            arg1, arg2 = int(rec["src"]), int(rec["dst"])
+        elif op == "reorder":
+            items = [str(int(i)) for i in rec["order"]]
+        elif op == "remove_many":
+            items = [str(int(i)) for i in rec["indexes"]]
+
+        v = int(rec["v"])
+        res = self._apply_script(keys=self.keys, args=[v - 1, v, op, arg1, arg2, *items])
+        if int(res) < 0:
+            raise VersionMismatch(f"guild {self.guild_id}: attendu v{v - 1}")
+        return int(res)
+
+    def replace(self, version: int, now_playing: Any, queue: List[Any]) -> None:
+        """Remplace atomiquement tout l'état stocké (snapshot)."""
+        now = _dumps(now_playing) if now_playing is not None else ""
+        self._replace_script(
+            keys=self.keys,
+            args=[int(version), now, *[_dumps(x) for x in queue]],
+        )
+
+
+# ─────────────────────────── Lecture (API) ───────────────────────────
+
+def player_payload(player: Dict[str, Any]) -> str:
+    """JSON stocké sous `greg:player:<gid>` (flags du player + horodatage).
+
+    `updated_at` permet au lecteur d'extrapoler la position si la lecture
+    n'est pas en pause.
+    """
+    data = dict(player)
+    data["updated_at"] = time.time()
+    return json.dumps(data, ensure_ascii=False, default=str)
+
+
+def read_state(
+    client,
+    guild_id: int | str,
+    offset: int = 0,
+    limit: Optional[int] = None,
+    if_version: Optional[int] = None,
+) -> Optional[Dict[str, Any]]:
+    """État du player lu directement dans Redis (même forme que PlayerService.get_state).
+
+    Retourne None si la guild n'a pas d'état en Redis (backend inactif ou bot
+    jamais passé) : l'appelant retombe alors sur la commande `get_state`.
+    """
+    list_key, version_key, _ = _keys(guild_id)
+    start = max(0, int(offset or 0))
+
+    end = "" if limit is not None and int(limit) <= 0 else (-1 if limit is None else start + int(limit) - 1)
+    res = client.register_script(_READ_LUA)(
+        keys=[list_key, version_key, player_key(guild_id)],
+        args=["" if if_version is None else int(if_version), start, end],
+    )
+    if not res:
+        return None
+    version, total, raw_player, raw_items = res
+    version = int(version)
+    total = int(total)
+
+    unchanged = if_version is not None and int(if_version) == version
+    queue: List[Dict[str, Any]] = []
+    for raw in raw_items or []:
+        it = json.loads(raw)
+        it["requested_by"] = it.get("added_by")
+        queue.append(it)
+
+    player = json.loads(raw_player) if raw_player else {}
+    current = player.get("current")
+
+    paused = bool(player.get("paused", True))
+    position = int(player.get("position") or 0)
+    if not paused and current and player.get("updated_at"):
+        position += max(0, int(time.time() - float(player["updated_at"])))
+    duration = player.get("duration")
+    if duration and position > duration:
+        position = int(duration)
+
+    state = {
+        "guild_id": int(guild_id),
+        "version": version,
+        "queue_offset": start,
+        "queue_total": int(total or 0),
+        "queue": queue,
+        "current": current,
+        "paused": paused,
+        "is_paused": paused,
+        "position": position,
+        "duration": duration,
+        "progress": {"elapsed": position, "duration": duration},
+        "thumbnail": player.get("thumbnail"),
+        "repeat_all": bool(player.get("repeat_all", False)),
+        "autoplay": bool(player.get("autoplay", False)),
+        "requested_by_user": player.get("requested_by_user"),
+        "source": "redis",
+    }
+    if unchanged:
+        state.pop("queue")
+        state["queue_unchanged"] = True
+    return state
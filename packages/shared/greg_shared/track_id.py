@@ -0,0 +1,63 @@
+"""Identité canonique d'un morceau : ``<provider>:<id stable>``.
+
+Une même vidéo arrive sous plusieurs URL (``watch?v=X``, ``watch?v=X&list=…``
+produit par expand_bundle, ``youtu.be/X``, ``/shorts/X``…). Le ``track_id``
+les ramène à une seule clé, calculée une fois à la normalisation de l'item et
+utilisée par la queue, l'historique, les compteurs et les caches.
+
+- YouTube    ``yt:<11 caractères>``
+- SoundCloud ``sc:<artiste>/<morceau>`` (permalink, sans query)
+- Spotify    ``sp:<id du track>``
+- Autre      ``url:<hash court de l'URL normalisée>``
+"""
+from __future__ import annotations
+
+import hashlib
+import re
+from typing import Optional
+from urllib.parse import urlsplit, urlunsplit
+
+_YT_ID_RE = re.compile(
+    r"(?:youtube\.com/(?:watch\?(?:.*&)?v=|shorts/|embed/|live/|v/)|youtu\.be/)([A-Za-z0-9_\-]{11})"
+)
+_YT_BARE_RE = re.compile(r"^[A-Za-z0-9_\-]{11}$")
+_SC_RE = re.compile(r"soundcloud\.com/([^/?#]+)/([^/?#]+)", re.I)
+_SP_RE = re.compile(r"(?:open\.spotify\.com/(?:intl-[a-z]+/)?track/|spotify:track:)([A-Za-z0-9]{22})")
+
+
+def youtube_id(url: str) -> Optional[str]:
+    """Identifiant vidéo YouTube (11 caractères) ou None."""
+    m = _YT_ID_RE.search(url or "")
+    return m.group(1) if m else None
+
+
+def _normalized_url(url: str) -> str:
+    try:
+        parts = urlsplit(url.strip())
+        return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path.rstrip("/"), parts.query, ""))
+    except ValueError:
+        return url.strip()
+
+
+def canonical_track_id(url: str, provider: Optional[str] = None) -> str:
+    """``track_id`` canonique d'une URL ("" si pas d'URL exploitable)."""
+    u = (url or "").strip()
+    if not u or u == "about:blank":
+        return ""
+    prov = (provider or "").strip().lower()
+
+    yt = youtube_id(u)
+    if yt:
+        return f"yt:{yt}"
+    if prov in ("youtube", "yt") and _YT_BARE_RE.match(u):
+        return f"yt:{u}"
+
+    m = _SC_RE.search(u)
+    if m and m.group(2).lower() not in ("sets", "likes", "tracks", "albums", "reposts"):
+        return f"sc:{m.group(1).lower()}/{m.group(2).lower()}"
+
+    m = _SP_RE.search(u)
+    if m:
+        return f"sp:{m.group(1)}"
+
+    return "url:" + hashlib.sha1(_normalized_url(u).encode()).hexdigest()[:16]
@@ -1,29 +1,143 @@
-"""History routes — historique et top des morceaux joués."""
+"""History routes — historique et top des morceaux joués.
+
+Lecture directe de la base SQLite partagée avec le bot (greg_shared.history_store),
+sans aller-retour Redis.
+"""
 from __future__ import annotations
 
-from flask import Blueprint, jsonify, request
-from api.services.bot_bridge import send_command
+import json
+import logging
+import time
+
+from flask import Blueprint, Response, jsonify, request, stream_with_context
+from greg_shared.history_store import decode_cursor, get_store
+
+logger = logging.getLogger("greg.api.history")
 
 bp = Blueprint("history", __name__)
 
+MAX_HISTORY_LIMIT = 200
+EXPORT_PAGE_SIZE = 500
+_MODES = ("top", "recent", "events", "trending")
+
+
+def _opt_int(name: str):
+    v = request.args.get(name)
+    try:
+        return int(v) if v not in (None, "") else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _query(mode: str, user_id: str | None = None):
+    gid = request.args.get("guild_id") or request.headers.get("X-Guild-ID") or ""
+    if not gid:
+        return jsonify({"ok": False, "error": "missing guild_id"}), 400
+    if mode not in _MODES:
+        return jsonify({"ok": False, "error": "invalid mode"}), 400
+    limit = max(1, min(request.args.get("limit", 20, type=int), MAX_HISTORY_LIMIT))
+    since = _opt_int("since")
+    until = _opt_int("until")
+    days = _opt_int("days")
+    if days and since is None:
+        since = int(time.time()) - days * 86400
+    user_id = user_id or request.args.get("user_id") or None
+    try:
+        items = get_store().query(int(gid), mode, limit, user_id=user_id, since=since, until=until)
+    except Exception as e:
+        logger.error("history query failed: %s", e)
+        return jsonify({"ok": False, "error": "HISTORY_UNAVAILABLE"}), 503
+    return jsonify({"ok": True, "items": items, "mode": mode}), 200
+
 
 @bp.get("/history")
 @bp.get("/history/top")
 def history_top():
+    """?guild_id, mode=top|recent|events|trending, limit, user_id, since/until (epoch) ou days."""
+    return _query(request.args.get("mode", "top"))
+
+
+@bp.get("/history/recent")
+def history_recent():
+    return _query("recent")
+
+
+@bp.get("/history/trending")
+def history_trending():
+    """Tendances : score à décroissance exponentielle, top-K lu sur l'index."""
     gid = request.args.get("guild_id") or request.headers.get("X-Guild-ID") or ""
     if not gid:
         return jsonify({"ok": False, "error": "missing guild_id"}), 400
-    mode = request.args.get("mode", "top")
-    limit = request.args.get("limit", 20, type=int)
-    res = send_command("get_history", int(gid), data={"mode": mode, "limit": limit}, timeout=5)
-    return jsonify(res), 200 if res.get("ok") else 409
+    limit = max(1, min(request.args.get("limit", 20, type=int), MAX_HISTORY_LIMIT))
+    try:
+        store = get_store()
+        items = store.trending(int(gid), limit)
+    except Exception as e:
+        logger.error("history trending failed: %s", e)
+        return jsonify({"ok": False, "error": "HISTORY_UNAVAILABLE"}), 503
+    return jsonify({
+        "ok": True, "items": items, "mode": "trending", "half_life_hours": store.half_life_hours,
+    }), 200
 
 
-@bp.get("/history/recent")
-def history_recent():
+@bp.get("/history/user/<user_id>")
+def history_user(user_id: str):
+    """Top d'un utilisateur (mode=recent|events possible)."""
+    return _query(request.args.get("mode", "top"), user_id=user_id)
+
+
+@bp.get("/history/export")
+def history_export():
+    """Export NDJSON de l'historique brut (un événement par ligne, ordre chronologique).
+
+    ?guild_id, cursor (opaque, reprise), limit (optionnel, max d'événements),
+    user_id, since/until. La dernière ligne est `{"cursor": …, "done": bool}` :
+    la repasser en `cursor` pour reprendre là où l'export s'est arrêté.
+    """
     gid = request.args.get("guild_id") or request.headers.get("X-Guild-ID") or ""
     if not gid:
         return jsonify({"ok": False, "error": "missing guild_id"}), 400
-    limit = request.args.get("limit", 20, type=int)
-    res = send_command("get_history", int(gid), data={"mode": "recent", "limit": limit}, timeout=5)
-    return jsonify(res), 200 if res.get("ok") else 409
+    cursor = request.args.get("cursor") or None
+    if cursor:
+        try:
+            decode_cursor(cursor)
+        except ValueError:
+            return jsonify({"ok": False, "error": "invalid cursor"}), 400
+    limit = _opt_int("limit")
+    if limit is not None and limit <= 0:
+        limit = None
+    user_id = request.args.get("user_id") or None
+    since = _opt_int("since")
+    until = _opt_int("until")
+
+    def _generate():
+        store = get_store()
+        sent = 0
+        last = cursor
+        done = False
+        try:
+            while True:
+                size = EXPORT_PAGE_SIZE if limit is None else min(EXPORT_PAGE_SIZE, limit - sent)
+                if size <= 0:
+                    break
+                page, page_cursor = store.export_page(
+                    int(gid), last, size, user_id=user_id, since=since, until=until,
+                )
+                if page:
+                    yield "".join(json.dumps(ev, ensure_ascii=False) + "\n" for ev in page)
+                    sent += len(page)
+                    last = page_cursor
+                if len(page) < size:
+                    done = True
+                    break
+        except Exception as e:
+            logger.error("history export failed: %s", e)
+            yield json.dumps({"error": "HISTORY_UNAVAILABLE", "cursor": last, "done": False}) + "\n"
+            return
+        yield json.dumps({"cursor": last, "done": done, "count": sent}) + "\n"
+
+    return Response(
+        stream_with_context(_generate()),
+        mimetype="application/x-ndjson",
+        headers={"Cache-Control": "no-store", "X-Accel-Buffering": "no"},
+    )
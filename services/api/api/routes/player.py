@@ -1,12 +1,22 @@
 """Player routes — contrôle du lecteur de musique via Redis bridge."""
 from __future__ import annotations
 
+import logging
+from typing import Optional
+
 from flask import Blueprint, jsonify, request
 
-from api.services.bot_bridge import send_command
+from greg_shared.metadata_cache import get_cache as get_metadata_cache
+
+from api.services.bot_bridge import fetch_state, send_command
+
+logger = logging.getLogger("greg.api.player")
 
 bp = Blueprint("player", __name__)
 
+# Taille max d'une fenêtre de queue renvoyée par /player/state
+MAX_STATE_LIMIT = 500
+
 
 def _gid(req, data=None) -> int:
     if data is None:
@@ -28,13 +38,53 @@ def _uid(req, data=None) -> int:
         return 0
 
 
+def _int_arg(req, name: str) -> Optional[int]:
+    v = req.args.get(name)
+    if v is None or v == "":
+        return None
+    try:
+        return int(v)
+    except (TypeError, ValueError):
+        return None
+
+
+def _cas(data: dict) -> dict:
+    """Champs de concurrence optimiste transmis au bot (expected_version, item_id).
+
+    Une version périmée ou un item disparu → VERSION_CONFLICT / ITEM_NOT_FOUND (409),
+    avec la version courante dans la réponse.
+    """
+    out = {}
+    v = data.get("expected_version")
+    if v is not None and v != "":
+        try:
+            out["expected_version"] = int(v)
+        except (TypeError, ValueError):
+            pass
+    if data.get("item_id"):
+        out["item_id"] = str(data["item_id"])
+    return out
+
+
 @bp.get("/player/state")
 def get_state():
+    """État du player. Query optionnelle : offset, limit (fenêtre de queue), if_version."""
     gid = _gid(request)
     if not gid:
         return jsonify({"ok": False, "error": "missing guild_id"}), 400
 
-    res = send_command("get_state", gid, timeout=8)
+    window = {}
+    offset = _int_arg(request, "offset")
+    limit = _int_arg(request, "limit")
+    if_version = _int_arg(request, "if_version")
+    if offset is not None:
+        window["offset"] = max(0, offset)
+    if limit is not None:
+        window["limit"] = max(0, min(limit, MAX_STATE_LIMIT))
+    if if_version is not None:
+        window["if_version"] = if_version
+
+    res = fetch_state(gid, window, timeout=8)
 
     if res.get("ok"):
         return jsonify(res), 200
@@ -70,6 +120,11 @@ def enqueue():
         "thumb": data.get("thumb") or data.get("thumbnail"),
         "provider": data.get("provider"),
     }
+    # URL seule (collée) : titre, durée, miniature depuis le cache partagé
+    try:
+        get_metadata_cache().fill_many([item])
+    except Exception as e:
+        logger.debug("metadata fill failed: %s", e)
 
     res = send_command("play_for_user", gid, uid, data={"item": item}, timeout=20)
     code = 200 if res.get("ok") else (403 if res.get("error") == "PRIORITY_FORBIDDEN" else 409)
@@ -123,6 +178,18 @@ def repeat():
     return jsonify(res), 200 if res.get("ok") else 409
 
 
+@bp.post("/player/autoplay")
+def autoplay():
+    """Autoplay : file vide → suite tirée de l'historique de la guild."""
+    data = request.get_json(silent=True) or {}
+    gid = _gid(request, data)
+    mode = str(data.get("mode", "toggle")).strip().lower()
+    if not gid:
+        return jsonify({"ok": False, "error": "missing guild_id"}), 400
+    res = send_command("autoplay", gid, data={"mode": mode}, timeout=8)
+    return jsonify(res), 200 if res.get("ok") else 409
+
+
 @bp.post("/player/move")
 def move():
     data = request.get_json(silent=True) or {}
@@ -132,7 +199,7 @@ def move():
     dst = data.get("dst")
     if not gid or not uid or src is None or dst is None:
         return jsonify({"ok": False, "error": "missing params"}), 400
-    res = send_command("move", gid, uid, data={"src": int(src), "dst": int(dst)}, timeout=8)
+    res = send_command("move", gid, uid, data={"src": int(src), "dst": int(dst), **_cas(data)}, timeout=8)
     code = 200 if res.get("ok") else (403 if "PRIORITY" in str(res.get("error", "")) else 409)
     return jsonify(res), code
 
@@ -144,7 +211,68 @@ def remove_at(index: int):
     uid = _uid(request, data)
     if not gid or not uid:
         return jsonify({"ok": False, "error": "missing guild_id/user_id"}), 400
-    res = send_command("remove", gid, uid, data={"index": index}, timeout=8)
+    res = send_command("remove", gid, uid, data={"index": index, **_cas(data)}, timeout=8)
+    code = 200 if res.get("ok") else (403 if "PRIORITY" in str(res.get("error", "")) else 409)
+    return jsonify(res), code
+
+
+# ── Opérations groupées (une seule écriture + un seul emit côté bot) ──
+
+@bp.post("/player/queue/reorder")
+def reorder():
+    """Body: {order: [anciens indexes dans le nouvel ordre]}."""
+    data = request.get_json(silent=True) or {}
+    gid = _gid(request, data)
+    uid = _uid(request, data)
+    order = data.get("order")
+    if not gid or not uid or not isinstance(order, list):
+        return jsonify({"ok": False, "error": "missing params"}), 400
+    try:
+        order = [int(i) for i in order]
+    except (TypeError, ValueError):
+        return jsonify({"ok": False, "error": "invalid order"}), 400
+    res = send_command("reorder", gid, uid, data={"order": order, **_cas(data)}, timeout=8)
+    code = 200 if res.get("ok") else (403 if "PRIORITY" in str(res.get("error", "")) else 409)
+    return jsonify(res), code
+
+
+@bp.post("/player/queue/shuffle")
+def shuffle():
+    data = request.get_json(silent=True) or {}
+    gid = _gid(request, data)
+    uid = _uid(request, data)
+    if not gid or not uid:
+        return jsonify({"ok": False, "error": "missing guild_id/user_id"}), 400
+    res = send_command("shuffle", gid, uid, data=_cas(data), timeout=8)
+    code = 200 if res.get("ok") else (403 if "PRIORITY" in str(res.get("error", "")) else 409)
+    return jsonify(res), code
+
+
+@bp.post("/player/queue/remove")
+def remove_many():
+    """Body: {indexes: [...], item_ids: [...]} ou {user_id_target: "..."} (tous les items d'un user)."""
+    data = request.get_json(silent=True) or {}
+    gid = _gid(request, data)
+    uid = _uid(request, data)
+    if not gid or not uid:
+        return jsonify({"ok": False, "error": "missing guild_id/user_id"}), 400
+    target = data.get("user_id_target")
+    if target:
+        res = send_command("remove_user", gid, uid, data={"target_user_id": int(target), **_cas(data)}, timeout=8)
+    else:
+        indexes = data.get("indexes") or []
+        item_ids = data.get("item_ids") or []
+        if not isinstance(indexes, list) or not isinstance(item_ids, list) or not (indexes or item_ids):
+            return jsonify({"ok": False, "error": "missing indexes"}), 400
+        try:
+            indexes = [int(i) for i in indexes]
+        except (TypeError, ValueError):
+            return jsonify({"ok": False, "error": "invalid indexes"}), 400
+        res = send_command(
+            "remove_many", gid, uid,
+            data={"indexes": indexes, "item_ids": [str(i) for i in item_ids], **_cas(data)},
+            timeout=8,
+        )
     code = 200 if res.get("ok") else (403 if "PRIORITY" in str(res.get("error", "")) else 409)
     return jsonify(res), code
 
@@ -197,7 +325,7 @@ def playlist_play_at():
     index = data.get("index", 0)
     if not gid or not uid:
         return jsonify({"ok": False, "error": "missing guild_id/user_id"}), 400
-    res = send_command("play_at", gid, uid, data={"index": int(index)}, timeout=8)
+    res = send_command("play_at", gid, uid, data={"index": int(index), **_cas(data)}, timeout=8)
     code = 200 if res.get("ok") else (403 if "PRIORITY" in str(res.get("error", "")) else 409)
     return jsonify(res), code
 
@@ -10,7 +10,9 @@ from __future__ import annotations
 
 import json
 import logging
+import queue
 import re
+import threading
 from typing import Any, Dict, List, Optional
 from urllib.parse import quote_plus
 
@@ -18,6 +20,8 @@ import requests as req
 
 from flask import Blueprint, jsonify, request
 
+from greg_shared.metadata_cache import get_cache as get_metadata_cache
+
 logger = logging.getLogger("greg.api.search")
 
 bp = Blueprint("search", __name__)
@@ -252,6 +256,47 @@ def _scrape_search(query: str, limit: int = 8) -> List[Dict[str, Any]]:
         return []
 
 
+# ─── Cache de métadonnées (write-behind) ───
+# L'API tourne sous eventlet sans monkey-patching : un write SQLite (BEGIN
+# IMMEDIATE, jusqu'à METADATA_BUSY_TIMEOUT en cas de collision avec le bot)
+# bloquerait le hub, donc tous les clients HTTP / Socket.IO. Les résultats
+# sont empilés sans attendre et écrits par un thread natif dédié.
+
+_CACHE_PENDING: "queue.Queue[List[Dict[str, Any]]]" = queue.Queue(maxsize=256)
+_cache_writer: Optional[threading.Thread] = None
+_cache_writer_lock = threading.Lock()
+
+
+def _cache_writer_loop() -> None:
+    while True:
+        batch = _CACHE_PENDING.get()
+        while True:
+            try:
+                batch.extend(_CACHE_PENDING.get_nowait())
+            except queue.Empty:
+                break
+        try:
+            get_metadata_cache().put_many(batch)
+        except Exception as e:
+            logger.debug("metadata cache put failed: %s", e)
+
+
+def _remember_results(results: List[Dict[str, Any]]) -> None:
+    """Retient les résultats dans le cache de métadonnées, sans bloquer la requête."""
+    global _cache_writer
+    if not results:
+        return
+    if _cache_writer is None:
+        with _cache_writer_lock:
+            if _cache_writer is None:
+                _cache_writer = threading.Thread(target=_cache_writer_loop, name="greg-search-cache", daemon=True)
+                _cache_writer.start()
+    try:
+        _CACHE_PENDING.put_nowait([{**r, "provider": "youtube"} for r in results])
+    except queue.Full:
+        logger.debug("metadata cache: file pleine, résultats non retenus")
+
+
 # ─── Routes ───
 
 def _do_autocomplete():
@@ -267,6 +312,9 @@ def _do_autocomplete():
     if not results:
         results = _scrape_search(q, limit)
 
+    # Retenues pour la suite : un ajout par URL n'aura pas à re-résoudre titre/durée
+    _remember_results(results)
+
     return jsonify({"ok": True, "results": results}), 200
 
 
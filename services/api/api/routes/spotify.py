@@ -14,7 +14,7 @@ import requests as req
 from flask import Blueprint, jsonify, request, session, redirect
 
 from greg_shared.config import settings
-from api.services.bot_bridge import send_command
+from api.services.bot_bridge import fetch_state, send_command
 
 logger = logging.getLogger("greg.api.spotify")
 
@@ -268,7 +268,7 @@ def spotify_quickplay():
         "url": search_query,
         "title": track.get("name", search_query),
         "artist": track.get("artists", ""),
-        "duration": track.get("duration_ms"),
+        "duration": int(track["duration_ms"]) // 1000 if track.get("duration_ms") else None,
         "thumb": track.get("image"),
         "provider": "spotify",
     }
@@ -290,7 +290,7 @@ def spotify_add_current():
         return jsonify({"ok": False, "error": "missing params"}), 400
 
     # Get current track from bot
-    state_res = send_command("get_state", int(gid), timeout=5)
+    state_res = fetch_state(int(gid), timeout=5)
     state = state_res.get("state", state_res)
     current = state.get("current") or state.get("now_playing")
     if not current:
@@ -341,7 +341,7 @@ def spotify_add_queue():
         return jsonify({"ok": False, "error": "missing params"}), 400
 
     # Get queue from bot
-    state_res = send_command("get_state", int(gid), timeout=8)
+    state_res = fetch_state(int(gid), timeout=8)
     state = state_res.get("state", state_res)
     queue = state.get("queue", [])[:max_items]
 
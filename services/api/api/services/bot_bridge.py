@@ -8,6 +8,10 @@ Robustesse connexion :
   transparente sur ConnectionError / TimeoutError.
 - reset-and-retry applicatif : filet de sécurité si le pool renvoie quand
   même une connexion crevée (notamment sur le chemin pubsub).
+
+Lecture d'état : avec PLAYLIST_BACKEND=redis, `fetch_state` lit la queue et
+les flags du player directement dans Redis (pas d'aller-retour bot) et ne
+retombe sur la commande `get_state` que si rien n'y est stocké.
 """
 from __future__ import annotations
 
@@ -25,6 +29,7 @@ from redis.exceptions import (
     TimeoutError as RedisTimeoutError,
 )
 
+from greg_shared import queue_store
 from greg_shared.config import settings
 
 logger = logging.getLogger("greg.api.bridge")
@@ -142,6 +147,31 @@ def send_command(
     return {"ok": False, "error": "TIMEOUT"}
 
 
+def fetch_state(guild_id: int, window: Optional[dict] = None, timeout: float = 8.0) -> Dict[str, Any]:
+    """État du player : lecture Redis directe si possible, sinon commande bot.
+
+    `window` : {"offset", "limit", "if_version"} (tous optionnels).
+    Même forme de réponse que send_command("get_state") : {"ok", "state"}.
+    """
+    window = window or {}
+    if queue_store.backend_enabled():
+        try:
+            state = queue_store.read_state(
+                _get_redis(), guild_id,
+                offset=window.get("offset", 0),
+                limit=window.get("limit"),
+                if_version=window.get("if_version"),
+            )
+            if state is not None:
+                return {"ok": True, "state": state}
+        except (RedisConnectionError, RedisTimeoutError) as e:
+            logger.warning("Lecture d'état Redis échouée: %s — fallback bot", e)
+            _reset_redis()
+        except Exception as e:
+            logger.warning("Lecture d'état Redis échouée: %s — fallback bot", e)
+    return send_command("get_state", guild_id, data=window, timeout=timeout)
+
+
 def send_fire_and_forget(
     action: str,
     guild_id: int,
@@ -66,6 +66,12 @@ def _handle_message(socketio, channel: str, data: dict):
     room = f"guild:{guild_id}" if guild_id else None
 
     if channel == CHANNEL_STATE:
+        patch = data.get("patch")
+        if patch is not None:
+            # Patch versionné : le client l'applique ou se resynchronise.
+            if room:
+                socketio.emit("playlist_patch", patch, room=room)
+            return
         state = data.get("state", data)
         if room:
             socketio.emit("playlist_update", state, room=room)
@@ -95,9 +95,9 @@ def on_request_state(data):
     if not guild_id:
         return
 
-    from api.services.bot_bridge import send_command
+    from api.services.bot_bridge import fetch_state
     try:
-        res = send_command("get_state", int(guild_id), timeout=5)
+        res = fetch_state(int(guild_id), timeout=5)
         if res.get("ok"):
             state = res.get("state", res)
             emit("playlist_update", state)
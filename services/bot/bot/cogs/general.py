@@ -196,13 +196,14 @@ class General(commands.Cog):
         # Count cookies
         count = sum(1 for l in netscape.splitlines() if l and not l.startswith("#") and l.count("\t") >= 6)
 
-        # ── Invalide le cache PO + negative cache token_fetcher : ──
+        # ── Invalide les caches PO / URL + negative cache token_fetcher : ──
         # un changement de cookies peut débloquer l'auto-fetch et change
         # de toute façon la donne côté yt-dlp. Inutile de garder les
         # anciens tokens / le verrou négatif.
         try:
-            from greg_shared.extractors.youtube import invalidate_po_cache  # noqa
+            from greg_shared.extractors.youtube import invalidate_po_cache, invalidate_stream_cache  # noqa
             invalidate_po_cache()
+            invalidate_stream_cache()
         except Exception:
             pass
         try:
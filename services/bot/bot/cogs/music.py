@@ -96,6 +96,7 @@ class Music(commands.Cog):
                 "GUILD_NOT_FOUND": "error_guild_not_found",
                 "USER_NOT_IN_VOICE": "error_not_in_voice",
                 "VOICE_CONNECT_FAILED": "error_voice_connect",
+                "DUPLICATE": "error_duplicate",
             }
             key = error_map.get(code, "error_generic")
             if "Quota" in str(code):
@@ -188,6 +189,16 @@ class Music(commands.Cog):
         key = "repeat_on" if state else "repeat_off"
         await inter.followup.send(greg_says(key, user=inter.user.mention), ephemeral=True)
 
+    @app_commands.command(name="autoplay", description="Enchaîne sur l'historique du serveur quand la file est vide.")
+    @app_commands.describe(mode="on/off (vide pour basculer)")
+    async def autoplay(self, inter: discord.Interaction, mode: Optional[str] = None):
+        await inter.response.defer(ephemeral=True)
+        if await self._deny_if_locked(inter):
+            return
+        state = await self.svc.set_autoplay(inter.guild_id, mode)
+        key = "autoplay_on" if state else "autoplay_off"
+        await inter.followup.send(greg_says(key, user=inter.user.mention), ephemeral=True)
+
     @app_commands.command(name="remove", description="Supprime un item de la file (index 1-based).")
     @app_commands.describe(index="Index dans /playlist (1, 2, 3…)")
     async def remove(self, inter: discord.Interaction, index: int):
@@ -197,7 +208,7 @@ class Music(commands.Cog):
         if index <= 0:
             return await inter.followup.send("❌ Index invalide.")
         try:
-            ok = self.svc.remove_at(inter.guild_id, inter.user.id, index - 1)
+            ok = await self.svc.remove_at(inter.guild_id, inter.user.id, index - 1)
             await inter.followup.send("🗑️ Supprimé." if ok else "❌ Index hors limites.")
         except PermissionError:
             await inter.followup.send(greg_says("error_priority", user=inter.user.mention))
@@ -211,7 +222,7 @@ class Music(commands.Cog):
         if src <= 0 or dst <= 0:
             return await inter.followup.send("❌ Index invalides.")
         try:
-            ok = self.svc.move(inter.guild_id, inter.user.id, src - 1, dst - 1)
+            ok = await self.svc.move(inter.guild_id, inter.user.id, src - 1, dst - 1)
             await inter.followup.send("🔀 Déplacé." if ok else "❌ Impossible.")
         except PermissionError:
             await inter.followup.send(greg_says("error_priority", user=inter.user.mention))
@@ -15,6 +15,7 @@ import pkgutil
 import discord
 from discord.ext import commands
 
+from greg_shared import queue_store
 from greg_shared.config import settings
 
 from bot.services.player_service import PlayerService
@@ -57,6 +58,11 @@ class GregBot(commands.Bot):
         asyncio.create_task(self.redis_bridge.start_listening())
         logger.info("Redis bridge démarré.")
 
+        # Pré-chargement audio des morceaux populaires (basse priorité)
+        self.player_service.cache_warmer.start()
+        # Complétion des durées / titres manquants
+        self.player_service.backfill.start()
+
     async def _load_cogs(self, package: str):
         """Charge tous les cogs d'un package."""
         cogs_dir = os.path.join(os.path.dirname(__file__), "cogs")
@@ -83,9 +89,19 @@ class GregBot(commands.Bot):
         await self.redis_bridge.publish_bot_ready()
 
     def emit_state_update(self, guild_id: int, payload: dict = None):
-        """Publie un state update sur Redis pour que l'API le relaye en WebSocket."""
+        """Publie un state update sur Redis pour que l'API le relaye en WebSocket.
+
+        Sans payload explicite : patch versionné (ou snapshot en repli).
+        Backend Redis : les flags du player sont aussi stockés pour l'API.
+        """
         if payload is None:
-            payload = self.player_service.get_state(guild_id)
+            payload = self.player_service.build_state_update(guild_id)
         asyncio.create_task(
             self.redis_bridge.publish_state_update(guild_id, payload)
         )
+        if queue_store.backend_enabled():
+            asyncio.create_task(
+                self.redis_bridge.store_player_state(
+                    guild_id, self.player_service.player_flags(guild_id)
+                )
+            )
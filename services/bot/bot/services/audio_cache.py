@@ -0,0 +1,177 @@
+"""AudioCache — fichiers audio locaux indexés par ``track_id`` canonique.
+
+Un morceau présent dans le cache est joué depuis le disque (FFmpeg local) :
+démarrage immédiat, ni yt-dlp ni URL signée qui expire (403). Le cache est
+rempli en tâche de fond par ``CacheWarmer`` et borné en taille : au-delà de
+``AUDIO_CACHE_MAX_MB``, les fichiers les moins récemment joués partent.
+
+Un fichier par morceau : ``<AUDIO_CACHE_DIR>/<track_id assaini>.<ext>``. Le
+répertoire est scanné une fois au démarrage ; ensuite les lookups se font
+dans un dict en mémoire (O(1), pas de stat par lecture).
+
+L'audio est gardé tel que servi (opus/webm, sans transcodage). Outre le
+warmer, une première lecture en flux direct remplit le cache au passage
+(« tee » FFmpeg, ``AUDIO_CACHE_TEE``) : le fichier est écrit dans ``.tmp/``
+et n'entre dans le cache, par rename atomique, que si le morceau a été lu
+jusqu'au bout.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger("greg.audio_cache")
+
+AUDIO_CACHE_DIR = os.getenv("AUDIO_CACHE_DIR", "audio_cache")
+AUDIO_CACHE_MAX_MB = float(os.getenv("AUDIO_CACHE_MAX_MB", "2048"))
+AUDIO_CACHE_TEE = os.getenv("AUDIO_CACHE_TEE", "1").lower() in ("1", "true", "on")
+
+_TMP_DIR = ".tmp"
+_UNSAFE_RE = re.compile(r"[^A-Za-z0-9_\-]")
+
+
+def cache_key(track_id: str) -> str:
+    """Nom de fichier (sans extension) d'un ``track_id`` : ``yt:abc`` → ``yt_abc``."""
+    return _UNSAFE_RE.sub("_", track_id or "")[:120]
+
+
+class AudioCache:
+    """Cache disque borné, éviction LRU (date de dernier accès en mémoire)."""
+
+    def __init__(self, root: str = AUDIO_CACHE_DIR, max_mb: float = AUDIO_CACHE_MAX_MB):
+        self.root = root
+        self.max_bytes = int(max(0.0, float(max_mb)) * 1024 * 1024)
+        self._lock = threading.Lock()
+        # cache_key → (chemin, taille, dernier accès)
+        self._entries: Dict[str, Tuple[str, int, float]] = {}
+        self._total = 0
+        self._scan()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    @property
+    def total_bytes(self) -> int:
+        return self._total
+
+    def _scan(self) -> None:
+        if not self.enabled:
+            return
+        try:
+            os.makedirs(self.root, exist_ok=True)
+            shutil.rmtree(os.path.join(self.root, _TMP_DIR), ignore_errors=True)
+            with os.scandir(self.root) as it:
+                for de in it:
+                    if not de.is_file():
+                        continue
+                    st = de.stat()
+                    key = os.path.splitext(de.name)[0]
+                    self._entries[key] = (de.path, st.st_size, st.st_mtime)
+                    self._total += st.st_size
+        except OSError as e:
+            logger.warning("Audio cache: scan de %s impossible: %s", self.root, e)
+        if self._entries:
+            logger.info("Audio cache: %d fichiers, %.1f Mo", len(self._entries), self._total / 1048576)
+
+    def tmp_dir(self, track_id: str) -> str:
+        """Répertoire de travail d'un téléchargement (même disque → rename atomique)."""
+        path = os.path.join(self.root, _TMP_DIR, cache_key(track_id))
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def tee_path(self, track_id: Optional[str]) -> Optional[str]:
+        """Fichier temporaire à remplir pendant une première lecture, sinon None."""
+        if not AUDIO_CACHE_TEE or not self.enabled or not track_id or self.has(track_id):
+            return None
+        # Répertoire propre à chaque lecture : deux guilds peuvent jouer le même morceau
+        return os.path.join(self.tmp_dir(f"{track_id}-tee-{uuid.uuid4().hex[:8]}"), "audio.webm")
+
+    def finish_tee(self, track_id: str, path: str, complete: bool) -> Optional[str]:
+        """Clôt un tee : fichier complet → cache (rename atomique), sinon jeté."""
+        final = None
+        try:
+            if complete and os.path.isfile(path) and os.path.getsize(path) > 0:
+                final = self.put(track_id, path)
+        except OSError as e:
+            logger.warning("Audio cache: tee de %s non retenu: %s", track_id, e)
+        finally:
+            shutil.rmtree(os.path.dirname(path), ignore_errors=True)
+        return final
+
+    def has(self, track_id: Optional[str]) -> bool:
+        return bool(track_id) and cache_key(track_id) in self._entries
+
+    def path_for(self, track_id: Optional[str]) -> Optional[str]:
+        """Chemin du fichier caché (et le marque comme récemment utilisé), sinon None."""
+        if not track_id or not self.enabled:
+            return None
+        key = cache_key(track_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            path, size, _ = entry
+            if not os.path.exists(path):
+                self._entries.pop(key, None)
+                self._total -= size
+                return None
+            now = time.time()
+            self._entries[key] = (path, size, now)
+        try:
+            os.utime(path, (now, now))  # l'ordre LRU survit au redémarrage
+        except OSError:
+            pass
+        return path
+
+    def put(self, track_id: str, src_path: str) -> Optional[str]:
+        """Déplace `src_path` dans le cache sous `track_id`. Retourne le chemin final."""
+        if not track_id or not self.enabled:
+            return None
+        key = cache_key(track_id)
+        ext = os.path.splitext(src_path)[1] or ".bin"
+        dst = os.path.join(self.root, key + ext)
+        size = os.path.getsize(src_path)
+        os.replace(src_path, dst)
+        with self._lock:
+            old = self._entries.get(key)
+            if old is not None:
+                self._total -= old[1]
+                if old[0] != dst:
+                    try:
+                        os.remove(old[0])
+                    except OSError:
+                        pass
+            self._entries[key] = (dst, size, time.time())
+            self._total += size
+        self.evict()
+        return dst
+
+    def evict(self) -> int:
+        """Supprime les moins récemment utilisés jusqu'à repasser sous la limite."""
+        removed = 0
+        with self._lock:
+            if self._total <= self.max_bytes:
+                return 0
+            for key, (path, size, _) in sorted(self._entries.items(), key=lambda kv: kv[1][2]):
+                if self._total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    logger.warning("Audio cache: suppression de %s impossible: %s", path, e)
+                    continue
+                del self._entries[key]
+                self._total -= size
+                removed += 1
+        if removed:
+            logger.info("Audio cache: %d fichier(s) évincé(s), %.1f Mo", removed, self._total / 1048576)
+        return removed
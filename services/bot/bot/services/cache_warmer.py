@@ -0,0 +1,225 @@
+"""CacheWarmer — pré-télécharge l'audio des morceaux populaires.
+
+Tâche de fond à basse priorité : à chaque tour, prend les morceaux les plus
+joués et en tendance de chaque guild (history_store), et télécharge ceux qui
+ne sont pas encore dans l'``AudioCache`` via ``youtube.download`` (format
+natif, opus/webm sans transcodage). Les relectures démarrent alors depuis
+le disque.
+
+Garde-fous :
+- concurrence : pool de threads dédié (``CACHE_WARM_CONCURRENCY``), threads
+  en ``nice`` (hérité par yt-dlp / ffmpeg) ; jamais l'executor par défaut ;
+- bande passante : débit par téléchargement (``CACHE_WARM_RATELIMIT_BPS``) et
+  budget glissant sur une heure (``CACHE_WARM_BUDGET_MB_PER_HOUR``) ;
+- temps mort : avec ``CACHE_WARM_IDLE_ONLY``, aucun téléchargement ne démarre
+  tant qu'une guild joue ;
+- échecs : un morceau en échec n'est pas retenté avant ``CACHE_WARM_RETRY_AFTER``.
+
+Seuls les morceaux YouTube (``yt:``) sont concernés : c'est le seul
+extracteur qui sait télécharger.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import shutil
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from greg_shared.extractors import youtube
+from greg_shared.history_store import HistoryStore, get_store
+
+from bot.services.audio_cache import AudioCache
+
+logger = logging.getLogger("greg.cache_warmer")
+
+CACHE_WARM_ENABLED = os.getenv("CACHE_WARM_ENABLED", "1").lower() in ("1", "true", "on")
+CACHE_WARM_INTERVAL = float(os.getenv("CACHE_WARM_INTERVAL", "600"))  # secondes entre deux tours
+CACHE_WARM_TOP = int(os.getenv("CACHE_WARM_TOP", "20"))  # morceaux par guild (top + tendances)
+CACHE_WARM_CONCURRENCY = int(os.getenv("CACHE_WARM_CONCURRENCY", "1"))
+CACHE_WARM_RATELIMIT_BPS = int(os.getenv("CACHE_WARM_RATELIMIT_BPS", "1000000"))
+CACHE_WARM_BUDGET_MB_PER_HOUR = float(os.getenv("CACHE_WARM_BUDGET_MB_PER_HOUR", "300"))
+CACHE_WARM_IDLE_ONLY = os.getenv("CACHE_WARM_IDLE_ONLY", "1").lower() in ("1", "true", "on")
+CACHE_WARM_MAX_DURATION = int(os.getenv("CACHE_WARM_MAX_DURATION", "900"))  # secondes
+CACHE_WARM_RETRY_AFTER = float(os.getenv("CACHE_WARM_RETRY_AFTER", "21600"))
+
+_IDLE_POLL = 15.0  # secondes entre deux vérifications d'inactivité
+_BUDGET_WINDOW = 3600.0
+_NICE = 10
+
+
+def _lower_priority() -> None:
+    """Initializer des threads du pool : priorité CPU/IO basse (Linux : par thread)."""
+    try:
+        os.setpriority(os.PRIO_PROCESS, os.gettid(), _NICE)
+    except (AttributeError, OSError):
+        pass
+
+
+class CacheWarmer:
+    """Remplit l'AudioCache avec les morceaux populaires, hors des heures de lecture."""
+
+    def __init__(self, player_service: Any, cache: AudioCache, store: Optional[HistoryStore] = None):
+        self.svc = player_service
+        self.cache = cache
+        self._store = store
+        self._task: Optional[asyncio.Task] = None
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._sem = asyncio.Semaphore(max(1, CACHE_WARM_CONCURRENCY))
+        self._spent: Deque[Tuple[float, int]] = deque()  # (ts, octets) sur la dernière heure
+        self._failed: Dict[str, float] = {}
+        self._inflight: set = set()
+        self.budget_bytes = int(CACHE_WARM_BUDGET_MB_PER_HOUR * 1024 * 1024)
+
+    @property
+    def store(self) -> HistoryStore:
+        if self._store is None:
+            self._store = get_store()
+        return self._store
+
+    # ─── Cycle de vie ───
+
+    def start(self) -> None:
+        if not CACHE_WARM_ENABLED or not self.cache.enabled:
+            logger.info("Cache warmer désactivé.")
+            return
+        if self._task is not None and not self._task.done():
+            return
+        self._pool = ThreadPoolExecutor(
+            max_workers=max(1, CACHE_WARM_CONCURRENCY),
+            thread_name_prefix="greg-warm",
+            initializer=_lower_priority,
+        )
+        self._task = asyncio.create_task(self._run())
+        logger.info(
+            "Cache warmer démarré (concurrence=%d, budget=%.0f Mo/h, idle_only=%s).",
+            max(1, CACHE_WARM_CONCURRENCY), CACHE_WARM_BUDGET_MB_PER_HOUR, CACHE_WARM_IDLE_ONLY,
+        )
+
+    async def stop(self) -> None:
+        t, self._task = self._task, None
+        if t is not None:
+            t.cancel()
+            try:
+                await t
+            except asyncio.CancelledError:
+                pass
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    # ─── Planification ───
+
+    def _idle(self) -> bool:
+        if not CACHE_WARM_IDLE_ONLY:
+            return True
+        return not any(self.svc.is_playing.values())
+
+    def _spent_last_hour(self) -> int:
+        cutoff = time.time() - _BUDGET_WINDOW
+        while self._spent and self._spent[0][0] < cutoff:
+            self._spent.popleft()
+        return sum(n for _, n in self._spent)
+
+    def _budget_left(self) -> bool:
+        return self.budget_bytes <= 0 or self._spent_last_hour() < self.budget_bytes
+
+    def _guild_ids(self) -> List[int]:
+        return [int(g.id) for g in getattr(self.svc.bot, "guilds", []) or []]
+
+    def candidates(self) -> List[Dict[str, Any]]:
+        """Morceaux à pré-charger : tendances puis top de chaque guild, dédoublonnés."""
+        now = time.time()
+        out: List[Dict[str, Any]] = []
+        seen: set = set()
+        for gid in self._guild_ids():
+            try:
+                rows = self.store.trending(gid, CACHE_WARM_TOP) + self.store.top(gid, CACHE_WARM_TOP)
+            except Exception as e:
+                logger.debug("Cache warmer: historique illisible pour la guild %s: %s", gid, e)
+                continue
+            for r in rows:
+                tid = r.get("track_id") or ""
+                if not tid.startswith("yt:") or tid in seen:
+                    continue
+                seen.add(tid)
+                dur = r.get("duration")
+                if isinstance(dur, (int, float)) and CACHE_WARM_MAX_DURATION and dur > CACHE_WARM_MAX_DURATION:
+                    continue
+                if self.cache.has(tid) or tid in self._inflight:
+                    continue
+                if now - self._failed.get(tid, 0.0) < CACHE_WARM_RETRY_AFTER:
+                    continue
+                out.append(r)
+        return out
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.warm_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Cache warmer: tour en échec: %s", e)
+            await asyncio.sleep(CACHE_WARM_INTERVAL)
+
+    async def warm_once(self) -> int:
+        """Un tour : pré-charge les candidats tant que budget et inactivité le permettent."""
+        loop = asyncio.get_running_loop()
+        todo = await loop.run_in_executor(self._pool, self.candidates)
+        if not todo:
+            return 0
+        tasks: List[asyncio.Task] = []
+        for row in todo:
+            while not self._idle():
+                await asyncio.sleep(_IDLE_POLL)
+            if not self._budget_left():
+                logger.info("Cache warmer: budget horaire atteint, reprise au prochain tour.")
+                break
+            await self._sem.acquire()
+            tasks.append(asyncio.create_task(self._warm(row)))
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        done = sum(1 for r in results if r is True)
+        if done:
+            logger.info("Cache warmer: %d morceau(x) pré-chargé(s), cache %.1f Mo.", done, self.cache.total_bytes / 1048576)
+        return done
+
+    # ─── Téléchargement ───
+
+    def _download_sync(self, tid: str, url: str) -> int:
+        tmp = self.cache.tmp_dir(tid)
+        try:
+            path, _title, _dur = youtube.download(
+                url, self.svc.ffmpeg_path,
+                cookies_file=self.svc._cookies_file,
+                out_dir=tmp,
+                ratelimit_bps=CACHE_WARM_RATELIMIT_BPS,
+                native=True,
+            )
+            if not path or not os.path.exists(path):
+                raise RuntimeError("fichier téléchargé introuvable")
+            size = os.path.getsize(path)
+            self.cache.put(tid, path)
+            return size
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    async def _warm(self, row: Dict[str, Any]) -> bool:
+        tid = row["track_id"]
+        self._inflight.add(tid)
+        try:
+            loop = asyncio.get_running_loop()
+            size = await loop.run_in_executor(self._pool, self._download_sync, tid, row["url"])
+            self._spent.append((time.time(), size))
+            logger.debug("Cache warmer: %s (%s) pré-chargé, %.1f Mo", row.get("title"), tid, size / 1048576)
+            return True
+        except Exception as e:
+            self._failed[tid] = time.time()
+            logger.debug("Cache warmer: échec %s (%s): %s", row.get("title"), tid, e)
+            return False
+        finally:
+            self._inflight.discard(tid)
+            self._sem.release()
@@ -1,137 +1,310 @@
 """HistoryManager — historique des morceaux joués par guild.
 
-Stocke les morceaux joués dans un fichier JSON par guild.
-Chaque entrée a un compteur de lectures (play_count) et un timestamp.
-Permet de construire un "top" des morceaux les plus joués et des suggestions.
+Façade par guild sur ``greg_shared.history_store`` : chaque lecture est un
+événement en SQLite (WAL), top / récents / par utilisateur / fenêtres
+temporelles sont des requêtes indexées. L'API lit la même base directement.
+
+Les écritures passent par ``HistoryRecorder`` (write-behind) : le lancement
+d'un morceau ne fait qu'empiler un événement en mémoire, un thread dédié les
+écrit par lots.
+
+Les anciens fichiers ``history/history_<gid>.json`` (entrées agrégées) sont
+importés une fois, en tâche de fond, puis renommés en ``.migrated`` : chaque
+entrée devient une ou deux lignes pondérées portant son ``play_count`` réel.
 """
 from __future__ import annotations
 
-import hashlib
+import atexit
 import json
 import logging
 import os
+import queue
 import threading
 import time
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Set
+
+from greg_shared.history_store import HistoryStore, get_store
+from greg_shared.models import TrackRecord
 
 logger = logging.getLogger("greg.history")
 
 HISTORY_DIR = "history"
-MAX_ENTRIES = 500  # Max entries per guild
 
+# Write-behind
+HISTORY_FLUSH_INTERVAL = float(os.getenv("HISTORY_FLUSH_INTERVAL", "2.0"))  # secondes
+HISTORY_QUEUE_MAX = int(os.getenv("HISTORY_QUEUE_MAX", "1000"))  # événements en attente
+HISTORY_BATCH_MAX = int(os.getenv("HISTORY_BATCH_MAX", "200"))  # événements par transaction
 
-class HistoryManager:
-    """Gestion de l'historique des morceaux joués pour une guild."""
+# Import legacy raté (SQLITE_BUSY, disque…) : nouvel essai après ce délai
+HISTORY_MIGRATE_RETRY = float(os.getenv("HISTORY_MIGRATE_RETRY", "60"))
+
+_migrate_lock = threading.Lock()
+_migrated: Set[int] = set()
+_migrate_retry_at: Dict[int, float] = {}
+
+
+def _legacy_events(gid: int, entries: List[Any]) -> List[Dict[str, Any]]:
+    """Entrées agrégées du JSON → événements pondérés (ordre chronologique)."""
+    events = []
+    for e in entries:
+        if not isinstance(e, dict) or not e.get("url"):
+            continue
+        try:
+            count = max(1, int(e.get("play_count") or 1))
+        except (TypeError, ValueError):
+            count = 1
+        first = int(e.get("first_played") or e.get("last_played") or 0) or None
+        last = int(e.get("last_played") or 0) or first
+        for ts, weight in ((first, 1), (last, count - 1)):
+            if weight <= 0:
+                continue
+            events.append({
+                "guild_id": gid,
+                "url": e["url"],
+                "title": e.get("title") or "",
+                "artist": e.get("artist") or "",
+                "thumb": e.get("thumb") or "",
+                "duration": e.get("duration"),
+                "provider": e.get("provider") or "",
+                "played_by": e.get("last_played_by") or "",
+                "ts": ts,
+                "weight": weight,
+                # Ordre reconstitué : pas de transitions fiables
+                "transition": False,
+            })
+    # Ordre chronologique : le dernier événement porte les métadonnées courantes
+    events.sort(key=lambda ev: ev["ts"] or 0)
+    return events
 
-    def __init__(self, guild_id: int):
-        self.guild_id = int(guild_id)
-        self.lock = threading.Lock()
-        self._entries: Dict[str, Dict[str, Any]] = {}  # keyed by url hash
-        self._filepath = os.path.join(HISTORY_DIR, f"history_{self.guild_id}.json")
-        self._load()
 
-    def _load(self):
+def migrate_legacy(store: HistoryStore, guild_id: int) -> None:
+    """Importe l'ancien JSON agrégé d'une guild.
+
+    Chaque entrée donne une ligne à `first_played` (poids 1) et, si elle a été
+    jouée plusieurs fois, une ligne à `last_played` de poids `play_count - 1` :
+    compteurs, top et tendances gardent le vrai nombre de lectures.
+    Le marqueur « déjà importé » est une ligne `meta` écrite dans la même
+    transaction que les événements (`HistoryStore.import_legacy`) ; la guild
+    n'est tenue pour migrée qu'après succès, un échec est retenté plus tard.
+    """
+    gid = int(guild_id)
+    with _migrate_lock:
+        if gid in _migrated or time.monotonic() < _migrate_retry_at.get(gid, 0.0):
+            return
+        path = os.path.join(HISTORY_DIR, f"history_{gid}.json")
         try:
-            if os.path.exists(self._filepath):
-                with open(self._filepath, "r", encoding="utf-8") as f:
+            if not os.path.exists(path):
+                _migrated.add(gid)
+                return
+            events: List[Dict[str, Any]] = []
+            if not store.legacy_imported(gid):
+                with open(path, "r", encoding="utf-8") as f:
                     data = json.load(f)
-                if isinstance(data, dict):
-                    self._entries = data
-                elif isinstance(data, list):
-                    # Migrate from old list format
-                    for item in data:
-                        key = self._key(item.get("url", ""))
-                        if key:
-                            self._entries[key] = item
+                entries = list(data.values()) if isinstance(data, dict) else list(data or [])
+                events = _legacy_events(gid, entries)
+                if store.import_legacy(gid, events):
+                    logger.info(
+                        "History guild %s: %d lectures importées depuis le JSON (%d lignes)",
+                        gid, sum(ev["weight"] for ev in events), len(events),
+                    )
+            os.replace(path, path + ".migrated")
+            _migrated.add(gid)
+            _migrate_retry_at.pop(gid, None)
         except Exception as e:
-            logger.warning("History load failed for guild %s: %s", self.guild_id, e)
-            self._entries = {}
+            _migrate_retry_at[gid] = time.monotonic() + HISTORY_MIGRATE_RETRY
+            logger.warning("History migration failed for guild %s (nouvel essai dans %.0fs): %s",
+                           gid, HISTORY_MIGRATE_RETRY, e)
+
+
+def migrate_legacy_async(store: HistoryStore, guild_id: int) -> None:
+    """Lance `migrate_legacy` dans un thread (jamais sur la boucle du bot)."""
+    if int(guild_id) in _migrated:
+        return
+    threading.Thread(
+        target=migrate_legacy, args=(store, guild_id),
+        name=f"greg-history-migrate-{guild_id}", daemon=True,
+    ).start()
+
+
+def play_event(
+    guild_id: int,
+    track: TrackRecord | Dict[str, Any],
+    played_by: Optional[str] = None,
+    transition: bool = True,
+) -> Optional[Dict[str, Any]]:
+    """Événement de lecture prêt à insérer (None si le morceau n'a pas d'URL).
+
+    `transition=False` : la lecture ne compte pas comme suite du morceau
+    précédent dans l'index de transitions (ex. choix de l'autoplay).
+    """
+    track = TrackRecord.from_any(track)
+    url = track.url
+    if not url or url == "about:blank":
+        return None
+    return {
+        "guild_id": int(guild_id),
+        "url": url,
+        "title": track.title if track.title and track.title != url else "",
+        "artist": track.artist or "",
+        "thumb": track.thumb or "",
+        "duration": track.duration,
+        "provider": track.provider or "youtube",
+        "track_id": track.ensure_track_id() or None,
+        "played_by": played_by,
+        "ts": int(time.time()),
+        "transition": transition,
+    }
+
+
+class HistoryRecorder:
+    """Write-behind : file bornée en mémoire, vidée par lots par un thread dédié.
+
+    `record` ne touche jamais au disque. File pleine → l'événement le plus
+    ancien est abandonné (journalisé) plutôt que de bloquer la lecture.
+    """
 
-    def _save(self):
+    def __init__(
+        self,
+        store: Optional[HistoryStore] = None,
+        flush_interval: float = HISTORY_FLUSH_INTERVAL,
+        max_pending: int = HISTORY_QUEUE_MAX,
+        batch_max: int = HISTORY_BATCH_MAX,
+    ):
+        self._store = store
+        self.flush_interval = max(0.05, float(flush_interval))
+        self.batch_max = max(1, int(batch_max))
+        self._pending: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=max(1, int(max_pending)))
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self.dropped = 0
+
+    @property
+    def store(self) -> HistoryStore:
+        if self._store is None:
+            self._store = get_store()
+        return self._store
+
+    def record(
+        self,
+        guild_id: int,
+        track: TrackRecord | Dict[str, Any],
+        played_by: Optional[str] = None,
+        transition: bool = True,
+    ) -> None:
+        """Empile un événement (O(1), non bloquant)."""
+        ev = play_event(guild_id, track, played_by, transition)
+        if ev is None:
+            return
+        self._ensure_started()
+        while True:
+            try:
+                self._pending.put_nowait(ev)
+                break
+            except queue.Full:
+                try:
+                    self._pending.get_nowait()
+                    self.dropped += 1
+                    if self.dropped == 1 or self.dropped % 100 == 0:
+                        logger.warning("History queue full: %d événement(s) abandonné(s)", self.dropped)
+                except queue.Empty:
+                    pass
+        if self._pending.qsize() >= self.batch_max:
+            self._wake.set()
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="greg-history", daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+
+    def _drain(self) -> List[Dict[str, Any]]:
+        batch: List[Dict[str, Any]] = []
+        while len(batch) < self.batch_max:
+            try:
+                batch.append(self._pending.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def flush(self) -> int:
+        """Écrit tout ce qui est en attente (appelé par le thread ou à l'arrêt)."""
+        written = 0
+        while True:
+            batch = self._drain()
+            if not batch:
+                return written
+            try:
+                for gid in {ev["guild_id"] for ev in batch}:
+                    migrate_legacy(self.store, gid)
+                written += self.store.record_many(batch)
+            except Exception as e:
+                logger.error("History flush failed (%d événements perdus): %s", len(batch), e)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Arrête le thread et vide la file."""
+        self._stop.set()
+        self._wake.set()
+        t = self._thread
+        if t is not None and t.is_alive() and t is not threading.current_thread():
+            t.join(timeout)
+        self.flush()
+
+
+class HistoryManager:
+    """Gestion de l'historique des morceaux joués pour une guild."""
+
+    def __init__(
+        self,
+        guild_id: int,
+        store: Optional[HistoryStore] = None,
+        recorder: Optional[HistoryRecorder] = None,
+    ):
+        self.guild_id = int(guild_id)
+        self.store = store or get_store()
+        self.recorder = recorder
+        # Le recorder (flush) et record_play rappellent migrate_legacy avant
+        # d'écrire : l'import passe toujours avant les nouvelles lectures.
+        migrate_legacy_async(self.store, self.guild_id)
+
+    def record_play(self, track: TrackRecord | Dict[str, Any], played_by: Optional[str] = None):
+        """Enregistre qu'un morceau a été joué (différé si un recorder est branché)."""
+        if self.recorder is not None:
+            self.recorder.record(self.guild_id, track, played_by)
+            return
+        ev = play_event(self.guild_id, track, played_by)
+        if ev is None:
+            return
         try:
-            os.makedirs(HISTORY_DIR, exist_ok=True)
-            tmp = self._filepath + ".tmp"
-            with open(tmp, "w", encoding="utf-8") as f:
-                json.dump(self._entries, f, ensure_ascii=False, indent=None)
-            os.replace(tmp, self._filepath)
+            migrate_legacy(self.store, self.guild_id)
+            self.store.record_many([ev])
         except Exception as e:
-            logger.error("History save failed for guild %s: %s", self.guild_id, e)
-
-    @staticmethod
-    def _key(url: str) -> str:
-        if not url:
-            return ""
-        return hashlib.md5(url.encode()).hexdigest()[:12]
-
-    def record_play(self, track: Dict[str, Any], played_by: Optional[str] = None):
-        """Enregistre qu'un morceau a été joué."""
-        url = track.get("url", "")
-        if not url:
-            return
+            logger.error("History record failed for guild %s: %s", self.guild_id, e)
 
-        key = self._key(url)
-        with self.lock:
-            existing = self._entries.get(key)
-            now = int(time.time())
-
-            if existing:
-                existing["play_count"] = existing.get("play_count", 0) + 1
-                existing["last_played"] = now
-                # Update metadata if better
-                if track.get("title") and track["title"] != url:
-                    existing["title"] = track["title"]
-                if track.get("artist"):
-                    existing["artist"] = track["artist"]
-                if track.get("thumb"):
-                    existing["thumb"] = track["thumb"]
-                if played_by:
-                    # Track last player and all players
-                    existing["last_played_by"] = str(played_by)
-                    players = existing.get("played_by", [])
-                    if str(played_by) not in players:
-                        players.append(str(played_by))
-                    existing["played_by"] = players[-10:]  # Keep last 10
-            else:
-                self._entries[key] = {
-                    "url": url,
-                    "title": track.get("title", url),
-                    "artist": track.get("artist", ""),
-                    "thumb": track.get("thumb") or track.get("thumbnail", ""),
-                    "duration": track.get("duration"),
-                    "provider": track.get("provider", "youtube"),
-                    "play_count": 1,
-                    "first_played": now,
-                    "last_played": now,
-                    "last_played_by": str(played_by) if played_by else "",
-                    "played_by": [str(played_by)] if played_by else [],
-                }
-
-            # Prune old entries if too many
-            if len(self._entries) > MAX_ENTRIES:
-                sorted_keys = sorted(
-                    self._entries.keys(),
-                    key=lambda k: self._entries[k].get("last_played", 0),
-                )
-                for old_key in sorted_keys[: len(self._entries) - MAX_ENTRIES]:
-                    del self._entries[old_key]
-
-            self._save()
-
-    def get_top(self, limit: int = 20) -> List[Dict[str, Any]]:
+    def get_top(
+        self, limit: int = 20, user_id: Optional[str] = None,
+        since: Optional[int] = None, until: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
         """Retourne les morceaux les plus joués."""
-        with self.lock:
-            entries = list(self._entries.values())
-        entries.sort(key=lambda x: x.get("play_count", 0), reverse=True)
-        return entries[:limit]
+        return self.store.top(self.guild_id, limit, user_id=user_id, since=since, until=until)
 
-    def get_recent(self, limit: int = 20) -> List[Dict[str, Any]]:
+    def get_recent(
+        self, limit: int = 20, user_id: Optional[str] = None,
+        since: Optional[int] = None, until: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
         """Retourne les morceaux les plus récemment joués."""
-        with self.lock:
-            entries = list(self._entries.values())
-        entries.sort(key=lambda x: x.get("last_played", 0), reverse=True)
-        return entries[:limit]
+        return self.store.recent(self.guild_id, limit, user_id=user_id, since=since, until=until)
 
     def get_all(self) -> List[Dict[str, Any]]:
-        """Retourne tout l'historique."""
-        with self.lock:
-            return list(self._entries.values())
+        """Retourne tout l'historique (agrégé par morceau)."""
+        return self.store.recent(self.guild_id, None)
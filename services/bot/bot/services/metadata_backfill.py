@@ -0,0 +1,217 @@
+"""MetadataBackfill — complète en tâche de fond les items sans durée ni titre.
+
+Les items ajoutés depuis une URL brute ou un quickplay Spotify arrivent
+souvent sans durée : l'UI affiche ``--:--`` et ``_play_source._after`` ne
+distingue plus une coupure réseau d'une fin naturelle.
+
+Après chaque ajout incomplet, ``poke()`` réveille le worker qui :
+1. rassemble les items incomplets de toutes les guilds (queue + morceau en
+   cours), dédoublonnés par ``track_id`` ;
+2. complète ce qu'il peut depuis le cache de métadonnées (sans réseau) ;
+3. résout le reste par extraction yt-dlp à plat (``youtube.probe_metadata``)
+   dans un pool borné (``BACKFILL_CONCURRENCY``) ;
+4. réécrit les items en place — une mutation PlaylistManager et un seul
+   emit par guild et par lot.
+
+Seuls les morceaux YouTube et les requêtes texte (quickplay Spotify) sont
+résolus en ligne ; un échec n'est pas retenté avant ``BACKFILL_RETRY_AFTER``.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from greg_shared.extractors import youtube
+from greg_shared.metadata_cache import get_cache as get_metadata_cache
+
+logger = logging.getLogger("greg.backfill")
+
+BACKFILL_ENABLED = os.getenv("BACKFILL_ENABLED", "1").lower() in ("1", "true", "on")
+BACKFILL_BATCH = int(os.getenv("BACKFILL_BATCH", "20"))  # morceaux résolus par lot
+BACKFILL_CONCURRENCY = int(os.getenv("BACKFILL_CONCURRENCY", "2"))  # extractions simultanées
+BACKFILL_DEBOUNCE = float(os.getenv("BACKFILL_DEBOUNCE", "1.5"))  # secondes pour regrouper les ajouts
+BACKFILL_RETRY_AFTER = float(os.getenv("BACKFILL_RETRY_AFTER", "3600"))
+
+_META_FIELDS = ("title", "artist", "thumb", "duration")
+
+
+def needs_backfill(item: Any) -> bool:
+    """True si la durée manque ou si le titre n'est que l'URL."""
+    if not item or not item.get("url") or item.get("url") == "about:blank":
+        return False
+    title = item.get("title") or ""
+    return not item.get("duration") or not title or title == item.get("url")
+
+
+def _resolvable(item: Any) -> bool:
+    provider = (item.get("provider") or "").lower()
+    url = item.get("url") or ""
+    return not url.startswith("http") or provider in ("", "youtube", "yt") or youtube.is_valid(url)
+
+
+class MetadataBackfill:
+    """Worker asyncio unique pour toutes les guilds d'un PlayerService."""
+
+    def __init__(self, player_service: Any):
+        self.svc = player_service
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._failed: Dict[str, float] = {}
+
+    # ─── Cycle de vie ───
+
+    def start(self) -> None:
+        if not BACKFILL_ENABLED:
+            return
+        if self._task is not None and not self._task.done():
+            return
+        self._wake = asyncio.Event()
+        self._pool = ThreadPoolExecutor(max_workers=max(1, BACKFILL_CONCURRENCY), thread_name_prefix="greg-backfill")
+        self._task = asyncio.create_task(self._run())
+
+    def poke(self) -> None:
+        """Signale de nouveaux items incomplets (appel depuis la boucle, non bloquant)."""
+        if self._task is None:
+            self.start()
+        if self._wake is not None:
+            self._wake.set()
+
+    async def _run(self) -> None:
+        while True:
+            await self._wake.wait()
+            await asyncio.sleep(BACKFILL_DEBOUNCE)  # regroupe les ajouts rapprochés
+            self._wake.clear()
+            try:
+                while await self.run_once():
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Backfill: lot en échec: %s", e)
+
+    # ─── Collecte ───
+
+    def _collect(self) -> Dict[str, List[Tuple[int, Any]]]:
+        """track_id → [(guild, item)] des items incomplets, au plus BACKFILL_BATCH morceaux."""
+        now = time.time()
+        wanted: Dict[str, List[Tuple[int, Any]]] = {}
+        sources: List[Tuple[int, List[Any]]] = []
+        for gid, cur in list(self.svc.current_song.items()):
+            sources.append((gid, [cur]))
+        for gid, pm in list(self.svc.pm_map.items()):
+            sources.append((gid, pm.get_queue()))
+        for gid, items in sources:
+            for it in items:
+                if not needs_backfill(it):
+                    continue
+                tid = it.ensure_track_id()
+                if not tid or now - self._failed.get(tid, 0.0) < BACKFILL_RETRY_AFTER:
+                    continue
+                if tid not in wanted and len(wanted) >= BACKFILL_BATCH:
+                    continue
+                wanted.setdefault(tid, []).append((gid, it))
+        return wanted
+
+    # ─── Résolution ───
+
+    def _probe_sync(self, item: Any) -> Optional[Dict[str, Any]]:
+        return youtube.probe_metadata(item.get("url"), cookies_file=self.svc._cookies_file)
+
+    async def _resolve(self, wanted: Dict[str, List[Tuple[int, Any]]]) -> Dict[str, Dict[str, Any]]:
+        loop = asyncio.get_running_loop()
+        cache = get_metadata_cache()
+
+        # 1) Cache partagé : pas de réseau
+        probes = [{"track_id": tid, **{k: refs[0][1].get(k) for k in ("url", "provider", *_META_FIELDS)}}
+                  for tid, refs in wanted.items()]
+        await loop.run_in_executor(self._pool, cache.fill_many, probes)
+        found: Dict[str, Dict[str, Any]] = {}
+        online: List[Tuple[str, Any]] = []
+        for p in probes:
+            tid = p["track_id"]
+            if not needs_backfill(p):
+                found[tid] = p
+            elif _resolvable(wanted[tid][0][1]):
+                online.append((tid, wanted[tid][0][1]))
+            else:
+                self._failed[tid] = time.time()
+
+        # 2) yt-dlp à plat, concurrence bornée par le pool
+        if online:
+            results = await asyncio.gather(
+                *(loop.run_in_executor(self._pool, self._probe_sync, it) for _, it in online),
+                return_exceptions=True,
+            )
+            remember = []
+            for (tid, it), res in zip(online, results):
+                if isinstance(res, Exception) or not res:
+                    self._failed[tid] = time.time()
+                    logger.debug("Backfill: %s introuvable: %s", it.get("url"), res)
+                    continue
+                found[tid] = res
+                # Requête texte (quickplay) : retenue aussi sous le track_id de l'item
+                if res.get("url") != it.get("url"):
+                    remember.append({**res, "url": it.get("url"), "track_id": tid})
+            if remember:
+                await loop.run_in_executor(self._pool, cache.put_many, remember)
+        return found
+
+    async def run_once(self) -> int:
+        """Un lot : collecte, résolution, réécriture. Retourne le nombre de
+        morceaux réellement modifiés (0 arrête la boucle de ``_run``)."""
+        wanted = await asyncio.get_running_loop().run_in_executor(self._pool, self._collect)
+        if not wanted:
+            return 0
+        found = await self._resolve(wanted)
+        now = time.time()
+        for tid, meta in found.items():
+            if not meta.get("duration") or not meta.get("title"):
+                self._failed[tid] = now  # résultat incomplet : ne pas reboucler dessus
+        if not found:
+            return 0
+
+        loop = asyncio.get_running_loop()
+        per_guild: Dict[int, Dict[str, Dict[str, Any]]] = {}
+        current_touched = set()
+        changed_tids = set()
+        for tid, meta in found.items():
+            patch = {k: meta.get(k) for k in _META_FIELDS if meta.get(k)}
+            for gid, it in wanted.get(tid, []):
+                cur = self.svc.current_song.get(gid)
+                if it is cur:
+                    for k, v in patch.items():
+                        if not cur.get(k) or (k == "title" and cur.get(k) == cur.url):
+                            cur[k] = v
+                            changed_tids.add(tid)
+                            current_touched.add(gid)
+                    if patch.get("duration") and not self.svc.current_meta.get(gid, {}).get("duration"):
+                        self.svc.current_meta.setdefault(gid, {})["duration"] = int(patch["duration"])
+                        current_touched.add(gid)
+                    if patch.get("thumb") and not self.svc.current_meta.get(gid, {}).get("thumbnail"):
+                        self.svc.current_meta.setdefault(gid, {})["thumbnail"] = patch["thumb"]
+                        current_touched.add(gid)
+                elif it.item_id:
+                    per_guild.setdefault(gid, {})[it.item_id] = patch
+
+        emitted = set()
+        for gid, patches in per_guild.items():
+            pm = self.svc._get_pm(gid)
+            changed = await loop.run_in_executor(None, pm.update_items, patches)
+            changed_tids.update(it.ensure_track_id() for it in changed)
+            if changed or gid in current_touched:
+                self.svc._emit(gid)
+                emitted.add(gid)
+        for gid in current_touched - emitted:
+            self.svc._emit(gid)
+
+        # Résolu mais rien n'a bougé : ne pas le redemander au lot suivant
+        for tid in set(found) - changed_tids:
+            self._failed[tid] = now
+
+        logger.info("Backfill: %d/%d morceau(x) complété(s).", len(changed_tids), len(wanted))
+        return len(changed_tids)
@@ -5,6 +5,10 @@ Changements par rapport à v1 :
 - Émet via bot.emit_state_update() (Redis) au lieu de socketio direct
 - find_insert_position() pour l'insertion triée en 2 zones
 - check_quota() structuré
+- QueueIndex (maintenu par PlaylistManager) : insert/quota/move sans scan
+- TrackRecord (greg_shared.models) pour les items internes, dict seulement en sortie
+- Autoplay : file vide → suite tirée de l'index de transitions de l'historique,
+  flux préparé avant la fin du morceau courant (pas de blanc)
 
 Fix v2.1 :
 - Détection de coupure réseau Discord (1006 / WebSocket drop)
@@ -17,28 +21,42 @@ import asyncio
 import inspect
 import logging
 import os
+import random
+import shlex
 import time
+from collections import deque
 from typing import Any, Dict, List, Optional, Set
 
 import discord
 
 from greg_shared.config import settings
 from greg_shared.extractors import expand_bundle, get_extractor, is_bundle_url
+from greg_shared.metadata_cache import get_cache as get_metadata_cache
+from greg_shared.models import TrackRecord
 from greg_shared.priority import (
     PermissionResult,
     build_user_info,
+    can_bypass_quota,
     can_control_playback,
     can_edit_queue_item,
-    check_quota,
+    count_user_items,
+    editable_indexes,
     find_insert_position,
     get_member_weight,
+    get_per_user_cap,
     is_owner,
     validate_move,
+    validate_removals,
+    validate_reorder,
+    zone_shuffle_order,
 )
 
+from bot.services.audio_cache import AudioCache
+from bot.services.cache_warmer import CacheWarmer
 from bot.services.ffmpeg import detect_ffmpeg
+from bot.services.metadata_backfill import MetadataBackfill, needs_backfill
 from bot.services.playlist_manager import PlaylistManager
-from bot.services.history_manager import HistoryManager
+from bot.services.history_manager import HistoryManager, HistoryRecorder
 
 logger = logging.getLogger("greg.player")
 
@@ -47,6 +65,11 @@ AUDIO_EQ_PRESETS = {
     "music": "highpass=f=32,volume=-6dB,bass=g=4:f=95:w=1.0,alimiter=limit=0.98:attack=5:release=50",
 }
 
+# Fichier caché en opus et aucun filtre actif → FFmpegOpusAudio en copie
+# (discord.py n'encode plus chaque trame).
+_OPUS_PASSTHROUGH = os.getenv("AUDIO_OPUS_PASSTHROUGH", "1").lower() not in ("0", "false", "")
+_OPUS_EXTS = (".webm", ".opus")
+
 # Délai d'attente (secondes) avant de retenter la lecture après une coupure réseau.
 # Doit être > au temps de reconnexion de discord.py (~2s).
 _RECONNECT_WAIT = 3.5
@@ -61,6 +84,10 @@ _CUT_SHORT_MARGIN = 8
 # compteur d'échecs et on passe à la suite.
 _MIN_PLAYBACK_BEFORE_RECONNECT = 5.0
 
+# Fin de lecture avec tee : délai max laissé à FFmpeg pour finir d'écrire
+# le fichier et sortir (code retour) avant que cleanup() ne le tue.
+_TEE_EXIT_WAIT = 2.0
+
 # Nombre maximum de retries consécutifs sur une même URL avant abandon.
 # Empêche la boucle infinie observée en cas de 403 permanent.
 _MAX_FAILURES_PER_TRACK = 3
@@ -69,6 +96,43 @@ _MAX_FAILURES_PER_TRACK = 3
 _BACKOFF_BASE = 1.5
 _BACKOFF_MAX = 8.0
 
+# Secondes avant la fin du morceau pour pré-armer le suivant (tête de file,
+# ou suite autoplay si la file est vide). Ancien nom accepté en repli.
+_PREFETCH_LEAD = float(os.getenv("PREFETCH_LEAD_SECONDS", os.getenv("AUTOPLAY_PREPARE_LEAD_SECONDS", "20")))
+# Attente max d'une préparation en cours au moment d'enchaîner
+_PREFETCH_WAIT = 10.0
+# Âge max d'une source pré-armée : FFmpeg est lancé (connexion googlevideo
+# ouverte, tee démarré) dès sa construction, une source plus vieille est jetée.
+_PREFETCH_MAX_AGE = float(os.getenv("PREFETCH_MAX_AGE_SECONDS", "90"))
+
+# Autoplay : activé par défaut ? / morceaux récents exclus des candidats.
+_AUTOPLAY_DEFAULT = os.getenv("AUTOPLAY_DEFAULT", "0").lower() in ("1", "true", "on")
+_AUTOPLAY_RECENT = 25
+
+# Doublons à l'ajout (même track_id déjà en file) : allow (défaut) | merge | reject.
+# "merge" ajoute le demandeur à l'item existant au lieu de le dupliquer.
+_DUPLICATE_POLICY = os.getenv("QUEUE_DUPLICATE_POLICY", "allow").strip().lower()
+if _DUPLICATE_POLICY not in ("reject", "merge", "allow"):
+    _DUPLICATE_POLICY = "allow"
+
+# Champs du state publiés via l'op `flag_changed` d'un patch.
+_PATCH_FLAGS = ("paused", "is_paused", "repeat_all", "autoplay")
+
+# Champs accompagnant l'op `current_changed` (dépendent du morceau courant).
+_PATCH_CURRENT = ("current", "duration", "thumbnail", "requested_by_user")
+
+
+class VersionConflict(Exception):
+    """Édition basée sur une version de queue périmée (ou item disparu).
+
+    `version` : version courante, renvoyée au client pour qu'il se resynchronise.
+    """
+
+    def __init__(self, version: int, reason: str = "VERSION_CONFLICT"):
+        super().__init__(reason)
+        self.version = version
+        self.reason = reason
+
 
 class PlayerService:
     """Service central de lecture musicale."""
@@ -78,15 +142,35 @@ class PlayerService:
         self.intro_playing: Dict[int, bool] = {}
         self.pm_map: Dict[int, PlaylistManager] = {}
         self.hm_map: Dict[int, HistoryManager] = {}
+        # Écritures d'historique différées (thread dédié, jamais sur la boucle)
+        self.history = HistoryRecorder()
         self.ffmpeg_path = detect_ffmpeg()
+        # Audio local des morceaux populaires (pré-chargé en tâche de fond)
+        self.audio_cache = AudioCache()
+        self.cache_warmer = CacheWarmer(self, self.audio_cache)
+        # Durées / titres manquants complétés par lots en tâche de fond
+        self.backfill = MetadataBackfill(self)
 
         self.is_playing: Dict[int, bool] = {}
-        self.current_song: Dict[int, dict] = {}
+        # current_song et now_playing pointent sur le même TrackRecord (copie
+        # de l'item dépilé) : une seule copie par morceau lancé.
+        self.current_song: Dict[int, TrackRecord] = {}
         self.current_meta: Dict[int, dict] = {}
-        self.now_playing: Dict[int, dict] = {}
+        self.now_playing: Dict[int, TrackRecord] = {}
         self.repeat_all: Dict[int, bool] = {}
+        self.autoplay: Dict[int, bool] = {}
         self.audio_mode: Dict[int, str] = {}
 
+        # Suivant pré-armé pendant la lecture :
+        #   {"kind": "queue", "key": item_id de la tête, "item", "source", "afilter", "at"}
+        #   {"kind": "autoplay", "seed": track_id courant, "item", "source", "afilter", "at"}
+        # `at` : time.monotonic() de construction (cf. _PREFETCH_MAX_AGE).
+        # `_preparing_key` : item_id visé par la tâche en cours (None = autoplay).
+        self._prepared: Dict[int, dict] = {}
+        self._preparing: Dict[int, asyncio.Task] = {}
+        self._preparing_key: Dict[int, Optional[str]] = {}
+        self._autoplay_recent: Dict[int, deque] = {}
+
         self.play_start: Dict[int, float] = {}
         self.paused_since: Dict[int, float] = {}
         self.paused_total: Dict[int, float] = {}
@@ -103,9 +187,13 @@ class PlayerService:
         # --- Fix boucle infinie 403 ---
         # Compteur d'échecs consécutifs par URL pour casser la boucle
         # quand un flux est systématiquement injouable (403/SABR permanent).
-        # Clé : (guild_id, url) → nombre d'échecs.
+        # Clé : (guild_id, track_id) → nombre d'échecs (toutes URL du morceau).
         self._track_failures: Dict[tuple, int] = {}
 
+        # Dernier état publié par guild (version de queue, morceau, flags) :
+        # base des patches envoyés par build_state_update().
+        self._emitted: Dict[int, dict] = {}
+
         self._cookies_file = settings.get_cookies_file()
         self._ratelimit = settings.ytdlp_limit_bps
 
@@ -125,18 +213,24 @@ class PlayerService:
     def _get_hm(self, guild_id: int) -> HistoryManager:
         gid = int(guild_id)
         if gid not in self.hm_map:
-            self.hm_map[gid] = HistoryManager(gid)
+            self.hm_map[gid] = HistoryManager(gid, recorder=self.history)
         return self.hm_map[gid]
 
-    def get_history(self, guild_id: int, mode: str = "top", limit: int = 20) -> dict:
-        """Retourne l'historique pour une guild."""
+    def get_history(
+        self, guild_id: int, mode: str = "top", limit: int = 20,
+        user_id: Optional[str] = None, since: Optional[int] = None, until: Optional[int] = None,
+    ) -> dict:
+        """Retourne l'historique pour une guild (top | recent | events)."""
         hm = self._get_hm(guild_id)
-        if mode == "recent":
-            items = hm.get_recent(limit)
-        else:
-            items = hm.get_top(limit)
+        items = hm.store.query(hm.guild_id, mode, limit, user_id=user_id, since=since, until=until)
         return {"ok": True, "items": items, "mode": mode}
 
+    def get_trending(self, guild_id: int, limit: int = 20) -> dict:
+        """Tendances de la guild : score à décroissance exponentielle (top-K indexé)."""
+        hm = self._get_hm(guild_id)
+        items = hm.store.trending(hm.guild_id, limit)
+        return {"ok": True, "items": items, "mode": "trending", "half_life_hours": hm.store.half_life_hours}
+
     def _afilter_for(self, gid: int) -> Optional[str]:
         return AUDIO_EQ_PRESETS.get(self.audio_mode.get(gid, "music"))
 
@@ -198,7 +292,19 @@ class PlayerService:
 
     # ─── State ───
 
-    def get_state(self, guild_id: int) -> dict:
+    def get_state(
+        self,
+        guild_id: int,
+        offset: int = 0,
+        limit: Optional[int] = None,
+        if_version: Optional[int] = None,
+    ) -> dict:
+        """État du player pour une guild.
+
+        `offset`/`limit` : fenêtre de queue renvoyée (défaut : toute la queue).
+        `if_version` : si égal à la version courante de la queue, la queue
+        n'est pas renvoyée (`queue_unchanged: True`) — le client garde la sienne.
+        """
         gid = int(guild_id)
         g = self.bot.get_guild(gid)
         vc = g.voice_client if g else None
@@ -218,25 +324,24 @@ class PlayerService:
         thumb = meta.get("thumbnail")
 
         cur = self.now_playing.get(gid) or self.current_song.get(gid)
-        if isinstance(cur, dict):
-            if duration is None and isinstance(cur.get("duration"), (int, float)):
-                duration = int(cur["duration"])
-            thumb = thumb or cur.get("thumb") or cur.get("thumbnail")
+        if cur is not None:
+            if duration is None and isinstance(cur.duration, (int, float)):
+                duration = int(cur.duration)
+            thumb = thumb or cur.thumb
 
         requested_by = None
-        if isinstance(cur, dict) and cur.get("added_by"):
+        if cur is not None and cur.added_by:
             try:
-                requested_by = build_user_info(self.bot, gid, int(cur["added_by"]))
+                requested_by = build_user_info(self.bot, gid, int(cur.added_by))
             except Exception:
                 pass
 
         pm = self._get_pm(gid)
-        try:
-            pm.reload()
-        except Exception:
-            pass
-
-        queue = pm.to_dict().get("queue", [])
+        # Version et fenêtre lues ensemble sous pm.lock (pas de queue v+1 étiquetée v)
+        snap = pm.to_dict(offset, limit, if_version=if_version)
+        version = snap["version"]
+        unchanged = snap["unchanged"]
+        queue = snap.get("queue", [])
         queue_users = {}
         seen = set()
         for it in queue[:25]:
@@ -248,10 +353,13 @@ class PlayerService:
                 except Exception:
                     pass
 
-        return {
+        state = {
             "guild_id": gid,
+            "version": version,
+            "queue_offset": snap.get("queue_offset", 0),
+            "queue_total": snap.get("queue_total", len(queue)),
             "queue": queue,
-            "current": cur,
+            "current": PlaylistManager.expose(cur) if cur is not None else None,
             "paused": is_paused,
             "is_paused": is_paused,
             "position": elapsed,
@@ -259,14 +367,76 @@ class PlayerService:
             "progress": {"elapsed": elapsed, "duration": int(duration) if duration else None},
             "thumbnail": thumb,
             "repeat_all": bool(self.repeat_all.get(gid, False)),
+            "autoplay": self._autoplay_on(gid),
             "requested_by_user": requested_by,
             "queue_users": queue_users,
         }
+        if unchanged:
+            state.pop("queue")
+            state.pop("queue_users")
+            state["queue_unchanged"] = True
+        return state
+
+    def player_flags(self, guild_id: int) -> dict:
+        """État du player sans la queue (stocké en Redis pour les lectures API)."""
+        head = self.get_state(guild_id, limit=0)
+        return {k: head.get(k) for k in (*_PATCH_CURRENT, *_PATCH_FLAGS, "position")}
+
+    def _remember_emitted(self, gid: int, state: dict) -> None:
+        self._emitted[gid] = {
+            "version": state.get("version"),
+            # copies : `current` est un dict vivant (now_playing) qui peut muter
+            "current": {k: (dict(v) if isinstance(v, dict) else v)
+                        for k, v in ((k, state.get(k)) for k in _PATCH_CURRENT)},
+            "flags": {k: state.get(k) for k in _PATCH_FLAGS},
+        }
+
+    def build_state_update(self, guild_id: int) -> dict:
+        """State update à publier : patch versionné si possible, sinon snapshot.
+
+        Patch : {"patch": True, "from_version", "version", "queue_total",
+        "position", "duration", "ops": [...]} avec les ops de queue de
+        PlaylistManager.queue_patch() + `current_changed` / `flag_changed`.
+        Snapshot complet (get_state) au premier emit ou si l'historique des ops
+        ne couvre plus la dernière version publiée.
+        """
+        gid = int(guild_id)
+        last = self._emitted.get(gid)
+        queue_ops = None
+        if last is not None and isinstance(last.get("version"), int):
+            queue_ops = self._get_pm(gid).queue_patch(last["version"])
+
+        if queue_ops is None:
+            state = self.get_state(gid)
+            self._remember_emitted(gid, state)
+            return state
+
+        head = self.get_state(gid, limit=0)
+        ops = list(queue_ops)
+        current = {k: head.get(k) for k in _PATCH_CURRENT}
+        if current != last["current"]:
+            ops.append({"op": "current_changed", **current})
+        flags = {k: head.get(k) for k in _PATCH_FLAGS}
+        changed = {k: v for k, v in flags.items() if last["flags"].get(k) != v}
+        if changed:
+            ops.append({"op": "flag_changed", "flags": changed})
+
+        self._remember_emitted(gid, head)
+        return {
+            "patch": True,
+            "guild_id": gid,
+            "from_version": last["version"],
+            "version": head["version"],
+            "queue_total": head["queue_total"],
+            "position": head["position"],
+            "duration": head["duration"],
+            "ops": ops,
+        }
 
     # ─── Enqueue ───
 
-    def _normalize_item(self, it: dict) -> dict:
-        """Normalise un item de queue."""
+    def _normalize_item(self, it: dict) -> TrackRecord:
+        """Normalise un item de queue (entrée API/commande) en TrackRecord."""
         from greg_shared.extractors import get_extractor
         url = (it.get("url") or "").strip() or None
         title = (it.get("title") or "").strip()
@@ -291,53 +461,126 @@ class PlayerService:
         else:
             duration = None
 
-        out = {
-            "title": title or url or "Sans titre",
-            "url": url,
-            "artist": artist,
-            "thumb": thumb,
-            "duration": duration,
-            "provider": provider,
-        }
-        for k in ("mode", "added_by", "priority", "ts"):
-            if k in it:
-                out[k] = it[k]
+        out = TrackRecord(
+            url=url,
+            title=title or url or "Sans titre",
+            artist=artist,
+            thumb=thumb,
+            duration=duration,
+            provider=provider,
+            added_by=it.get("added_by"),
+            priority=it.get("priority"),
+            ts=it.get("ts"),
+            track_id=it.get("track_id"),
+        )
+        out.ensure_track_id()
+        if "mode" in it:
+            out["mode"] = it["mode"]
         return out
 
     async def enqueue(self, guild_id: int, user_id: int, item: dict) -> dict:
+        res = await self.enqueue_many(guild_id, user_id, [item])
+        if not res.get("ok"):
+            return res
+        if not res["items"]:
+            # doublon fusionné avec l'item déjà en file
+            return {"ok": True, "item": None, "position": None, "duplicates": res.get("duplicates", [])}
+        return {"ok": True, "item": res["items"][0], "position": res["position"]}
+
+    async def enqueue_many(self, guild_id: int, user_id: int, items: List[dict]) -> dict:
+        """Ajoute un lot d'items pour un même utilisateur.
+
+        Un seul check de quota, un seul calcul de poids, une seule position
+        d'insertion (tous les items du lot tombent dans la même zone), une
+        seule écriture PlaylistManager et un seul emit.
+        Si le lot dépasse le quota restant, il est tronqué (`skipped`).
+        Les morceaux déjà en file (même `track_id`, lookup O(1) dans le
+        QueueIndex) suivent `QUEUE_DUPLICATE_POLICY` : écartés (`reject`),
+        fusionnés avec l'item existant (`merge`) ou ajoutés (`allow`).
+        """
         gid = int(guild_id)
-        item = dict(item or {})
-        item["added_by"] = str(user_id)
-        item = self._normalize_item(item)
-
-        pm = self._get_pm(gid)
+        batch: List[TrackRecord] = []
+        for it in items or []:
+            rec = self._normalize_item(it or {})
+            rec.added_by = str(user_id)
+            batch.append(rec)
+        if not batch:
+            return {"ok": False, "error": "EMPTY_BATCH"}
+
+        # Titres / durées / miniatures manquants : cache de métadonnées partagé
         loop = asyncio.get_running_loop()
-        await loop.run_in_executor(None, pm.reload)
-        queue = await loop.run_in_executor(None, pm.get_queue)
+        try:
+            await loop.run_in_executor(None, get_metadata_cache().fill_many, batch)
+        except Exception as e:
+            logger.debug("metadata fill failed: %s", e)
 
-        # Check quota
-        quota = check_quota(queue, user_id, self.bot, gid)
-        if not quota.allowed:
-            parts = quota.reason.split(":")
-            return {"ok": False, "error": f"Quota atteint ({parts[1] if len(parts) > 1 else ''})."}
+        pm = self._get_pm(gid)
+        qindex = pm.get_index()
+
+        # Doublons (file + lot lui-même) : ne comptent pas dans le quota
+        duplicates: List[Dict[str, Any]] = []
+        merge_ids: List[str] = []
+        if _DUPLICATE_POLICY != "allow":
+            fresh: List[TrackRecord] = []
+            seen: Set[str] = set()
+            for rec in batch:
+                tid = rec.track_id or ""
+                existing = qindex.track_items(tid)
+                if existing or (tid and tid in seen):
+                    dup = {"track_id": tid, "title": rec.title}
+                    if existing:
+                        dup["item_id"] = existing[0].item_id
+                        if _DUPLICATE_POLICY == "merge":
+                            merge_ids.append(existing[0].item_id)
+                    duplicates.append(dup)
+                    continue
+                if tid:
+                    seen.add(tid)
+                fresh.append(rec)
+            batch = fresh
+            if merge_ids:
+                # Tous les doublons fusionnés en une seule mutation (update_many)
+                await loop.run_in_executor(None, pm.merge_requesters, merge_ids, user_id)
+            if not batch:
+                if merge_ids:
+                    self._emit(gid)
+                if _DUPLICATE_POLICY == "reject":
+                    return {"ok": False, "error": "DUPLICATE", "duplicates": duplicates}
+                return {"ok": True, "items": [], "position": None, "count": 0,
+                        "skipped": 0, "duplicates": duplicates, "merged": len(merge_ids)}
+
+        # Check quota (une fois pour tout le lot, O(1) via QueueIndex)
+        skipped = 0
+        if not can_bypass_quota(self.bot, gid, user_id):
+            cap = get_per_user_cap()
+            count = count_user_items(pm.queue, user_id, qindex)
+            if count >= cap:
+                return {"ok": False, "error": f"Quota atteint ({count}/{cap})."}
+            room = cap - count
+            skipped = max(0, len(batch) - room)
+            batch = batch[:room]
 
         # Attribuer le poids
         weight = get_member_weight(self.bot, gid, user_id)
-        item["priority"] = weight
-
-        # Ajouter à la queue
-        await loop.run_in_executor(None, pm.add, item)
+        for it in batch:
+            it.priority = weight
 
-        # Trouver la bonne position et déplacer si nécessaire
-        new_queue = await loop.run_in_executor(None, pm.get_queue)
-        current_idx = len(new_queue) - 1
-        target_idx = find_insert_position(new_queue[:-1], weight)
-
-        if 0 <= target_idx < len(new_queue) and target_idx != current_idx:
-            await loop.run_in_executor(None, pm.move, current_idx, target_idx)
+        # Position d'insertion du bloc + une seule écriture
+        target_idx = find_insert_position(pm.queue, weight, qindex)
+        await loop.run_in_executor(None, pm.add_many, batch, None, target_idx)
 
         self._emit(gid)
-        return {"ok": True, "item": item, "position": target_idx}
+        if any(needs_backfill(it) for it in batch):
+            self.backfill.poke()
+        return {
+            "ok": True,
+            "items": [it.to_dict() for it in batch],
+            "position": target_idx,
+            "count": len(batch),
+            "skipped": skipped,
+            "duplicates": duplicates,
+            "merged": len(merge_ids),
+        }
 
     # ─── Playback ───
 
@@ -389,7 +632,6 @@ class PlayerService:
         async with self._guild_lock(gid):
             loop = asyncio.get_running_loop()
             pm = self._get_pm(gid)
-            await loop.run_in_executor(None, pm.reload)
 
             vc = guild.voice_client
             if vc and vc.is_playing():
@@ -398,19 +640,33 @@ class PlayerService:
                 vc.stop()
 
             item = await loop.run_in_executor(None, pm.pop_next)
+            prepared_src = None
+            if item:
+                prepared_src = await self._take_prefetched(gid, item)
+            else:
+                # File vide : l'autoplay prend le relais (seulement après un morceau
+                # terminé ou skippé — stop a déjà vidé current_song)
+                item, prepared_src = await self._take_autoplay(gid)
             if not item:
                 self._clear_now_playing(gid)
                 self._emit(gid)
                 return
 
             if self.repeat_all.get(gid):
-                await loop.run_in_executor(None, pm.add, item)
-
-            url = item.get("url")
-            self.current_song[gid] = dict(item)
-            self.now_playing[gid] = dict(item)
-            dur = int(item["duration"]) if isinstance(item.get("duration"), (int, float)) else None
-            self.current_meta[gid] = {"duration": dur, "thumbnail": item.get("thumb")}
+                # Copie + nouvel item_id : l'entrée remise en file ne doit
+                # partager ni l'objet ni l'identifiant du morceau en cours.
+                again = item.copy()
+                again.item_id = TrackRecord.new_id()
+                await loop.run_in_executor(None, pm.add, again)
+
+            url = item.url
+            cur = item.copy()
+            self.current_song[gid] = cur
+            self.now_playing[gid] = cur
+            dur = int(item.duration) if isinstance(item.duration, (int, float)) else None
+            self.current_meta[gid] = {"duration": dur, "thumbnail": item.thumb}
+            if needs_backfill(cur):
+                self.backfill.poke()
 
             extractor = get_extractor(url)
             if not extractor:
@@ -418,27 +674,48 @@ class PlayerService:
                 self._emit(gid)
                 return
 
-            failure_key = (gid, url) if url else None
+            tid = cur.ensure_track_id()
+            failure_key = (gid, tid) if tid else None
             last_err: Optional[Exception] = None
+            if prepared_src is not None:
+                try:
+                    await self._play_source(guild, gid, prepared_src)
+                    if failure_key:
+                        self._track_failures.pop(failure_key, None)
+                    return
+                except Exception as e:
+                    last_err = e
+                    logger.warning("[prefetch KO] guild=%s url=%s: %s", gid, url, e)
+                    self._cleanup_source(prepared_src)
+            cached_src = self._cached_source(gid, cur)
+            if cached_src is not None:
+                try:
+                    await self._play_source(guild, gid, cached_src)
+                    if failure_key:
+                        self._track_failures.pop(failure_key, None)
+                    return
+                except Exception as e:
+                    last_err = e
+                    logger.warning("[cache KO] guild=%s url=%s: %s", gid, url, e)
+                    self._cleanup_source(cached_src)
             for method in ("stream", "stream_pipe"):
                 if not hasattr(extractor, method):
                     continue
+                srcp = None
                 try:
-                    srcp, title = await self._call_extractor(
-                        extractor, method, url, self.ffmpeg_path,
-                        **self._extractor_kwargs(extractor, method, gid),
-                    )
+                    srcp, title = await self._open_stream(gid, extractor, method, cur)
                     if title and isinstance(title, str):
-                        self.current_song[gid]["title"] = title
-                        self.now_playing[gid]["title"] = title
+                        cur.title = title
                     await self._play_source(guild, gid, srcp)
                     # Lecture lancée avec succès → reset compteur d'échecs
                     if failure_key:
                         self._track_failures.pop(failure_key, None)
+                    loop.run_in_executor(None, get_metadata_cache().put, tid, cur.to_dict())
                     return
                 except Exception as e:
                     last_err = e
                     logger.warning("[%s KO] guild=%s url=%s: %s", method, gid, url, e)
+                    self._cleanup_source(srcp)
 
             # ── Échec extracteur : tous les flux ont échoué avant lecture ───
             # On incrémente le même compteur que _after pour appliquer la
@@ -465,7 +742,7 @@ class PlayerService:
                         pm2 = self._get_pm(gid)
                         q = pm2.peek_all()
                         for i in range(len(q) - 1, -1, -1):
-                            if q[i].get("url") == url:
+                            if q[i].ensure_track_id() == tid:
                                 pm2.remove_at(i)
                                 break
                     except Exception:
@@ -485,7 +762,7 @@ class PlayerService:
             if not repeat_on:
                 try:
                     pm2 = self._get_pm(gid)
-                    pm2.insert_at(0, dict(self.current_song.get(gid, {})))
+                    pm2.insert_at(0, cur.copy())
                 except Exception:
                     pass
 
@@ -498,12 +775,96 @@ class PlayerService:
                 await self.play_next(guild)
             asyncio.create_task(_retry())
 
+    def _cached_source(self, gid: int, track: TrackRecord):
+        """Source FFmpeg locale si le morceau est dans l'AudioCache, sinon None."""
+        path = self.audio_cache.path_for(track.ensure_track_id())
+        if not path:
+            return None
+        out_opts = "-vn"
+        afilter = self._afilter_for(gid)
+        if afilter:
+            out_opts += f" -af {shlex.quote(afilter)}"
+        try:
+            if _OPUS_PASSTHROUGH and not afilter and path.endswith(_OPUS_EXTS):
+                return discord.FFmpegOpusAudio(path, codec="copy", executable=self.ffmpeg_path, before_options="-nostdin", options=out_opts)
+            return discord.FFmpegPCMAudio(path, executable=self.ffmpeg_path, before_options="-nostdin", options=out_opts)
+        except Exception as e:
+            logger.warning("[cache KO] guild=%s %s: %s", gid, path, e)
+            return None
+
     async def _call_extractor(self, extractor, method: str, *args, **kwargs):
         fn = getattr(extractor, method)
         if asyncio.iscoroutinefunction(fn):
             return await fn(*args, **kwargs)
         return await asyncio.to_thread(fn, *args, **kwargs)
 
+    async def _open_stream(self, gid: int, extractor, method: str, track: TrackRecord):
+        """(source, titre) via l'extracteur ; sur un morceau pas encore caché,
+        l'audio est copié au passage vers l'AudioCache si l'extracteur sait le faire."""
+        kwargs = self._extractor_kwargs(extractor, method, gid)
+        tid = track.ensure_track_id()
+        tee = None
+        try:
+            if "tee_path" in inspect.signature(getattr(extractor, method)).parameters:
+                tee = self.audio_cache.tee_path(tid)
+        except (TypeError, ValueError, OSError):
+            tee = None
+        if tee:
+            kwargs["tee_path"] = tee
+        try:
+            srcp, title = await self._call_extractor(extractor, method, track.url, self.ffmpeg_path, **kwargs)
+        except BaseException:
+            if tee:
+                self.audio_cache.finish_tee(tid, tee, False)
+            raise
+        if tee:
+            setattr(srcp, "_cache_tee", (tid, tee))
+        return srcp, title
+
+    @staticmethod
+    def _tee_process(src, wait: bool):
+        """Process FFmpeg d'une source avec tee, à capturer AVANT cleanup()
+        (qui le remplace par MISSING). `wait` : lui laisse le temps de sortir."""
+        if not getattr(src, "_cache_tee", None):
+            return None
+        proc = getattr(src, "_process", None)
+        if not hasattr(proc, "wait"):
+            return None
+        if wait:
+            try:
+                proc.wait(timeout=_TEE_EXIT_WAIT)
+            except Exception:
+                pass
+        return proc
+
+    def _finish_tee(self, src, complete: bool, proc=None) -> None:
+        """Source terminée : son tee entre dans le cache si le morceau a été lu
+        jusqu'au bout et que FFmpeg (`proc`, capturé avant cleanup) a fini
+        proprement, sinon il est jeté."""
+        tee = getattr(src, "_cache_tee", None)
+        if not tee:
+            return
+        src._cache_tee = None
+        complete = complete and getattr(proc, "returncode", None) == 0
+        try:
+            if self.audio_cache.finish_tee(tee[0], tee[1], complete):
+                logger.info("[cache] %s mis en cache pendant la lecture", tee[0])
+        except Exception as e:
+            logger.debug("[cache] tee %s: %s", tee[0], e)
+
+    @staticmethod
+    def _forget_stream(track_id: Optional[str]) -> None:
+        """Oublie l'URL de flux et le PO token en cache d'un morceau YouTube."""
+        if not track_id or not track_id.startswith("yt:"):
+            return
+        vid = track_id[3:]
+        try:
+            from greg_shared.extractors.youtube import invalidate_po_cache, invalidate_stream_cache  # noqa
+            invalidate_stream_cache(vid)
+            invalidate_po_cache(vid)
+        except Exception as e:
+            logger.debug("invalidate stream cache %s: %s", vid, e)
+
     async def _play_source(self, guild: discord.Guild, gid: int, srcp):
         vc = guild.voice_client
         if vc and (vc.is_playing() or vc.is_paused()):
@@ -512,8 +873,13 @@ class PlayerService:
 
         def _after(_e):
             # ── Nettoyage de la source ──────────────────────────────────────
+            src = None
+            tee_proc = None
             try:
                 src = self.current_source.pop(gid, None)
+                # Process du tee capturé avant cleanup() (qui le remplace par
+                # MISSING) ; sur un arrêt non demandé on le laisse sortir.
+                tee_proc = self._tee_process(src, wait=gid not in self._explicit_stops)
                 if src and hasattr(src, "cleanup"):
                     try:
                         src.cleanup()
@@ -538,9 +904,10 @@ class PlayerService:
 
             was_cut_short = False
             track_failed = False
+            natural_end = False
             cur = self.current_song.get(gid)
-            cur_url = (cur or {}).get("url") if cur else None
-            failure_key = (gid, cur_url) if cur_url else None
+            cur_tid = cur.ensure_track_id() if cur else None
+            failure_key = (gid, cur_tid) if cur_tid else None
 
             if not was_explicit and cur:
                 elapsed = time.monotonic() - self.play_start.get(gid, time.monotonic())
@@ -575,9 +942,12 @@ class PlayerService:
                             fails, _MAX_FAILURES_PER_TRACK, gid,
                             cur.get("title", "?"), elapsed,
                         )
+                        # URL / PO token probablement refusés (403) : la
+                        # nouvelle tentative doit ré-extraire, pas resservir le cache.
+                        self._forget_stream(cur_tid)
                         try:
                             pm = self._get_pm(gid)
-                            pm.insert_at(0, dict(cur))
+                            pm.insert_at(0, cur.copy())
                             was_cut_short = True
                         except Exception as exc:
                             logger.error("[Retry] Erreur réinsertion: %s", exc)
@@ -591,7 +961,7 @@ class PlayerService:
                     )
                     try:
                         pm = self._get_pm(gid)
-                        pm.insert_at(0, dict(cur))
+                        pm.insert_at(0, cur.copy())
                         was_cut_short = True
                     except Exception as exc:
                         logger.error("[Reconnect] Erreur réinsertion: %s", exc)
@@ -599,11 +969,15 @@ class PlayerService:
                     # Fin naturelle → on nettoie le compteur d'échecs pour ce track.
                     if failure_key:
                         self._track_failures.pop(failure_key, None)
+                    natural_end = True
             else:
                 # Arrêt explicite ou pas de current → on nettoie aussi.
                 if failure_key:
                     self._track_failures.pop(failure_key, None)
 
+            # Tee vers le cache audio : retenu seulement sur une fin naturelle
+            self._finish_tee(src, natural_end, tee_proc)
+
             # ── Backoff exponentiel si réinsertion ──────────────────────────
             wait_s = 0.0
             if was_cut_short:
@@ -645,10 +1019,13 @@ class PlayerService:
         self._ensure_ticker(gid)
         self._emit(gid)
 
+        # Write-behind : simple empilement en mémoire, écrit par lots hors boucle
         try:
-            cur = self.current_song.get(gid, {})
-            added_by = cur.get("added_by") or cur.get("requested_by")
-            self._get_hm(gid).record_play(cur, played_by=added_by)
+            cur = self.current_song.get(gid)
+            if cur is not None:
+                # Les suites choisies par l'autoplay n'alimentent pas l'index de transitions
+                self.history.record(gid, cur, played_by=cur.added_by, transition=not cur.get("autoplay"))
+                self._autoplay_recent.setdefault(gid, deque(maxlen=_AUTOPLAY_RECENT)).append(cur.ensure_track_id())
         except Exception as e:
             logger.debug("history record failed: %s", e)
 
@@ -682,6 +1059,7 @@ class PlayerService:
             vc.stop()
         self._cancel_ticker(gid)
         self._clear_now_playing(gid)
+        self._drop_prepared(gid)
         self._emit(gid)
         return True
 
@@ -694,6 +1072,9 @@ class PlayerService:
         if vc and vc.is_playing():
             vc.pause()
             self.paused_since[gid] = time.monotonic()
+            # Pas de flux pré-armé qui reste ouvert pendant une pause de durée
+            # inconnue : il sera refait à la reprise si on est en fin de morceau.
+            self._drop_prepared(gid)
             self._emit(gid)
             return True
         return False
@@ -713,50 +1094,187 @@ class PlayerService:
             return True
         return False
 
-    def remove_at(self, guild_id: int, requester_id: int, index: int) -> bool:
+    # ─── Concurrence optimiste (expected_version / item_id) ───
+
+    def queue_version(self, guild_id: int) -> int:
+        """Version courante de la queue (bumpée par chaque mutation)."""
+        return self._get_pm(guild_id).version
+
+    @staticmethod
+    def _check_version(pm: PlaylistManager, expected_version: Optional[int]) -> None:
+        """Lève VersionConflict si le client a édité une copie périmée."""
+        if expected_version is not None and int(expected_version) != pm.version:
+            raise VersionConflict(pm.version)
+
+    @staticmethod
+    def _resolve_index(pm: PlaylistManager, index: Optional[int], item_id: Optional[str]) -> Optional[int]:
+        """Index de l'item : `item_id` (stable) prioritaire sur l'index fourni."""
+        if item_id:
+            i = pm.index_of(str(item_id))
+            if i is None:
+                raise VersionConflict(pm.version, "ITEM_NOT_FOUND")
+            return i
+        return index
+
+    async def _mutate(self, gid: int, fn):
+        """Exécute une mutation de queue hors de la boucle (verrou PlaylistManager,
+        écritures disque / Redis bloquantes), puis emit si elle a porté."""
+        res = await asyncio.to_thread(fn)
+        if res:
+            self._emit(gid)
+        return res
+
+    async def remove_at(
+        self, guild_id: int, requester_id: int, index: Optional[int] = None,
+        expected_version: Optional[int] = None, item_id: Optional[str] = None,
+    ) -> bool:
         gid = int(guild_id)
         pm = self._get_pm(gid)
-        q = pm.peek_all()
-        if not (0 <= index < len(q)):
-            return False
-        perm = can_edit_queue_item(self.bot, gid, requester_id, q[index])
-        if not perm.allowed:
-            raise PermissionError(perm.reason)
-        ok = pm.remove_at(index)
-        if ok:
-            self._emit(gid)
-        return ok
 
-    def move(self, guild_id: int, requester_id: int, src: int, dst: int) -> bool:
+        def _do() -> bool:
+            with pm.lock:
+                self._check_version(pm, expected_version)
+                i = self._resolve_index(pm, index, item_id)
+                item = pm.item_at(i) if i is not None else None
+                if item is None:
+                    return False
+                perm = can_edit_queue_item(self.bot, gid, requester_id, item)
+                if not perm.allowed:
+                    raise PermissionError(perm.reason)
+                return pm.remove_at(i)
+
+        return await self._mutate(gid, _do)
+
+    async def move(
+        self, guild_id: int, requester_id: int, src: Optional[int], dst: int,
+        expected_version: Optional[int] = None, item_id: Optional[str] = None,
+    ) -> bool:
         gid = int(guild_id)
         pm = self._get_pm(gid)
-        q = pm.peek_all()
-        if not (0 <= src < len(q) and 0 <= dst < len(q)):
-            return False
 
-        perm = can_edit_queue_item(self.bot, gid, requester_id, q[src])
+        def _do() -> bool:
+            with pm.lock:
+                self._check_version(pm, expected_version)
+                i = self._resolve_index(pm, src, item_id)
+                n = pm.length()
+                if i is None or not (0 <= i < n and 0 <= dst < n):
+                    return False
+
+                perm = can_edit_queue_item(self.bot, gid, requester_id, pm.item_at(i))
+                if not perm.allowed:
+                    raise PermissionError(perm.reason)
+
+                move_perm = validate_move(pm.queue, i, dst, requester_id, self.bot, gid, index=pm.get_index())
+                if not move_perm.allowed:
+                    raise PermissionError(move_perm.reason)
+
+                return pm.move(i, dst)
+
+        return await self._mutate(gid, _do)
+
+    # ─── Opérations groupées (une validation, une écriture, un emit) ───
+
+    async def reorder(
+        self, guild_id: int, requester_id: int, order: List[int],
+        expected_version: Optional[int] = None,
+    ) -> bool:
+        """Applique une permutation complète (`order[i]` = ancien index placé en i)."""
+        gid = int(guild_id)
+        pm = self._get_pm(gid)
+
+        def _do() -> bool:
+            with pm.lock:
+                self._check_version(pm, expected_version)
+                perm = validate_reorder(pm.queue, [int(i) for i in order], requester_id, self.bot, gid)
+                if not perm.allowed:
+                    if perm.reason in ("invalid_permutation", "same_position"):
+                        return False
+                    raise PermissionError(perm.reason)
+                return pm.reorder(order)
+
+        return await self._mutate(gid, _do)
+
+    async def shuffle(self, guild_id: int, requester_id: int, expected_version: Optional[int] = None) -> bool:
+        """Mélange la queue zone par zone, en ne bougeant que les items éditables."""
+        gid = int(guild_id)
+        pm = self._get_pm(gid)
+
+        def _do() -> bool:
+            with pm.lock:
+                self._check_version(pm, expected_version)
+                movable = editable_indexes(pm.queue, requester_id, self.bot, gid)
+                if len(movable) < 2:
+                    return False
+                return pm.reorder(zone_shuffle_order(pm.queue, movable))
+
+        return await self._mutate(gid, _do)
+
+    def _remove_indexes(self, pm: PlaylistManager, gid: int, requester_id: int, idx: List[int]) -> int:
+        """Suppression groupée, sous `pm.lock`. Tout ou rien côté permissions."""
+        perm = validate_removals(pm.queue, idx, requester_id, self.bot, gid)
         if not perm.allowed:
+            if perm.reason in ("empty_selection", "out_of_bounds"):
+                return 0
             raise PermissionError(perm.reason)
+        return pm.remove_many(idx)
+
+    async def remove_many(
+        self, guild_id: int, requester_id: int, indexes: Optional[List[int]] = None,
+        expected_version: Optional[int] = None, item_ids: Optional[List[str]] = None,
+    ) -> int:
+        """Supprime un ensemble d'items (indexes et/ou item_ids). Tout ou rien côté permissions."""
+        gid = int(guild_id)
+        pm = self._get_pm(gid)
 
-        move_perm = validate_move(q, src, dst, requester_id, self.bot, gid)
-        if not move_perm.allowed:
-            raise PermissionError(move_perm.reason)
+        def _do() -> int:
+            with pm.lock:
+                self._check_version(pm, expected_version)
+                idx = {int(i) for i in indexes or []}
+                idx.update(self._resolve_index(pm, None, iid) for iid in item_ids or [])
+                return self._remove_indexes(pm, gid, requester_id, sorted(idx))
 
-        ok = pm.move(src, dst)
-        if ok:
-            self._emit(gid)
-        return ok
+        return await self._mutate(gid, _do)
 
-    async def play_at(self, guild_id: int, user_id: int, index: int) -> bool:
-        """Joue le morceau à l'index donné dans la queue."""
+    async def remove_by_user(
+        self, guild_id: int, requester_id: int, target_user_id: int,
+        expected_version: Optional[int] = None,
+    ) -> int:
+        """Supprime tous les items ajoutés par `target_user_id`."""
+        gid = int(guild_id)
+        pm = self._get_pm(gid)
+        target = str(target_user_id)
+
+        def _do() -> int:
+            with pm.lock:
+                self._check_version(pm, expected_version)
+                idx = [i for i, it in enumerate(pm.queue) if str(it.added_by) == target]
+                if not idx:
+                    return 0
+                return self._remove_indexes(pm, gid, requester_id, idx)
+
+        return await self._mutate(gid, _do)
+
+    async def play_at(
+        self, guild_id: int, user_id: int, index: Optional[int] = None,
+        expected_version: Optional[int] = None, item_id: Optional[str] = None,
+    ) -> bool:
+        """Joue le morceau à l'index (ou `item_id`) donné dans la queue."""
         gid = int(guild_id)
         pm = self._get_pm(gid)
-        q = pm.peek_all()
-        if not (0 <= index < len(q)):
+
+        def _do() -> bool:
+            with pm.lock:
+                self._check_version(pm, expected_version)
+                i = self._resolve_index(pm, index, item_id)
+                if i is None or pm.item_at(i) is None:
+                    return False
+                # Une seule mutation (move en tête) au lieu de remove + insert
+                if i > 0:
+                    pm.move(i, 0)
+                return True
+
+        if not await asyncio.to_thread(_do):
             return False
-        item = q[index]
-        pm.remove_at(index)
-        pm.insert_at(0, item)
         g = self.bot.get_guild(gid)
         vc = g and g.voice_client
         if vc and (vc.is_playing() or vc.is_paused()):
@@ -776,7 +1294,7 @@ class PlayerService:
         if not cur:
             return False
         pm = self._get_pm(gid)
-        pm.insert_at(0, dict(cur))
+        pm.insert_at(0, cur.copy())
         g = self.bot.get_guild(gid)
         vc = g and g.voice_client
         if vc and (vc.is_playing() or vc.is_paused()):
@@ -798,6 +1316,20 @@ class PlayerService:
         self._emit(gid)
         return nxt
 
+    async def set_autoplay(self, guild_id: int, mode: str = None) -> bool:
+        gid = int(guild_id)
+        cur = self._autoplay_on(gid)
+        if mode in (None, "", "toggle"):
+            nxt = not cur
+        else:
+            nxt = mode in ("on", "true", "1")
+        self.autoplay[gid] = nxt
+        if not nxt and (self._prepared.get(gid, {}).get("kind") == "autoplay"
+                        or (gid in self._preparing and self._preparing_key.get(gid) is None)):
+            self._drop_prepared(gid)
+        self._emit(gid)
+        return nxt
+
     async def set_music_mode(self, guild_id: int, on_off: str = None) -> bool:
         gid = int(guild_id)
         cur = self.audio_mode.get(gid, "music")
@@ -834,25 +1366,222 @@ class PlayerService:
                     "artist": head.get("artist"), "thumb": head.get("thumb"),
                     "duration": head.get("duration"), "provider": head.get("provider") or "youtube"}
 
-        res = await self.enqueue(gid, user_id, item)
+        batch = [item]
+        for e in bundle_entries[1:10]:
+            batch.append({
+                "title": e.get("title"), "url": e.get("url"),
+                "artist": e.get("artist"), "thumb": e.get("thumb"),
+                "duration": e.get("duration"), "provider": e.get("provider") or "youtube",
+            })
+
+        res = await self.enqueue_many(gid, user_id, batch)
         if not res.get("ok"):
             return res
 
-        if bundle_entries and len(bundle_entries) > 1:
-            for e in bundle_entries[1:10]:
-                try:
-                    await self.enqueue(gid, user_id, {
-                        "title": e.get("title"), "url": e.get("url"),
-                        "artist": e.get("artist"), "thumb": e.get("thumb"),
-                        "duration": e.get("duration"), "provider": e.get("provider") or "youtube",
-                    })
-                except Exception:
-                    pass
-
         if not self.is_playing.get(gid, False):
             await self.play_next(g)
         return {"ok": True}
 
+    # ─── Autoplay ───
+
+    def _autoplay_on(self, gid: int) -> bool:
+        return bool(self.autoplay.get(gid, _AUTOPLAY_DEFAULT))
+
+    def _cleanup_source(self, src) -> None:
+        try:
+            if src is not None and hasattr(src, "cleanup"):
+                src.cleanup()
+        except Exception:
+            pass
+        self._finish_tee(src, False)
+
+    def _drop_prepared(self, gid: int) -> None:
+        t = self._preparing.pop(gid, None)
+        self._preparing_key.pop(gid, None)
+        if t and not t.done():
+            t.cancel()
+        prep = self._prepared.pop(gid, None)
+        if prep:
+            self._cleanup_source(prep.get("source"))
+
+    def _pick_autoplay(self, gid: int, seed: TrackRecord) -> Optional[TrackRecord]:
+        """Suite de `seed` : transitions observées dans la guild, sinon tendances.
+
+        Exécuté hors boucle (lecture SQLite). Exclut le morceau courant, la file
+        et les derniers morceaux joués ; tirage pondéré par le nombre de transitions.
+        """
+        store = self._get_hm(gid).store
+        recent = set(self._autoplay_recent.get(gid, ()))
+        recent.add(seed.ensure_track_id())
+        recent.update(it.ensure_track_id() for it in self._get_pm(gid).peek_all())
+
+        candidates = [c for c in store.next_tracks(gid, seed.ensure_track_id(), 10) if c["track_id"] not in recent]
+        if candidates:
+            pick = random.choices(candidates, weights=[c["transitions"] for c in candidates])[0]
+        else:
+            trending = [c for c in store.trending(gid, 20) if c["track_id"] not in recent]
+            if not trending:
+                return None
+            pick = random.choice(trending[:5])
+        return TrackRecord(
+            url=pick["url"],
+            title=pick.get("title") or pick["url"],
+            artist=pick.get("artist") or None,
+            thumb=pick.get("thumb") or None,
+            duration=pick.get("duration"),
+            provider=pick.get("provider"),
+            ts=int(time.time()),
+            item_id=TrackRecord.new_id(),
+            track_id=pick["track_id"],
+            extra={"autoplay": True},
+        )
+
+    # ─── Prefetch (suivant pré-armé) ───
+
+    async def _resolve_source(self, gid: int, item: TrackRecord, tag: str):
+        """Source prête à jouer : cache audio local, sinon extracteur (stream puis stream_pipe)."""
+        source = self._cached_source(gid, item)
+        if source is not None:
+            return source
+        extractor = get_extractor(item.url)
+        for method in ("stream", "stream_pipe"):
+            if not extractor or not hasattr(extractor, method):
+                continue
+            try:
+                source, title = await self._open_stream(gid, extractor, method, item)
+                if title and isinstance(title, str):
+                    item.title = title
+                return source
+            except Exception as e:
+                logger.debug("[%s %s KO] guild=%s url=%s: %s", tag, method, gid, item.url, e)
+        return None
+
+    def _prepared_stale(self, gid: int, prep: dict, head: Optional[TrackRecord]) -> bool:
+        """La préparation ne correspond plus à ce qui sera joué (file éditée,
+        filtre changé) ou sa source est trop vieille pour être jouée."""
+        if prep.get("afilter") != self._afilter_for(gid) or self._prepared_expired(prep):
+            return True
+        if prep["kind"] == "queue":
+            return head is None or prep["key"] != head.item_id
+        return head is not None or not self._autoplay_on(gid)
+
+    @staticmethod
+    def _prepared_expired(prep: dict) -> bool:
+        return time.monotonic() - prep.get("at", 0.0) > _PREFETCH_MAX_AGE
+
+    def _maybe_prefetch(self, gid: int) -> None:
+        """Appelé par le ticker en fin de morceau : pré-arme la tête de file,
+        ou la suite autoplay si la file est vide. Jette une préparation périmée."""
+        head = self._get_pm(gid).item_at(0)
+        prep = self._prepared.get(gid)
+        if prep is not None:
+            if not self._prepared_stale(gid, prep, head):
+                return
+            self._drop_prepared(gid)
+        key = head.item_id if head is not None else None
+        t = self._preparing.get(gid)
+        if t and not t.done():
+            if self._preparing_key.get(gid) == key:
+                return
+            self._drop_prepared(gid)
+        if head is not None:
+            self._preparing_key[gid] = key
+            self._preparing[gid] = asyncio.create_task(self._prefetch_head(gid, head.copy()))
+            return
+        seed = self.current_song.get(gid)
+        if self._autoplay_on(gid) and seed is not None:
+            self._preparing_key[gid] = None
+            self._preparing[gid] = asyncio.create_task(self._prepare_autoplay(gid, seed))
+
+    def _prepare_done(self, gid: int) -> None:
+        # Ne retire que sa propre tâche (une annulée peut finir après sa remplaçante)
+        if self._preparing.get(gid) is asyncio.current_task():
+            self._preparing.pop(gid, None)
+            self._preparing_key.pop(gid, None)
+
+    async def _prefetch_head(self, gid: int, head: TrackRecord) -> None:
+        """Résout le flux de la tête de file pendant la fin du morceau courant."""
+        try:
+            source = await self._resolve_source(gid, head, "prefetch")
+            self._prepared[gid] = {
+                "kind": "queue", "key": head.item_id, "item": head,
+                "source": source, "afilter": self._afilter_for(gid), "at": time.monotonic(),
+            }
+            logger.info("[prefetch] guild=%s suivant pré-armé: %s (flux %s)", gid, head.title, "prêt" if source else "à résoudre")
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.debug("[prefetch] préparation échouée guild=%s: %s", gid, e)
+        finally:
+            self._prepare_done(gid)
+
+    async def _take_prefetched(self, gid: int, item: TrackRecord):
+        """Source pré-armée pour `item` (tête dépilée) si elle lui correspond, sinon None.
+
+        Une préparation en cours pour ce même item est attendue (borné) ; toute
+        autre préparation est jetée proprement.
+        """
+        t = self._preparing.get(gid)
+        if t and not t.done() and self._preparing_key.get(gid) == item.item_id:
+            try:
+                await asyncio.wait_for(asyncio.shield(t), timeout=_PREFETCH_WAIT)
+            except Exception:
+                pass
+        prep = self._prepared.get(gid)
+        if (prep and prep["kind"] == "queue" and prep["key"] == item.item_id
+                and prep.get("afilter") == self._afilter_for(gid) and not self._prepared_expired(prep)):
+            self._prepared.pop(gid, None)
+            title = prep["item"].title
+            if title and (not item.title or item.title == item.url):
+                item.title = title
+            return prep.get("source")
+        self._drop_prepared(gid)
+        return None
+
+    async def _prepare_autoplay(self, gid: int, seed: TrackRecord) -> None:
+        """Choisit la suite et résout son flux avant la fin du morceau courant."""
+        try:
+            item = await asyncio.to_thread(self._pick_autoplay, gid, seed)
+            if item is None:
+                return
+            source = await self._resolve_source(gid, item, "autoplay prepare")
+            self._prepared[gid] = {
+                "kind": "autoplay", "seed": seed.ensure_track_id(), "item": item,
+                "source": source, "afilter": self._afilter_for(gid), "at": time.monotonic(),
+            }
+            logger.info("[autoplay] guild=%s suite préparée: %s (flux %s)", gid, item.title, "prêt" if source else "à résoudre")
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.debug("[autoplay] préparation échouée guild=%s: %s", gid, e)
+        finally:
+            self._prepare_done(gid)
+
+    async def _take_autoplay(self, gid: int):
+        """(item, source préparée ou None) pour enchaîner quand la file est vide."""
+        seed = self.current_song.get(gid)
+        if not self._autoplay_on(gid) or seed is None:
+            self._drop_prepared(gid)
+            return None, None
+        t = self._preparing.get(gid)
+        if t and not t.done() and self._preparing_key.get(gid) is None:
+            try:
+                await asyncio.wait_for(asyncio.shield(t), timeout=_PREFETCH_WAIT)
+            except Exception:
+                pass
+        prep = self._prepared.get(gid)
+        if (prep and prep["kind"] == "autoplay" and prep.get("seed") == seed.ensure_track_id()
+                and prep.get("afilter") == self._afilter_for(gid) and not self._prepared_expired(prep)):
+            self._prepared.pop(gid, None)
+            return prep["item"], prep.get("source")
+        self._drop_prepared(gid)
+        try:
+            item = await asyncio.to_thread(self._pick_autoplay, gid, seed)
+        except Exception as e:
+            logger.debug("[autoplay] choix échoué guild=%s: %s", gid, e)
+            item = None
+        return item, None
+
     # ─── Progress ticker ───
 
     def _ticker_running(self, gid: int) -> bool:
@@ -894,6 +1623,9 @@ class PlayerService:
                     except Exception:
                         pass
 
+                    if dur and dur - elapsed <= _PREFETCH_LEAD and not vc.is_paused():
+                        self._maybe_prefetch(gid)
+
                     await asyncio.sleep(1.0)
             except asyncio.CancelledError:
                 pass
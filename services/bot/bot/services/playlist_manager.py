@@ -6,25 +6,83 @@ import json
 import os
 import tempfile
 import time
+from collections import deque
 from pathlib import Path
 from threading import RLock
-from typing import Any, Dict, List, Optional
+from typing import Any, Deque, Dict, List, Optional
+
+from greg_shared import queue_store
+from greg_shared.models import TrackRecord
+from greg_shared.priority import QueueIndex
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except (ValueError, TypeError):
+        return default
+
+
+# Mode journal : chaque mutation est ajoutée en fin de `playlist_<gid>.journal`
+# (une ligne JSON par opération) au lieu de réécrire tout le snapshot.
+# Le snapshot est compacté périodiquement (nombre d'ops OU taille du journal).
+_JOURNAL_ENABLED = os.getenv("PLAYLIST_JOURNAL", "1").lower() not in ("0", "false", "")
+_JOURNAL_COMPACT_OPS = _env_int("PLAYLIST_JOURNAL_COMPACT_OPS", 200)
+_JOURNAL_COMPACT_BYTES = _env_int("PLAYLIST_JOURNAL_COMPACT_BYTES", 512 * 1024)
+_JOURNAL_FSYNC = os.getenv("PLAYLIST_JOURNAL_FSYNC", "0").lower() not in ("0", "false", "")
+
+# Nombre de mutations récentes gardées en mémoire pour générer des patches
+# (état v → v+n). Au-delà, le client reçoit un snapshot complet.
+_PATCH_HISTORY = _env_int("PLAYLIST_PATCH_HISTORY", 256)
+
+# Backend Redis injoignable : délai (s) avant de le retenter. Entre-temps les
+# mutations vont directement au journal local, sans payer les timeouts redis-py.
+_STORE_RETRY_SEC = _env_int("PLAYLIST_STORE_RETRY_SEC", 10)
+
+
+def _json_default(o: Any) -> Any:
+    """Sérialise les TrackRecord au moment de l'écriture (snapshot / journal)."""
+    if isinstance(o, TrackRecord):
+        return o.to_dict()
+    raise TypeError(f"non sérialisable: {type(o).__name__}")
 
 
 class PlaylistManager:
     """
     Gestion d'une playlist *par serveur Discord (guild)*.
 
-    Format JSON:
+    Format JSON (snapshot):
       {
+        "version": 42,
         "now_playing": { ... } | null,
         "queue": [ {title, url, artist, thumb, duration, ...}, ... ]
       }
 
+    Journal (`playlist_<gid>.journal`, une ligne JSON par mutation):
+      {"v": 43, "op": "add", "item": {...}}
+      {"v": 44, "op": "move", "src": 3, "dst": 0}
+      {"v": 45, "op": "reorder", "order": [2, 0, 1]}
+      {"v": 46, "op": "remove_many", "indexes": [0, 4]}
+
+    En mémoire, les items sont des `TrackRecord` (slots, interface façon dict) ;
+    ils ne sont convertis en dict qu'à l'écriture disque et dans `expose()`.
+
+    Backend Redis optionnel (`PLAYLIST_BACKEND=redis`, cf. greg_shared.queue_store) :
+    chaque mutation est appliquée atomiquement (Lua) dans Redis, qui devient la
+    référence lisible directement par l'API. Le journal local ne sert alors que
+    de repli si Redis est injoignable ; au chargement, la version la plus
+    haute (Redis ou disque) l'emporte.
+
     Garanties:
     - Thread-safe via RLock
-    - Écriture ATOMIQUE (tempfile + replace)
-    - Source de vérité = mémoire (pas de reload pendant save)
+    - Écriture ATOMIQUE du snapshot (tempfile + replace)
+    - Mutations en O(1) disque : append au journal, compaction périodique
+    - Rejeu au chargement : seules les ops de version > snapshot sont rejouées,
+      dans l'ordre strict des versions (arrêt au premier trou) ; une ligne
+      tronquée (crash en cours d'écriture) est ignorée
+    - Source de vérité = mémoire : `reload()` ne reparse que si le snapshot
+      ou le journal ont changé sur disque (stamp mtime/taille) depuis notre
+      dernière écriture/lecture — lire l'état ne coûte aucune I/O
     - Migration automatique des vieux formats
     """
 
@@ -35,12 +93,30 @@ class PlaylistManager:
         base_dir.mkdir(parents=True, exist_ok=True)
 
         self.file = str(base_dir / f"playlist_{self.guild_id}.json")
-        self.queue: List[Dict[str, Any]] = []
-        self.now_playing: Optional[Dict[str, Any]] = None
+        self.journal_file = str(base_dir / f"playlist_{self.guild_id}.journal")
+        self.queue: List[TrackRecord] = []
+        self.now_playing: Optional[TrackRecord] = None
+        self.version = 0
+        self.index = QueueIndex()
         self.lock = RLock()
 
+        self._journal_fh = None
+        self._journal_ops = 0
+        self._journal_bytes = 0
+        self._disk_stamp: Optional[tuple] = None
+        self._recent: Deque[Dict[str, Any]] = deque(maxlen=max(0, _PATCH_HISTORY))
+
+        self._store: Optional[queue_store.RedisQueueStore] = None
+        self._store_dirty = False
+        self._store_retry_at = 0.0
+        if queue_store.backend_enabled():
+            try:
+                self._store = queue_store.RedisQueueStore(self.guild_id)
+            except Exception as e:
+                print(f"[PlaylistManager {self.guild_id}] ⚠️ Backend Redis indisponible → fichiers. {e}")
+
         print(f"[PlaylistManager {self.guild_id}] ⚙️ Init — file={self.file}")
-        self.reload()
+        self._load()
 
     # ------------------------- I/O SÉCURISÉ -------------------------
 
@@ -52,7 +128,8 @@ class PlaylistManager:
         directory.mkdir(parents=True, exist_ok=True)
 
         payload = {
-            "now_playing": self.now_playing if isinstance(self.now_playing, (dict, type(None))) else None,
+            "version": self.version,
+            "now_playing": self.now_playing if isinstance(self.now_playing, TrackRecord) else None,
             "queue": self.queue if isinstance(self.queue, list) else [],
         }
 
@@ -63,22 +140,325 @@ class PlaylistManager:
             suffix=".tmp",
             encoding="utf-8",
         ) as tf:
-            json.dump(payload, tf, ensure_ascii=False)
+            json.dump(payload, tf, ensure_ascii=False, default=_json_default)
             tmp_name = tf.name
 
         os.replace(tmp_name, self.file)
         print(f"[PlaylistManager {self.guild_id}] 💾 Sauvegarde atomique ({len(payload['queue'])} items).")
 
-    def reload(self) -> None:
+    # ------------------------- JOURNAL -------------------------
+
+    def _close_journal(self) -> None:
+        fh, self._journal_fh = self._journal_fh, None
+        if fh is not None:
+            try:
+                fh.close()
+            except Exception:
+                pass
+
+    def _truncate_journal(self) -> None:
+        """Vide le journal (après compaction : tout est dans le snapshot)."""
+        self._close_journal()
+        try:
+            with open(self.journal_file, "w", encoding="utf-8"):
+                pass
+        except FileNotFoundError:
+            pass
+        self._journal_ops = 0
+        self._journal_bytes = 0
+
+    def _append_journal(self, rec: Dict[str, Any]) -> None:
+        """Ajoute une mutation en fin de journal (une ligne JSON)."""
+        if self._journal_fh is None:
+            self._journal_fh = open(self.journal_file, "a", encoding="utf-8")
+            if not self._journal_ends_clean():
+                # Fin de fichier sans saut de ligne (écriture tronquée) : on
+                # repart sur une ligne neuve, la partielle seule sera ignorée.
+                self._journal_fh.write("\n")
+        line = json.dumps(rec, ensure_ascii=False, default=_json_default) + "\n"
+        self._journal_fh.write(line)
+        self._journal_fh.flush()
+        if _JOURNAL_FSYNC:
+            os.fsync(self._journal_fh.fileno())
+        self._journal_ops += 1
+        self._journal_bytes += len(line)
+
+    def _journal_ends_clean(self) -> bool:
+        """True si le journal est vide ou finit par un saut de ligne."""
+        try:
+            with open(self.journal_file, "rb") as f:
+                f.seek(0, os.SEEK_END)
+                if f.tell() == 0:
+                    return True
+                f.seek(-1, os.SEEK_END)
+                return f.read(1) == b"\n"
+        except OSError:
+            return True
+
+    def _compact(self) -> None:
+        """Réécrit le snapshot complet puis vide le journal.
+
+        Ordre important : le snapshot (qui porte `version`) est remplacé AVANT
+        la troncature. Un crash entre les deux laisse des ops de version
+        <= snapshot dans le journal, ignorées au rejeu.
+        """
+        self._safe_write()
+        self._truncate_journal()
+        self._disk_stamp = self._stat_stamp()
+
+    def _stat_stamp(self) -> tuple:
+        """Empreinte disque (mtime_ns, taille) du snapshot et du journal."""
+        out = []
+        for path in (self.file, self.journal_file):
+            try:
+                st = os.stat(path)
+                out.append((st.st_mtime_ns, st.st_size))
+            except OSError:
+                out.append(None)
+        return tuple(out)
+
+    def _read_journal(self) -> List[Dict[str, Any]]:
+        """Lit le journal. Une ligne illisible (écriture tronquée par un crash,
+        jamais acquittée) est ignorée ; les ops suivantes restent valables."""
+        records: List[Dict[str, Any]] = []
+        if not os.path.exists(self.journal_file):
+            return records
+        with open(self.journal_file, "r", encoding="utf-8") as f:
+            for raw in f:
+                raw = raw.strip()
+                if not raw:
+                    continue
+                try:
+                    rec = json.loads(raw)
+                except Exception:
+                    print(f"[PlaylistManager {self.guild_id}] ⚠️ Journal : ligne tronquée ignorée.")
+                    continue
+                if isinstance(rec, dict) and isinstance(rec.get("v"), int):
+                    records.append(rec)
+        return records
+
+    def _apply(self, rec: Dict[str, Any]) -> None:
+        """Applique une mutation en mémoire (+ QueueIndex). Partagé par le live et le rejeu.
+
+        Au rejeu, les items lus du journal sont des dicts → convertis en TrackRecord.
+        """
+        op = rec.get("op")
+        q = self.queue
+        ix = self.index
+        if op == "add":
+            item = rec["item"] = TrackRecord.from_any(rec["item"])
+            q.append(item)
+            ix.inserted(q, len(q) - 1, [item])
+        elif op == "add_many":
+            items = rec["items"] = [TrackRecord.from_any(x) for x in rec["items"]]
+            idx = rec.get("index")
+            idx = len(q) if idx is None else max(0, min(int(idx), len(q)))
+            q[idx:idx] = items
+            ix.inserted(q, idx, items)
+        elif op == "insert":
+            item = rec["item"] = TrackRecord.from_any(rec["item"])
+            idx = max(0, min(int(rec["index"]), len(q)))
+            q.insert(idx, item)
+            ix.inserted(q, idx, [item])
+        elif op == "pop":
+            if q:
+                self.now_playing = q.pop(0)
+                ix.removed(q, 0, self.now_playing)
+        elif op == "skip":
+            if q:
+                ix.removed(q, 0, q.pop(0))
+        elif op == "clear":
+            q.clear()
+            ix.clear()
+            self.now_playing = None
+        elif op == "remove":
+            idx = int(rec["index"])
+            if 0 <= idx < len(q):
+                ix.removed(q, idx, q.pop(idx))
+        elif op == "move":
+            src, dst = int(rec["src"]), int(rec["dst"])
+            if 0 <= src < len(q) and 0 <= dst < len(q):
+                item = q.pop(src)
+                ix.removed(q, src, item)
+                q.insert(dst, item)
+                ix.inserted(q, dst, [item])
+        elif op == "reorder":
+            order = [int(i) for i in rec["order"]]
+            if sorted(order) == list(range(len(q))):
+                q[:] = [q[i] for i in order]
+                ix.rebuild(q)
+        elif op == "remove_many":
+            drop = {int(i) for i in rec["indexes"]}
+            q[:] = [it for i, it in enumerate(q) if i not in drop]
+            ix.rebuild(q)
+        elif op == "update":
+            item = rec["item"] = TrackRecord.from_any(rec["item"])
+            self._replace_at(int(rec["index"]), item)
+        elif op == "update_many":
+            for u in rec["updates"]:
+                item = u["item"] = TrackRecord.from_any(u["item"])
+                self._replace_at(int(u["index"]), item)
+        else:
+            raise ValueError(f"op inconnue: {op!r}")
+
+    def _replace_at(self, idx: int, item: TrackRecord) -> None:
+        """Remplace l'item à `idx` (même place dans la queue, index mis à jour)."""
+        q = self.queue
+        if 0 <= idx < len(q):
+            old, q[idx] = q[idx], item
+            self.index.replaced(q, idx, old, item)
+
+    def _commit(self, op: Dict[str, Any]) -> Dict[str, Any]:
+        """Applique une mutation, la persiste (journal ou snapshot) et bump la version."""
+        self.version += 1
+        rec = {"v": self.version, **op}
+        self._apply(rec)
+        self._recent.append(rec)
+
+        if self._store is not None:
+            was_dirty = self._store_dirty
+            if self._store_commit(rec):
+                # Copie disque de secours (Redis vidé / backend désactivé) de temps en temps.
+                self._journal_ops += 1
+                if self._journal_ops >= _JOURNAL_COMPACT_OPS:
+                    self._compact()
+                return rec
+            if not was_dirty:
+                # Redis vient de tomber : le disque n'a pas les ops passées par
+                # Redis depuis la dernière copie → snapshot complet avant tout
+                # append, sinon le journal rejouerait sur une base périmée.
+                self._compact()
+                return rec
+
+        if not _JOURNAL_ENABLED:
+            self._safe_write()
+            self._disk_stamp = self._stat_stamp()
+            return rec
+
+        try:
+            self._append_journal(rec)
+        except Exception as e:
+            print(f"[PlaylistManager {self.guild_id}] ⚠️ Journal KO → snapshot complet. {e}")
+            self._compact()
+            return rec
+
+        if self._journal_ops >= _JOURNAL_COMPACT_OPS or self._journal_bytes >= _JOURNAL_COMPACT_BYTES:
+            self._compact()
+        else:
+            self._disk_stamp = self._stat_stamp()
+        return rec
+
+    # ------------------------- BACKEND REDIS -------------------------
+
+    def _store_push(self) -> None:
+        """Republie tout l'état mémoire dans Redis (snapshot atomique)."""
+        self._store.replace(self.version, self.now_playing, self.queue)
+        self._store_dirty = False
+
+    def _store_failed(self) -> None:
+        """Redis KO : état à republier en entier, pas de nouvel essai avant un moment."""
+        self._store_dirty = True
+        self._store_retry_at = time.monotonic() + _STORE_RETRY_SEC
+
+    def _store_commit(self, rec: Dict[str, Any]) -> bool:
+        """Applique la mutation dans Redis. False → l'appelant persiste en local."""
+        if time.monotonic() < self._store_retry_at:
+            self._store_dirty = True
+            return False
+        try:
+            if self._store_dirty:
+                self._store_push()
+                return True
+            try:
+                self._store.apply(rec)
+            except queue_store.VersionMismatch:
+                print(f"[PlaylistManager {self.guild_id}] ⚠️ Version Redis divergente → snapshot complet.")
+                self._store_push()
+            return True
+        except Exception as e:
+            print(f"[PlaylistManager {self.guild_id}] ⚠️ Redis KO → journal local. {e}")
+            self._store_failed()
+            return False
+
+    def _store_changed(self) -> bool:
+        """True si la version stockée dans Redis diffère de la nôtre."""
+        if self._store is None or time.monotonic() < self._store_retry_at:
+            return False
+        try:
+            v = self._store.version()
+        except Exception:
+            self._store_retry_at = time.monotonic() + _STORE_RETRY_SEC
+            return False
+        return v is not None and v != self.version
+
+    def _load_from_store(self) -> None:
+        """Après le chargement disque : adopte l'état Redis s'il est plus récent,
+        sinon (Redis vide / en retard) y republie l'état local."""
+        if time.monotonic() < self._store_retry_at:
+            self._store_dirty = True
+            return
+        try:
+            data = self._store.load()
+            if data is not None and data["version"] >= self.version:
+                self.queue = [self._coerce_item(x) for x in data["queue"]]
+                np_raw = data.get("now_playing")
+                self.now_playing = self._coerce_item(np_raw) if isinstance(np_raw, dict) else None
+                self.version = data["version"]
+                self.index.rebuild(self.queue)
+                self._store_dirty = False
+            else:
+                self._store_push()
+        except Exception as e:
+            print(f"[PlaylistManager {self.guild_id}] ⚠️ Lecture Redis impossible → état disque. {e}")
+            self._store_failed()
+
+    def reload(self, force: bool = False) -> bool:
         """
-        Recharge la playlist depuis le disque (migration OK).
+        Recharge depuis le disque UNIQUEMENT si les fichiers ont changé depuis
+        notre dernière écriture/lecture (ou si `force`). Retourne True si reparsé.
+
+        Les chemins chauds (get_state, enqueue, play_next) n'ont pas besoin de
+        l'appeler : la mémoire fait foi, ceci ne sert qu'aux modifs externes.
+        """
+        with self.lock:
+            if (
+                not force
+                and self._disk_stamp is not None
+                and self._stat_stamp() == self._disk_stamp
+                and not self._store_changed()
+            ):
+                return False
+            self._load()
+            return True
+
+    def _load(self) -> None:
+        """
+        Charge la playlist depuis le disque (snapshot + rejeu du journal, migration OK),
+        puis réconcilie avec Redis si ce backend est actif.
         """
         with self.lock:
+            self._load_disk()
+            if self._store is not None:
+                self._load_from_store()
+
+    def _load_disk(self) -> None:
+        """Snapshot + rejeu du journal (migration des vieux formats)."""
+        with self.lock:
+            self._close_journal()
+            # Les versions peuvent sauter après un rechargement : plus de patch possible.
+            self._recent.clear()
+
             if not os.path.exists(self.file):
                 self.queue = []
                 self.now_playing = None
-                self._safe_write()
-                print(f"[PlaylistManager {self.guild_id}] 📂 Nouveau fichier créé (vide).")
+                self.version = 0
+                self.index.rebuild(self.queue)
+                replayed = self._replay_journal()
+                self._compact()
+                if replayed:
+                    print(f"[PlaylistManager {self.guild_id}] 📂 Snapshot absent — {replayed} ops rejouées.")
+                else:
+                    print(f"[PlaylistManager {self.guild_id}] 📂 Nouveau fichier créé (vide).")
                 return
 
             try:
@@ -89,31 +469,83 @@ class PlaylistManager:
                 if isinstance(data, dict):
                     q = data.get("queue", [])
                     np_raw = data.get("now_playing", None)
+                    version = data.get("version", 0)
                 elif isinstance(data, list):
                     # vieux format: le fichier = liste directement
                     q = data
                     np_raw = None
+                    version = 0
                 else:
                     q = []
                     np_raw = None
+                    version = 0
 
                 self.queue = [self._coerce_item(x) for x in (q or [])]
                 self.now_playing = self._coerce_item(np_raw) if isinstance(np_raw, dict) else None
+                self.version = version if isinstance(version, int) and version >= 0 else 0
+                self.index.rebuild(self.queue)
+
+                replayed = self._replay_journal()
+                journal_size = os.path.getsize(self.journal_file) if os.path.exists(self.journal_file) else 0
+                if replayed or journal_size:
+                    # On replie tout de suite le journal dans le snapshot : il
+                    # peut finir sur une ligne tronquée (crash) qu'un append
+                    # suivant prolongerait, rendant illisibles les ops d'après.
+                    self._compact()
+                else:
+                    self._journal_ops = 0
+                    self._journal_bytes = 0
+                    self._disk_stamp = self._stat_stamp()
 
                 print(
                     f"[PlaylistManager {self.guild_id}] 🔄 Reload "
-                    f"({len(self.queue)} items, now_playing={'oui' if self.now_playing else 'non'})."
+                    f"({len(self.queue)} items, now_playing={'oui' if self.now_playing else 'non'}, "
+                    f"v={self.version}, journal={replayed} ops)."
                 )
             except Exception as e:
                 print(f"[PlaylistManager {self.guild_id}] ⚠️ JSON invalide → reset vide. {e}")
                 self.queue = []
                 self.now_playing = None
-                self._safe_write()
+                self.version = 0
+                self.index.rebuild(self.queue)
+                self._compact()
+
+    def _replay_journal(self) -> int:
+        """Rejoue les ops du journal plus récentes que le snapshot. Retourne le nombre rejoué.
+
+        Les ops portent des indexes : elles ne valent que sur l'état exact de
+        la version précédente. Au premier trou de version (ou op en échec),
+        le rejeu s'arrête plutôt que d'appliquer la suite sur une mauvaise base.
+        """
+        count = 0
+        for rec in self._read_journal():
+            if rec["v"] <= self.version:
+                continue
+            if rec["v"] != self.version + 1:
+                print(
+                    f"[PlaylistManager {self.guild_id}] ⚠️ Journal : trou de version "
+                    f"(v={self.version} → {rec['v']}), rejeu arrêté."
+                )
+                break
+            try:
+                self._apply(rec)
+            except Exception as e:
+                print(f"[PlaylistManager {self.guild_id}] ⚠️ Op journal en échec v={rec.get('v')}, rejeu arrêté: {e}")
+                break
+            self.version = rec["v"]
+            count += 1
+        return count
 
     def save(self) -> None:
-        """Sauvegarde l'état courant sur disque (atomique)."""
+        """Sauvegarde l'état courant sur disque (snapshot atomique + journal vidé)."""
         with self.lock:
-            self._safe_write()
+            self._compact()
+            if self._store is not None:
+                try:
+                    self._store_push()
+                except Exception as e:
+                    print(f"[PlaylistManager {self.guild_id}] ⚠️ Redis KO au save. {e}")
+                    self._store_failed()
 
     # ------------------------- UTILITAIRES -------------------------
 
@@ -134,135 +566,136 @@ class PlaylistManager:
         except Exception:
             return None
 
-    def _coerce_item(self, x: Any) -> Dict[str, Any]:
+    def _coerce_item(self, x: Any) -> TrackRecord:
         """
-        Normalise un track en dict standard.
+        Normalise un track en TrackRecord.
+
+        Un TrackRecord est normalisé sur place et repris tel quel (pas de copie) :
+        l'appelant en cède la propriété à la playlist. Un `item_id` stable et le
+        `track_id` canonique sont attribués s'ils manquent.
         """
         ts = int(time.time())
 
-        if isinstance(x, dict):
-            item = {**x}
+        if isinstance(x, TrackRecord):
+            x.url = self._clean_url_value(x.url)
+            x.title = x.title or x.url or "Titre inconnu"
+            x.duration = self._to_int_or_none(x.duration)
+            if x.ts is None:
+                x.ts = ts
+            if not x.item_id:
+                x.item_id = TrackRecord.new_id()
+            x.ensure_track_id()
+            return x
 
-            url = item.get("url") or item.get("webpage_url") or item.get("link")
+        if isinstance(x, dict):
+            url = x.get("url") or x.get("webpage_url") or x.get("link")
             url = self._clean_url_value(url)
 
-            title = item.get("title") or url or "Titre inconnu"
-            dur = self._to_int_or_none(item.get("duration"))
-
-            item["title"] = title
-            item["url"] = url
-            item["artist"] = item.get("artist") or item.get("uploader") or item.get("channel") or None
-            item["thumb"] = item.get("thumb") or item.get("thumbnail") or None
-            item["duration"] = dur
-
-            item.setdefault("added_by", None)
-            item.setdefault("priority", item.get("priority"))
-            item.setdefault("provider", item.get("provider"))
-            item.setdefault("ts", ts)
+            item = TrackRecord.from_dict(x)
+            item.url = url
+            item.title = x.get("title") or url or "Titre inconnu"
+            item.artist = x.get("artist") or x.get("uploader") or x.get("channel") or None
+            item.thumb = x.get("thumb") or x.get("thumbnail") or None
+            item.duration = self._to_int_or_none(x.get("duration"))
+            if item.ts is None:
+                item.ts = ts
+            if not item.item_id:
+                item.item_id = TrackRecord.new_id()
+            item.ensure_track_id()
             return item
 
         if isinstance(x, str):
             url = self._clean_url_value(x)
-            return {
-                "title": url,
-                "url": url,
-                "artist": None,
-                "thumb": None,
-                "duration": None,
-                "added_by": None,
-                "priority": None,
-                "provider": None,
-                "ts": ts,
-            }
+            item = TrackRecord(url=url, title=url, ts=ts, item_id=TrackRecord.new_id())
+            item.ensure_track_id()
+            return item
 
         if x is not None:
             print(f"[PlaylistManager {self.guild_id}] 🙄 Élément illisible ignoré: {x!r}")
 
-        return {
-            "title": "Inconnu",
-            "url": "about:blank",
-            "artist": None,
-            "thumb": None,
-            "duration": None,
-            "added_by": None,
-            "priority": None,
-            "provider": None,
-            "ts": ts,
-        }
+        return TrackRecord(ts=ts, item_id=TrackRecord.new_id())
 
     # ------------------------- API PUBLIQUE -------------------------
 
-    def add(self, item: Dict[str, Any] | str, added_by: Optional[str | int] = None) -> Dict[str, Any]:
+    def add(self, item: TrackRecord | Dict[str, Any] | str, added_by: Optional[str | int] = None) -> TrackRecord:
         """Ajoute un item (url ou dict). Retourne l'item normalisé."""
         with self.lock:
             obj = self._coerce_item(item)
             if added_by is not None and str(added_by).strip():
                 obj["added_by"] = str(added_by)
-            self.queue.append(obj)
-            self.save()
+            self._commit({"op": "add", "item": obj})
             print(f"[PlaylistManager {self.guild_id}] ➕ Ajouté: {obj.get('title')} — {obj.get('url')}")
             return obj
 
-    def add_many(self, items: List[Dict[str, Any] | str], added_by: Optional[str | int] = None) -> int:
-        """Ajoute plusieurs items. Retourne le nombre ajoutés."""
+    def add_many(
+        self,
+        items: List[TrackRecord | Dict[str, Any] | str],
+        added_by: Optional[str | int] = None,
+        index: Optional[int] = None,
+    ) -> int:
+        """Ajoute plusieurs items en UNE mutation (une seule écriture).
+
+        `index` : position d'insertion du bloc (None = fin de queue).
+        Retourne le nombre ajoutés.
+        """
         with self.lock:
-            count = 0
+            objs = []
             for it in items:
                 obj = self._coerce_item(it)
                 if added_by is not None and str(added_by).strip():
                     obj["added_by"] = str(added_by)
-                self.queue.append(obj)
-                count += 1
-            self.save()
+                objs.append(obj)
+            count = len(objs)
+            if objs:
+                op: Dict[str, Any] = {"op": "add_many", "items": objs}
+                if index is not None and 0 <= index < len(self.queue):
+                    op["index"] = int(index)
+                self._commit(op)
             print(f"[PlaylistManager {self.guild_id}] ➕➕ Ajouté {count} éléments.")
             return count
 
-    def insert_at(self, index: int, item: Dict[str, Any] | str) -> Dict[str, Any]:
+    def insert_at(self, index: int, item: TrackRecord | Dict[str, Any] | str) -> TrackRecord:
         """Insère un item à une position spécifique."""
         with self.lock:
-            obj = self._coerce_item(item) if isinstance(item, str) else dict(item)
+            obj = self._coerce_item(item)
             idx = max(0, min(index, len(self.queue)))
-            self.queue.insert(idx, obj)
-            self.save()
+            self._commit({"op": "insert", "index": idx, "item": obj})
             return obj
 
-    def pop_next(self) -> Optional[Dict[str, Any]]:
+    def pop_next(self) -> Optional[TrackRecord]:
         """Retire et renvoie le prochain item (tête de file) et définit now_playing."""
         with self.lock:
             if not self.queue:
                 print(f"[PlaylistManager {self.guild_id}] 💤 pop_next sur queue vide.")
                 return None
-            item = self.queue.pop(0)
-            self.now_playing = item
-            self.save()
+            item = self.queue[0]
+            self._commit({"op": "pop"})
             print(f"[PlaylistManager {self.guild_id}] ⏭️ Prochain: {item.get('title')}")
             return item
 
-    def skip(self) -> Optional[Dict[str, Any]]:
+    def skip(self) -> Optional[TrackRecord]:
         """Supprime le 1er élément de queue (pas le now_playing)."""
         with self.lock:
             if not self.queue:
                 print(f"[PlaylistManager {self.guild_id}] ⏩ Skip demandé mais queue vide.")
                 return None
-            skipped = self.queue.pop(0)
-            self.save()
+            skipped = self.queue[0]
+            self._commit({"op": "skip"})
             print(f"[PlaylistManager {self.guild_id}] ⏩ Skip: {skipped.get('title')} — {skipped.get('url')}")
             return skipped
 
     def stop(self) -> None:
         """Vide entièrement la playlist et oublie now_playing."""
         with self.lock:
-            self.queue = []
-            self.now_playing = None
-            self.save()
+            self._commit({"op": "clear"})
             print(f"[PlaylistManager {self.guild_id}] ⛔ Playlist vidée (stop).")
 
     def remove_at(self, index: int) -> bool:
         """Supprime l’élément à l’index donné. True si OK."""
         with self.lock:
             if 0 <= index < len(self.queue):
-                removed = self.queue.pop(index)
-                self.save()
+                removed = self.queue[index]
+                self._commit({"op": "remove", "index": index})
                 print(f"[PlaylistManager {self.guild_id}] 🗑️ Supprimé #{index+1}: {removed.get('title')}")
                 return True
             print(f"[PlaylistManager {self.guild_id}] ❌ remove_at hors bornes: {index}")
@@ -277,56 +710,236 @@ class PlaylistManager:
             if not (0 <= src < n and 0 <= dst < n):
                 print(f"[PlaylistManager {self.guild_id}] ❌ move invalide: src={src}, dst={dst}, n={n}")
                 return False
-            item = self.queue.pop(src)
-            self.queue.insert(dst, item)
-            self.save()
+            item = self.queue[src]
+            self._commit({"op": "move", "src": src, "dst": dst})
             print(f"[PlaylistManager {self.guild_id}] 🔀 Déplacé '{item.get('title')}' de {src} vers {dst}.")
             return True
 
+    def reorder(self, order: List[int]) -> bool:
+        """Réordonne toute la queue en une mutation (`order[i]` = ancien index
+        de l'item placé en i). Sert aussi au shuffle (permutation journalisée)."""
+        with self.lock:
+            order = [int(i) for i in order]
+            if sorted(order) != list(range(len(self.queue))):
+                print(f"[PlaylistManager {self.guild_id}] ❌ reorder: permutation invalide.")
+                return False
+            if order == list(range(len(order))):
+                return False
+            self._commit({"op": "reorder", "order": order})
+            print(f"[PlaylistManager {self.guild_id}] 🔀 Queue réordonnée ({len(order)} items).")
+            return True
+
+    def remove_many(self, indexes: List[int]) -> int:
+        """Supprime un ensemble d'indexes en une mutation. Retourne le nombre retiré."""
+        with self.lock:
+            n = len(self.queue)
+            drop = sorted({int(i) for i in indexes if 0 <= int(i) < n})
+            if not drop:
+                return 0
+            self._commit({"op": "remove_many", "indexes": drop})
+            print(f"[PlaylistManager {self.guild_id}] 🗑️ {len(drop)} items supprimés.")
+            return len(drop)
+
+    def merge_requesters(self, item_ids: List[str], user_id: str | int) -> List[TrackRecord]:
+        """Ajoute `user_id` aux demandeurs (`requesters`) des items `item_ids`.
+
+        Politique de doublons "merge" : les morceaux restent à leur place, les
+        items touchés sont réécrits en UNE mutation (op `update_many`), quel
+        que soit le nombre de doublons. Retourne les items modifiés (ceux déjà
+        partis ou où `user_id` figure déjà sont ignorés).
+        """
+        with self.lock:
+            uid = str(user_id)
+            ix = self.index.sync(self.queue)
+            updates: List[Dict[str, Any]] = []
+            seen = set()
+            for item_id in item_ids:
+                idx = ix.position(self.queue, item_id)
+                if idx is None or idx in seen:
+                    continue
+                seen.add(idx)
+                obj = self.queue[idx]
+                requesters = list(obj.get("requesters") or [])
+                if uid == str(obj.get("added_by")) or uid in requesters:
+                    continue
+                obj = obj.copy()
+                requesters.append(uid)
+                obj["requesters"] = requesters
+                updates.append({"index": idx, "item": obj})
+            if updates:
+                self._commit({"op": "update_many", "updates": updates})
+                print(f"[PlaylistManager {self.guild_id}] 🤝 {len(updates)} items : +1 demandeur.")
+            return [u["item"] for u in updates]
+
+    def update_items(self, patches: Dict[str, Dict[str, Any]]) -> List[TrackRecord]:
+        """Complète des items (par `item_id`) en UNE mutation, sans les déplacer.
+
+        Seuls les champs vides de l'item (None, "" ou durée 0, comme
+        ``needs_backfill``) sont remplis par le patch. Retourne les items
+        modifiés (les autres, partis ou déjà complets, sont ignorés).
+        """
+        with self.lock:
+            updates: List[Dict[str, Any]] = []
+            for idx, it in enumerate(self.queue):
+                patch = patches.get(it.item_id) if it.item_id else None
+                if not patch:
+                    continue
+                obj = it.copy()
+                changed = False
+                for k, v in patch.items():
+                    cur = obj.get(k)
+                    if v and (not cur or (k == "title" and cur == obj.url)):
+                        obj[k] = v
+                        changed = True
+                if changed:
+                    updates.append({"index": idx, "item": obj})
+            if updates:
+                self._commit({"op": "update_many", "updates": updates})
+                print(f"[PlaylistManager {self.guild_id}] 🏷️ {len(updates)} items complétés.")
+            return [u["item"] for u in updates]
+
     # ------------------------- LECTURE & ÉTAT -------------------------
 
-    def get_queue(self) -> List[Dict[str, Any]]:
+    def get_queue(self) -> List[TrackRecord]:
         with self.lock:
             return list(self.queue)
 
-    def get_current(self) -> Optional[Dict[str, Any]]:
-        """Renvoie d'abord now_playing si présent, sinon la tête de queue."""
+    def get_index(self) -> QueueIndex:
+        """Index incrémental (frontière prio/normal, compteurs par user, doublons)."""
+        with self.lock:
+            return self.index.sync(self.queue)
+
+    def item_at(self, index: int) -> Optional[TrackRecord]:
+        """Item à la position donnée (sans copier la queue), None si hors bornes."""
+        with self.lock:
+            if 0 <= index < len(self.queue):
+                return self.queue[index]
+            return None
+
+    def index_of(self, item_id: str) -> Optional[int]:
+        """Position actuelle de l'item `item_id` (None s'il n'est plus en queue).
+
+        Lookup via le QueueIndex (table item_id -> position), sans scan.
+        """
+        with self.lock:
+            return self.index.sync(self.queue).position(self.queue, item_id)
+
+    def get_current(self) -> Optional[TrackRecord]:
+        """Renvoie d'abord now_playing si présent, sinon la tête de queue (copie)."""
         with self.lock:
             if self.now_playing:
-                return dict(self.now_playing)
-            return dict(self.queue[0]) if self.queue else None
+                return self.now_playing.copy()
+            return self.queue[0].copy() if self.queue else None
 
     def length(self) -> int:
         with self.lock:
             return len(self.queue)
 
-    def to_dict(self) -> Dict[str, Any]:
-        """Snapshot sérialisable pour l'API/overlay."""
-        def _expose(track: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
-            if not isinstance(track, dict):
-                return None
+    @staticmethod
+    def expose(track: Optional[TrackRecord | Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Dict d'un item tel qu'exposé à l'API (`requested_by` = `added_by`).
+
+        Seul endroit (avec l'écriture disque) où un TrackRecord devient un dict.
+        """
+        if isinstance(track, TrackRecord):
+            t = track.to_dict()
+        elif isinstance(track, dict):
             t = dict(track)
-            t["requested_by"] = t.get("added_by")
-            return t
+        else:
+            return None
+        t["requested_by"] = t.get("added_by")
+        return t
+
+    def to_dict(self, offset: int = 0, limit: Optional[int] = None, if_version: Optional[int] = None) -> Dict[str, Any]:
+        """Snapshot sérialisable pour l'API/overlay.
 
+        `offset`/`limit` : fenêtre de queue exposée (seuls ces items sont copiés).
+        `queue_total` et `version` permettent au client de paginer / cacher.
+        `if_version` : si c'est la version courante, la fenêtre est vide et
+        `unchanged` vaut True — comparaison faite sous le verrou, avec la
+        même version que celle renvoyée.
+        """
         with self.lock:
-            now_play = _expose(self.now_playing)
+            unchanged = if_version is not None and int(if_version) == self.version
+            start = max(0, int(offset or 0))
+            end = len(self.queue) if limit is None else start + max(0, int(limit))
+            if unchanged:
+                end = start
+            now_play = self.expose(self.now_playing)
             return {
                 "now_playing": now_play,
                 "current": now_play,
-                "queue": [_expose(it) for it in self.queue],
+                "queue": [self.expose(it) for it in self.queue[start:end]],
+                "queue_offset": start,
+                "queue_total": len(self.queue),
+                "version": self.version,
+                "unchanged": unchanged,
             }
 
+    def queue_patch(self, since_version: int) -> Optional[List[Dict[str, Any]]]:
+        """Ops de queue (format wire) pour passer de `since_version` à `version`.
+
+        Ops produites :
+          {"op": "insert", "index": i | None, "items": [...]}   (None = fin de queue)
+          {"op": "remove", "index": i}
+          {"op": "move", "src": i, "dst": j}
+          {"op": "reorder", "order": [...]}
+          {"op": "clear"}
+
+        Retourne None si l'historique ne couvre plus `since_version` (rechargement,
+        trop d'ops depuis) : l'appelant doit alors envoyer un snapshot complet.
+        """
+        with self.lock:
+            if since_version == self.version:
+                return []
+            if since_version > self.version or not self._recent:
+                return None
+            if self._recent[0]["v"] > since_version + 1:
+                return None
+
+            ops: List[Dict[str, Any]] = []
+            for rec in self._recent:
+                if rec["v"] <= since_version:
+                    continue
+                op = rec.get("op")
+                if op == "add":
+                    ops.append({"op": "insert", "index": None, "items": [self.expose(rec["item"])]})
+                elif op == "add_many":
+                    ops.append({"op": "insert", "index": rec.get("index"),
+                                "items": [self.expose(it) for it in rec["items"]]})
+                elif op == "insert":
+                    ops.append({"op": "insert", "index": rec["index"], "items": [self.expose(rec["item"])]})
+                elif op in ("pop", "skip"):
+                    ops.append({"op": "remove", "index": 0})
+                elif op == "remove":
+                    ops.append({"op": "remove", "index": rec["index"]})
+                elif op == "move":
+                    ops.append({"op": "move", "src": rec["src"], "dst": rec["dst"]})
+                elif op == "reorder":
+                    ops.append({"op": "reorder", "order": list(rec["order"])})
+                elif op in ("update", "update_many"):
+                    for u in rec["updates"] if op == "update_many" else [rec]:
+                        ops.append({"op": "remove", "index": u["index"]})
+                        ops.append({"op": "insert", "index": u["index"], "items": [self.expose(u["item"])]})
+                elif op == "remove_many":
+                    # du plus grand au plus petit : les indexes restent valides
+                    ops.extend({"op": "remove", "index": i} for i in sorted(rec["indexes"], reverse=True))
+                elif op == "clear":
+                    ops.append({"op": "clear"})
+                else:
+                    return None
+            return ops
+
     # ------------------------- COMPAT / LEGACY -------------------------
 
-    def peek_all(self) -> List[Dict[str, Any]]:
+    def peek_all(self) -> List[TrackRecord]:
         """
         Compat rétro : historiquement `peek_all()` doit renvoyer la LISTE de queue.
         Ton PlayerService l'utilise comme une liste indexable (q[index]).
         """
         return self.get_queue()
 
-    def peek_queue(self) -> List[Dict[str, Any]]:
+    def peek_queue(self) -> List[TrackRecord]:
         """Alias compat : copie de la queue."""
         return self.get_queue()
 
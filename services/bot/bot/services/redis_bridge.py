@@ -14,8 +14,11 @@ from typing import Any, Dict, Optional
 
 import redis.asyncio as aioredis
 
+from greg_shared import queue_store
 from greg_shared.config import settings
 
+from bot.services.player_service import VersionConflict
+
 logger = logging.getLogger("greg.redis")
 
 CHANNEL_COMMANDS = "greg:commands"
@@ -23,6 +26,19 @@ CHANNEL_STATE = "greg:player:state"
 CHANNEL_PROGRESS = "greg:player:progress"
 CHANNEL_BOT_STATUS = "greg:bot:status"
 
+# Actions qui modifient la queue : leur réponse porte la version résultante.
+_QUEUE_ACTIONS = {
+    "enqueue", "play_for_user", "stop", "remove", "move", "reorder",
+    "shuffle", "remove_many", "remove_user", "play_at", "restart",
+}
+
+
+def _opt_int(v) -> Optional[int]:
+    try:
+        return int(v) if v is not None and v != "" else None
+    except (TypeError, ValueError):
+        return None
+
 
 class RedisBridge:
     """Pont Redis pour la communication inter-services."""
@@ -90,6 +106,9 @@ class RedisBridge:
         user_id = int(data.get("user_id", 0))
         request_id = data.get("request_id", "")
         cmd_data = data.get("data", {})
+        # Concurrence optimiste : version attendue et/ou identifiant stable d'item
+        expected = _opt_int(cmd_data.get("expected_version"))
+        item_id = cmd_data.get("item_id") or None
 
         logger.info("Redis CMD: action=%s guild=%s user=%s", action, guild_id, user_id)
 
@@ -98,8 +117,12 @@ class RedisBridge:
 
         try:
             if action == "enqueue":
-                item = cmd_data.get("item", {})
-                result = await svc.enqueue(guild_id, user_id, item)
+                items = cmd_data.get("items")
+                if isinstance(items, list):
+                    result = await svc.enqueue_many(guild_id, user_id, items)
+                else:
+                    item = cmd_data.get("item", {})
+                    result = await svc.enqueue(guild_id, user_id, item)
 
             elif action == "play_for_user":
                 item = cmd_data.get("item", {})
@@ -138,24 +161,55 @@ class RedisBridge:
                 val = await svc.toggle_repeat(guild_id, mode)
                 result = {"ok": True, "repeat_all": val}
 
+            elif action == "autoplay":
+                val = await svc.set_autoplay(guild_id, cmd_data.get("mode", "toggle"))
+                result = {"ok": True, "autoplay": val}
+
             elif action == "remove":
                 index = int(cmd_data.get("index", -1))
-                ok = svc.remove_at(guild_id, user_id, index)
+                ok = await svc.remove_at(guild_id, user_id, index, expected, item_id)
                 result = {"ok": ok}
 
             elif action == "move":
                 src = int(cmd_data.get("src", -1))
                 dst = int(cmd_data.get("dst", -1))
-                ok = svc.move(guild_id, user_id, src, dst)
+                ok = await svc.move(guild_id, user_id, src, dst, expected, item_id)
                 result = {"ok": ok}
 
+            elif action == "reorder":
+                order = [int(i) for i in cmd_data.get("order") or []]
+                ok = await svc.reorder(guild_id, user_id, order, expected)
+                result = {"ok": ok}
+
+            elif action == "shuffle":
+                ok = await svc.shuffle(guild_id, user_id, expected)
+                result = {"ok": ok}
+
+            elif action == "remove_many":
+                indexes = [int(i) for i in cmd_data.get("indexes") or []]
+                item_ids = [str(i) for i in cmd_data.get("item_ids") or []]
+                count = await svc.remove_many(guild_id, user_id, indexes, expected, item_ids)
+                result = {"ok": count > 0, "count": count}
+
+            elif action == "remove_user":
+                target = int(cmd_data.get("target_user_id") or user_id)
+                count = await svc.remove_by_user(guild_id, user_id, target, expected)
+                result = {"ok": count > 0, "count": count}
+
             elif action == "get_state":
-                state = svc.get_state(guild_id)
+                limit = cmd_data.get("limit")
+                if_version = cmd_data.get("if_version")
+                state = svc.get_state(
+                    guild_id,
+                    offset=int(cmd_data.get("offset") or 0),
+                    limit=int(limit) if limit is not None else None,
+                    if_version=int(if_version) if if_version is not None else None,
+                )
                 result = {"ok": True, "state": state}
 
             elif action == "play_at":
                 index = int(cmd_data.get("index", 0))
-                ok = await svc.play_at(guild_id, user_id, index)
+                ok = await svc.play_at(guild_id, user_id, index, expected, item_id)
                 result = {"ok": ok}
 
             elif action == "restart":
@@ -165,7 +219,17 @@ class RedisBridge:
             elif action == "get_history":
                 mode = cmd_data.get("mode", "top")
                 limit = int(cmd_data.get("limit", 20))
-                result = svc.get_history(guild_id, mode=mode, limit=limit)
+                # Requêtes SQLite (et import legacy éventuel) hors boucle
+                result = await asyncio.to_thread(
+                    svc.get_history,
+                    guild_id, mode=mode, limit=limit,
+                    user_id=cmd_data.get("user_id") or None,
+                    since=_opt_int(cmd_data.get("since")),
+                    until=_opt_int(cmd_data.get("until")),
+                )
+
+            elif action == "get_trending":
+                result = await asyncio.to_thread(svc.get_trending, guild_id, limit=int(cmd_data.get("limit", 20)))
 
             elif action == "join":
                 g = self.bot.get_guild(guild_id)
@@ -185,12 +249,20 @@ class RedisBridge:
             else:
                 result = {"ok": False, "error": f"UNKNOWN_ACTION:{action}"}
 
+        except VersionConflict as e:
+            result = {"ok": False, "error": e.reason, "version": e.version}
         except PermissionError:
             result = {"ok": False, "error": "PRIORITY_FORBIDDEN"}
         except Exception as e:
             logger.exception("Redis CMD error: %s", e)
             result = {"ok": False, "error": str(e)}
 
+        if action in _QUEUE_ACTIONS and "version" not in result:
+            try:
+                result["version"] = svc.queue_version(guild_id)
+            except Exception:
+                pass
+
         # Publier la réponse
         if request_id:
             await self._publish(f"greg:response:{request_id}", {
@@ -202,12 +274,21 @@ class RedisBridge:
         self.bot.emit_state_update(guild_id)
 
     async def publish_state_update(self, guild_id: int, state: dict):
-        """Publie un state update pour que l'API le relaye en WebSocket."""
+        """Publie un state update (snapshot ou patch) pour que l'API le relaye en WebSocket."""
+        key = "patch" if state.get("patch") else "state"
         await self._publish(CHANNEL_STATE, {
             "guild_id": guild_id,
-            "state": state,
+            key: state,
         })
 
+    async def store_player_state(self, guild_id: int, flags: dict):
+        """Stocke les flags du player (backend Redis) pour les lectures directes de l'API."""
+        try:
+            r = await self._get_redis()
+            await r.set(queue_store.player_key(guild_id), queue_store.player_payload(flags))
+        except Exception as e:
+            logger.error("Redis store player state failed: %s", e)
+
     async def publish_progress(self, guild_id: int, position: int, duration: Optional[int], paused: bool):
         """Publie un tick de progression."""
         await self._publish(CHANNEL_PROGRESS, {
@@ -37,6 +37,7 @@ const I = {
   prev:   <path fill="currentColor" d="M7 6h2v12H7zm3 6l10 6V6z"/>,
   stop:   <path fill="currentColor" d="M6 6h12v12H6z"/>,
   repeat: <path fill="currentColor" d="M7 7h10v3l4-4-4-4v3H5v6h2zm10 10H7v-3l-4 4 4 4v-3h12v-6h-2z"/>,
+  radio:  <path fill="currentColor" d="M3.2 6.2 16.6 1l.7 1.9L7.9 6.6H20a1 1 0 0 1 1 1V20a1 1 0 0 1-1 1H4a1 1 0 0 1-1-1V7.6c0-.6.1-1.1.2-1.4zM8 11a3 3 0 1 0 0 6 3 3 0 0 0 0-6zm7 1v2h4v-2zm0 3v2h4v-2z"/>,
   trash:  <path fill="currentColor" d="M9 3h6l1 2h5v2H3V5h5zm1 6h2v10h-2zm4 0h2v10h-2z"/>,
   search: <path fill="currentColor" d="M10 4a6 6 0 1 0 3.6 10.8l4.8 4.8 1.4-1.4-4.8-4.8A6 6 0 0 0 10 4zm0 2a4 4 0 1 1 0 8 4 4 0 0 1 0-8z"/>,
   music:  <path fill="currentColor" d="M12 3v10.55A4 4 0 1 0 14 17V7h4V3h-6z"/>,
@@ -143,7 +144,7 @@ function SearchBar() {
 // Video Player (YouTube embed)
 // ═══════════════════════════════
 function VideoPlayer() {
-  const { player, togglePause, skip, stop, toggleRepeat, restartTrack } = usePlayer();
+  const { player, togglePause, skip, stop, toggleRepeat, toggleAutoplay, restartTrack } = usePlayer();
   const { progressRef, currentRef, totalRef } = useProgress();
   const cur = player.current;
   const videoId = extractVideoId(cur?.url);
@@ -371,6 +372,9 @@ function VideoPlayer() {
         <button onClick={toggleRepeat} className={`ctrl ${player.repeat ? 'ctrl-active' : ''}`} title="Repeat">
           <Ic icon="repeat" size={20}/>
         </button>
+        <button onClick={toggleAutoplay} className={`ctrl ${player.autoplay ? 'ctrl-active' : ''}`} title="Autoplay">
+          <Ic icon="radio" size={20}/>
+        </button>
       </div>
     </div>
   );
@@ -52,7 +52,15 @@ function normalizeItem(it: any): Track | null {
   const addedByName = (rb && (rb.display_name || rb.global_name || rb.username || rb.name)) || it.requested_by_name || it.added_by_name || it.user_name || it.username || '';
   const addedBy = (addedById || addedByName) ? { id: addedById ? String(addedById) : '', name: String(addedByName || '').trim() } : null;
 
-  return { title: String(title || ''), url: String(url || ''), artist: String(artist || ''), duration, thumb, provider, addedBy, raw: it };
+  const id = it.item_id || it.id || null;
+
+  return { id: id ? String(id) : null, title: String(title || ''), url: String(url || ''), artist: String(artist || ''), duration, thumb, provider, addedBy, raw: it };
+}
+
+// Item ciblé par son id stable si connu, sinon par index + version attendue
+function queueCas(player: PlayerState, index: number) {
+  const id = player.queue[index]?.id;
+  return id ? { item_id: id } : { expected_version: player.version ?? null };
 }
 
 function normalizeMePayload(payload: any): UserInfo | null {
@@ -104,6 +112,7 @@ interface GregStore {
   setPlayer: (p: Partial<PlayerState>) => void;
   setTickBase: (tb: { pos: number; at: number; dur: number }) => void;
   applyPlaylistPayload: (payload: any) => void;
+  applyPlaylistPatch: (patch: any) => boolean;
   setStatus: (text: string, kind?: StatusKind) => void;
 
   setSpotifyLinked: (v: boolean) => void;
@@ -125,8 +134,11 @@ export const useStore = create<GregStore>((set, get) => ({
     queue: [],
     paused: true,
     repeat: false,
+    autoplay: false,
     position: 0,
     duration: 0,
+    version: null,
+    queueTotal: 0,
   },
   tickBase: { pos: 0, at: 0, dur: 0 },
 
@@ -175,16 +187,21 @@ export const useStore = create<GregStore>((set, get) => ({
     else { const maybe = norm(p.current || p.now_playing || p.playing); if (maybe) current = maybe; }
 
     let queue = state.player.queue;
-    if (!isTick) {
+    const queueUnchanged = !!p.queue_unchanged;
+    if (!isTick && !queueUnchanged) {
       const qRaw = Array.isArray(p.queue) ? p.queue : Array.isArray(p.items) ? p.items : Array.isArray(p.list) ? p.list : [];
       queue = qRaw.map(normalizeItem).filter(Boolean) as Track[];
-    } else {
+    } else if (isTick) {
       const qM = Array.isArray(p.queue) ? p.queue : Array.isArray(p.items) ? p.items : null;
       if (qM) queue = qM.map(normalizeItem).filter(Boolean) as Track[];
     }
 
+    const version = typeof p.version === 'number' ? p.version : (isTick ? state.player.version ?? null : null);
+    const queueTotal = typeof p.queue_total === 'number' ? p.queue_total : queue.length;
+
     const paused = toBool(pick(p.is_paused, p.paused, p.isPaused, p.pause, false));
     const repeat = toBool(pick(p.repeat_all, p.repeat, p.repeat_mode, p.loop, false));
+    const autoplay = toBool(pick(p.autoplay, false));
     const elapsed = toSeconds(pick(p.progress?.elapsed, p.progress?.position, p.elapsed, p.position, p.pos, p.current_time, 0)) ?? 0;
     const duration = toSeconds(pick(p.progress?.duration, p.duration, p.total, p.length, current?.duration, 0)) ?? 0;
 
@@ -193,8 +210,11 @@ export const useStore = create<GregStore>((set, get) => ({
       queue,
       paused: paused || !current,
       repeat,
+      autoplay,
       position: Math.max(0, elapsed),
       duration: Math.max(0, duration),
+      version,
+      queueTotal,
     };
 
     set({
@@ -206,6 +226,95 @@ export const useStore = create<GregStore>((set, get) => ({
       },
     });
   },
+
+  /**
+   * Applique un patch versionné (`playlist_patch`). Retourne false si le patch
+   * ne s'applique pas à notre version (ou queue partielle) : l'appelant doit
+   * alors recharger un snapshot complet.
+   */
+  applyPlaylistPatch: (patch: any) => {
+    const state = get();
+    const prev = state.player;
+    if (!patch || typeof patch.from_version !== 'number') return false;
+    if (prev.version == null || patch.from_version !== prev.version) return false;
+    if (prev.queueTotal != null && prev.queueTotal !== prev.queue.length) return false;
+
+    let queue = prev.queue.slice();
+    let current = prev.current;
+    let paused = prev.paused;
+    let repeat = prev.repeat;
+    let autoplay = !!prev.autoplay;
+    let duration = prev.duration;
+
+    for (const op of Array.isArray(patch.ops) ? patch.ops : []) {
+      switch (op?.op) {
+        case 'insert': {
+          const items = (Array.isArray(op.items) ? op.items : []).map(normalizeItem).filter(Boolean) as Track[];
+          const at = op.index == null ? queue.length : clamp(Number(op.index), 0, queue.length);
+          queue.splice(at, 0, ...items);
+          break;
+        }
+        case 'remove':
+          if (op.index >= 0 && op.index < queue.length) queue.splice(op.index, 1);
+          break;
+        case 'move': {
+          if (op.src < 0 || op.src >= queue.length) return false;
+          const [it] = queue.splice(op.src, 1);
+          queue.splice(clamp(Number(op.dst), 0, queue.length), 0, it);
+          break;
+        }
+        case 'reorder': {
+          const order: number[] = Array.isArray(op.order) ? op.order : [];
+          if (order.length !== queue.length) return false;
+          const prevQ = queue;
+          queue = order.map((i) => prevQ[i]);
+          if (queue.some((t) => !t)) return false;
+          break;
+        }
+        case 'clear':
+          queue = [];
+          break;
+        case 'current_changed': {
+          const n = normalizeItem(op.current);
+          current = n && (n.title || n.url) ? n : null;
+          break;
+        }
+        case 'flag_changed': {
+          const f = op.flags || {};
+          if (f.is_paused !== undefined) paused = !!f.is_paused;
+          else if (f.paused !== undefined) paused = !!f.paused;
+          if (f.repeat_all !== undefined) repeat = !!f.repeat_all;
+          if (f.autoplay !== undefined) autoplay = !!f.autoplay;
+          break;
+        }
+        default:
+          return false;
+      }
+    }
+
+    if (typeof patch.queue_total === 'number' && patch.queue_total !== queue.length) return false;
+
+    const position = Math.max(0, toSeconds(patch.position) ?? 0);
+    duration = Math.max(0, toSeconds(patch.duration ?? current?.duration) ?? 0);
+
+    const newPlayer: PlayerState = {
+      current,
+      queue,
+      paused: paused || !current,
+      repeat,
+      autoplay,
+      position,
+      duration,
+      version: typeof patch.version === 'number' ? patch.version : null,
+      queueTotal: queue.length,
+    };
+
+    set({
+      player: newPlayer,
+      tickBase: { pos: position, at: performance.now(), dur: duration },
+    });
+    return true;
+  },
 }));
 
 // ── Hooks ──
@@ -244,6 +353,13 @@ export function usePlayerInit() {
       useStore.getState().applyPlaylistPayload(payload);
     };
 
+    const onPlaylistPatch = (patch: any) => {
+      // Version manquante / trou dans la séquence → snapshot complet.
+      if (!useStore.getState().applyPlaylistPatch(patch)) {
+        refreshPlaylist().catch(() => {});
+      }
+    };
+
     const onSpotifyLinked = (payload: any) => {
       useStore.getState().setSpotifyLinked(true);
       useStore.getState().setSpotifyProfile(payload?.profile || payload?.data?.profile || null);
@@ -253,6 +369,7 @@ export function usePlayerInit() {
     socket.on('connect', onConnect);
     socket.on('disconnect', onDisconnect);
     socket.on('playlist_update', onPlaylistUpdate);
+    socket.on('playlist_patch', onPlaylistPatch);
     socket.on('spotify:linked', onSpotifyLinked);
 
     startPing();
@@ -261,6 +378,7 @@ export function usePlayerInit() {
       socket.off('connect', onConnect);
       socket.off('disconnect', onDisconnect);
       socket.off('playlist_update', onPlaylistUpdate);
+      socket.off('playlist_patch', onPlaylistPatch);
       socket.off('spotify:linked', onSpotifyLinked);
     };
   }, []);
@@ -437,6 +555,13 @@ export function usePlayer() {
       if (doRefresh) await refreshPlaylist().catch(() => {});
       return res;
     } catch (e: any) {
+      const code = e?.payload?.error;
+      if (code === 'VERSION_CONFLICT' || code === 'ITEM_NOT_FOUND') {
+        // La file a changé entre l'affichage et le clic : on resynchronise
+        useStore.getState().setStatus('La file a changé, action annulée — état rafraîchi.', 'warn');
+        await refreshPlaylist().catch(() => {});
+        throw e;
+      }
       const msg = e?.payload?.error || e?.payload?.message || e?.message || String(e);
       useStore.getState().setStatus(msg, 'err');
       throw e;
@@ -481,6 +606,12 @@ export function usePlayer() {
     await safeAction(() => api.repeat(s.guildId, s.me!.id), 'Repeat togglé ✅', true);
   }, [safeAction]);
 
+  const toggleAutoplay = useCallback(async () => {
+    const s = useStore.getState();
+    if (!s.me || !s.guildId) return;
+    await safeAction(() => api.autoplay(s.guildId, s.me!.id), 'Autoplay togglé ✅', true);
+  }, [safeAction]);
+
   const restartTrack = useCallback(async () => {
     const s = useStore.getState();
     if (!s.me || !s.guildId) return;
@@ -490,13 +621,15 @@ export function usePlayer() {
   const removeFromQueue = useCallback(async (index: number) => {
     const s = useStore.getState();
     if (!s.me || !s.guildId) return;
-    await safeAction(() => api.queueRemove(s.guildId, s.me!.id, index), 'Retiré ✅', true);
+    const cas = queueCas(s.player, index);
+    await safeAction(() => api.queueRemove(s.guildId, s.me!.id, index, cas), 'Retiré ✅', true);
   }, [safeAction]);
 
   const playAt = useCallback(async (index: number) => {
     const s = useStore.getState();
     if (!s.me || !s.guildId) return;
-    await safeAction(() => api.playAt(s.guildId, s.me!.id, index), `Lecture: #${index + 1}`, true);
+    const cas = queueCas(s.player, index);
+    await safeAction(() => api.playAt(s.guildId, s.me!.id, index, cas), `Lecture: #${index + 1}`, true);
     await bestEffortVoiceJoin('play_at');
   }, [safeAction, bestEffortVoiceJoin]);
 
@@ -650,6 +783,7 @@ export function usePlayer() {
     stop,
     togglePause,
     toggleRepeat,
+    toggleAutoplay,
     restartTrack,
     removeFromQueue,
     playAt,
@@ -674,7 +808,8 @@ async function refreshPlaylist() {
     return;
   }
   try {
-    const data = await api.getPlaylistState(s.guildId);
+    // if_version : le serveur omet la queue si elle n'a pas bougé.
+    const data = await api.getPlaylistState(s.guildId, s.player.version);
     s.applyPlaylistPayload(data);
   } catch (e: any) {
     s.setStatus(String(e?.message || e), 'err');
@@ -5,7 +5,9 @@
  *   GET  /users/me, /auth/login, /auth/logout (POST), /guilds
  *   GET  /playlist?guild_id=..., /search/autocomplete?q=...&limit=8
  *   POST /queue/add, /queue/remove, /queue/skip, /queue/stop
+ *   POST /player/queue/reorder, /player/queue/shuffle, /player/queue/remove (groupés)
  *   POST /playlist/play_at, /playlist/toggle_pause, /playlist/repeat, /playlist/restart
+ *   POST /player/autoplay
  *   POST /voice/join
  *   GET  /spotify/login, /spotify/status, /spotify/me, /spotify/playlists
  *   GET  /spotify/playlist_tracks?playlist_id=...
@@ -109,6 +111,9 @@ function basePayload(guildId: string, userId: string, extra: Record<string, any>
   return out;
 }
 
+// Concurrence optimiste sur la file : identifiant stable d'item et/ou version attendue
+export type QueueCas = { item_id?: string | null; expected_version?: number | null };
+
 export const api = {
   API_BASE,
 
@@ -119,8 +124,12 @@ export const api = {
   getGuilds: () => get('/guilds'),
 
   // Playlist state
-  getPlaylistState: (guildId: string) =>
-    get('/playlist', guildId ? { guild_id: guildId } : undefined),
+  getPlaylistState: (guildId: string, ifVersion?: number | null) => {
+    const query: Record<string, string> = {};
+    if (guildId) query.guild_id = guildId;
+    if (ifVersion != null) query.if_version = String(ifVersion);
+    return get('/playlist', query);
+  },
 
   // Queue
   queueAdd: (guildId: string, userId: string, payload: Record<string, any>) => {
@@ -128,8 +137,9 @@ export const api = {
     return post('/queue/add', body);
   },
 
-  queueRemove: (guildId: string, userId: string, index: number) =>
-    post('/queue/remove', basePayload(guildId, userId, { index })),
+  // `cas` : { item_id, expected_version } → 409 VERSION_CONFLICT / ITEM_NOT_FOUND si la file a bougé
+  queueRemove: (guildId: string, userId: string, index: number, cas: QueueCas = {}) =>
+    post('/queue/remove', basePayload(guildId, userId, { index, ...cas })),
 
   queueSkip: (guildId: string, userId: string) =>
     post('/queue/skip', basePayload(guildId, userId)),
@@ -137,9 +147,22 @@ export const api = {
   queueStop: (guildId: string, userId: string) =>
     post('/queue/stop', basePayload(guildId, userId)),
 
+  // Opérations groupées : une écriture + un emit côté bot
+  queueReorder: (guildId: string, userId: string, order: number[], cas: QueueCas = {}) =>
+    post('/player/queue/reorder', basePayload(guildId, userId, { order, ...cas })),
+
+  queueShuffle: (guildId: string, userId: string, cas: QueueCas = {}) =>
+    post('/player/queue/shuffle', basePayload(guildId, userId, { ...cas })),
+
+  queueRemoveMany: (guildId: string, userId: string, indexes: number[], cas: QueueCas & { item_ids?: string[] } = {}) =>
+    post('/player/queue/remove', basePayload(guildId, userId, { indexes, ...cas })),
+
+  queueRemoveUser: (guildId: string, userId: string, targetUserId: string, cas: QueueCas = {}) =>
+    post('/player/queue/remove', basePayload(guildId, userId, { user_id_target: targetUserId, ...cas })),
+
   // Playlist controls
-  playAt: (guildId: string, userId: string, index: number) =>
-    post('/playlist/play_at', basePayload(guildId, userId, { index })),
+  playAt: (guildId: string, userId: string, index: number, cas: QueueCas = {}) =>
+    post('/playlist/play_at', basePayload(guildId, userId, { index, ...cas })),
 
   togglePause: (guildId: string, userId: string) =>
     post('/playlist/toggle_pause', basePayload(guildId, userId)),
@@ -147,6 +170,9 @@ export const api = {
   repeat: (guildId: string, userId: string) =>
     post('/playlist/repeat', basePayload(guildId, userId)),
 
+  autoplay: (guildId: string, userId: string) =>
+    post('/player/autoplay', basePayload(guildId, userId)),
+
   restart: (guildId: string, userId: string) =>
     post('/playlist/restart', basePayload(guildId, userId)),
 
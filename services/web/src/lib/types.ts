@@ -1,4 +1,5 @@
 export interface Track {
+  id?: string | null;
   url: string;
   title: string;
   artist?: string;
@@ -27,8 +28,11 @@ export interface PlayerState {
   queue: Track[];
   paused: boolean;
   repeat: boolean;
+  autoplay?: boolean;
   position: number;
   duration: number;
+  version?: number | null;
+  queueTotal?: number;
 }
 
 export interface GuildInfo {